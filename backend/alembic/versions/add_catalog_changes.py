@@ -0,0 +1,103 @@
+"""add catalog change versions
+
+Revision ID: add_catalog_changes
+Revises: add_product_search
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_catalog_changes'
+down_revision = 'add_product_search'
+branch_labels = None
+depends_on = None
+
+# entity, table, columns whose changes bump the catalog version
+TRACKED = [
+    ('category', 'categories', ['name', 'slug', 'description', 'parent_id']),
+    ('product', 'products', ['name', 'description', 'price', 'category_id', 'sku', 'barcode', 'weight',
+                             'dimensions', 'unit', 'status', 'min_quantity', 'supplier_id', 'branch_id']),
+    ('variant', 'product_variants', ['product_id', 'name', 'sku', 'price_adjustment', 'attributes']),
+]
+
+def upgrade():
+    op.create_table(
+        'catalog_changes',
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=20), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('deleted', sa.Boolean(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('version'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_catalog_changes_entity', 'catalog_changes', ['entity', 'entity_id'], unique=True)
+
+    # Every existing row starts at its own version, categories first
+    for entity, table, _ in TRACKED:
+        op.execute(
+            f"INSERT INTO catalog_changes (entity, entity_id, deleted) "
+            f"SELECT '{entity}', id, false FROM {table} ORDER BY id"
+        )
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("""
+            CREATE OR REPLACE FUNCTION catalog_record_change() RETURNS trigger AS $$
+            DECLARE
+                row_id integer;
+            BEGIN
+                PERFORM pg_advisory_xact_lock(hashtext('catalog_changes'));
+                IF TG_OP = 'DELETE' THEN
+                    row_id := OLD.id;
+                ELSE
+                    row_id := NEW.id;
+                END IF;
+                DELETE FROM catalog_changes WHERE entity = TG_ARGV[0] AND entity_id = row_id;
+                INSERT INTO catalog_changes(entity, entity_id, deleted) VALUES (TG_ARGV[0], row_id, TG_OP = 'DELETE');
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        for entity, table, columns in TRACKED:
+            old = ', '.join(f'OLD.{c}::text' if c == 'attributes' else f'OLD.{c}' for c in columns)
+            new = ', '.join(f'NEW.{c}::text' if c == 'attributes' else f'NEW.{c}' for c in columns)
+            op.execute(f"""
+                CREATE TRIGGER {table}_changes_insert_delete AFTER INSERT OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION catalog_record_change('{entity}')
+            """)
+            op.execute(f"""
+                CREATE TRIGGER {table}_changes_update AFTER UPDATE ON {table}
+                FOR EACH ROW WHEN (ROW({old}) IS DISTINCT FROM ROW({new}))
+                EXECUTE FUNCTION catalog_record_change('{entity}')
+            """)
+    elif dialect == 'sqlite':
+        for entity, table, columns in TRACKED:
+            def record(row, deleted):
+                return (
+                    f"DELETE FROM catalog_changes WHERE entity = '{entity}' AND entity_id = {row}.id; "
+                    f"INSERT INTO catalog_changes(entity, entity_id, deleted) VALUES ('{entity}', {row}.id, {deleted});"
+                )
+            changed = ' OR '.join(f'old.{c} IS NOT new.{c}' for c in columns)
+            op.execute(f"CREATE TRIGGER {table}_changes_ai AFTER INSERT ON {table} BEGIN {record('new', 0)} END")
+            op.execute(
+                f"CREATE TRIGGER {table}_changes_au AFTER UPDATE OF {', '.join(columns)} ON {table} "
+                f"WHEN {changed} BEGIN {record('new', 0)} END"
+            )
+            op.execute(f"CREATE TRIGGER {table}_changes_ad AFTER DELETE ON {table} BEGIN {record('old', 1)} END")
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for _, table, _ in TRACKED:
+        if dialect == 'postgresql':
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_changes_update ON {table}")
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_changes_insert_delete ON {table}")
+        elif dialect == 'sqlite':
+            for suffix in ('au', 'ad', 'ai'):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_changes_{suffix}")
+    if dialect == 'postgresql':
+        op.execute("DROP FUNCTION IF EXISTS catalog_record_change()")
+    op.drop_index('ix_catalog_changes_entity', table_name='catalog_changes')
+    op.drop_table('catalog_changes')
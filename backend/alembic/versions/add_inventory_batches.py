@@ -0,0 +1,52 @@
+"""add inventory batches and expiry indexes
+
+Revision ID: add_inventory_batches
+Revises: add_product_total_stock
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_inventory_batches'
+down_revision = 'add_product_total_stock'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'inventory_batches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('inventory_id', sa.Integer(), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('batch_number', sa.String(length=100), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('expiry_date', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['inventory_id'], ['inventory.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['branch_id'], ['branches.id']),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_inventory_batches_inventory_id', 'inventory_batches', ['inventory_id'])
+    op.create_index('ix_inventory_batches_branch_expiry', 'inventory_batches', ['branch_id', 'expiry_date'])
+    op.create_index('ix_inventory_batches_fefo', 'inventory_batches', ['branch_id', 'product_id', 'expiry_date', 'id'])
+    op.create_index('ix_inventory_branch_expiry', 'inventory', ['branch_id', 'expiry_date'])
+
+    # Existing rows that carry a batch number or expiry date become one batch each.
+    op.execute(
+        "INSERT INTO inventory_batches (inventory_id, branch_id, product_id, batch_number, quantity, expiry_date) "
+        "SELECT id, branch_id, product_id, batch_number, quantity, expiry_date FROM inventory "
+        "WHERE quantity > 0 AND (batch_number IS NOT NULL OR expiry_date IS NOT NULL)"
+    )
+
+def downgrade():
+    op.drop_index('ix_inventory_branch_expiry', table_name='inventory')
+    op.drop_index('ix_inventory_batches_fefo', table_name='inventory_batches')
+    op.drop_index('ix_inventory_batches_branch_expiry', table_name='inventory_batches')
+    op.drop_index('ix_inventory_batches_inventory_id', table_name='inventory_batches')
+    op.drop_table('inventory_batches')
@@ -0,0 +1,26 @@
+"""add unique (branch_id, product_id) to inventory
+
+Revision ID: add_inventory_branch_product_unique
+Revises: add_customer_feedback_table
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_inventory_branch_product_unique'
+down_revision = 'add_customer_feedback_table'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Bulk imports upsert inventory with ON CONFLICT (branch_id, product_id),
+    # which needs a unique index on the pair. Existing duplicate rows must be
+    # merged before upgrading.
+    with op.batch_alter_table('inventory') as batch_op:
+        batch_op.create_unique_constraint('uq_inventory_branch_product', ['branch_id', 'product_id'])
+
+def downgrade():
+    with op.batch_alter_table('inventory') as batch_op:
+        batch_op.drop_constraint('uq_inventory_branch_product', type_='unique')
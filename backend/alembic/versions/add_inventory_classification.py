@@ -0,0 +1,25 @@
+"""add inventory abc/xyz classification
+
+Revision ID: add_inventory_classification
+Revises: add_replenishment_fields
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_inventory_classification'
+down_revision = 'add_replenishment_fields'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('inventory', sa.Column('abc_class', sa.String(length=1), nullable=True))
+    op.add_column('inventory', sa.Column('xyz_class', sa.String(length=1), nullable=True))
+    op.create_index('ix_inventory_branch_class', 'inventory', ['branch_id', 'abc_class', 'xyz_class'])
+
+def downgrade():
+    op.drop_index('ix_inventory_branch_class', table_name='inventory')
+    op.drop_column('inventory', 'xyz_class')
+    op.drop_column('inventory', 'abc_class')
@@ -0,0 +1,33 @@
+"""add inventory sales velocity
+
+Revision ID: add_inventory_sales_velocity
+Revises: add_inventory_classification
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_inventory_sales_velocity'
+down_revision = 'add_inventory_classification'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('inventory', sa.Column('last_sold_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('inventory', sa.Column('units_sold_30d', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index('ix_inventory_branch_last_sold', 'inventory', ['branch_id', 'last_sold_at'])
+
+    # Backfill the last sale; units_sold_30d is filled by the first nightly refresh.
+    op.execute(
+        "UPDATE inventory SET last_sold_at = ("
+        "SELECT MAX(sales.created_at) FROM sale_items JOIN sales ON sales.id = sale_items.sale_id "
+        "WHERE sales.branch_id = inventory.branch_id AND sale_items.product_id = inventory.product_id "
+        "AND sales.status != 'cancelled')"
+    )
+
+def downgrade():
+    op.drop_index('ix_inventory_branch_last_sold', table_name='inventory')
+    op.drop_column('inventory', 'units_sold_30d')
+    op.drop_column('inventory', 'last_sold_at')
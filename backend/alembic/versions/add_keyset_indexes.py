@@ -0,0 +1,36 @@
+"""add keyset pagination indexes
+
+Revision ID: add_keyset_indexes
+Revises: add_sale_client_id
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_keyset_indexes'
+down_revision = 'add_sale_client_id'
+branch_labels = None
+depends_on = None
+
+# (index, table, columns); listings page newest first on (created_at, id)
+INDEXES = [
+    ('ix_sales_created_at_id', 'sales', ['created_at', 'id']),
+    ('ix_sales_branch_created_at_id', 'sales', ['branch_id', 'created_at', 'id']),
+    ('ix_transactions_created_at_id', 'transactions', ['created_at', 'id']),
+    ('ix_transactions_cashier_created_at_id', 'transactions', ['cashier_id', 'created_at', 'id']),
+    ('ix_orders_created_at_id', 'orders', ['created_at', 'id']),
+    ('ix_orders_user_created_at_id', 'orders', ['user_id', 'created_at', 'id']),
+    ('ix_inventory_transactions_created_at_id', 'inventory_transactions', ['created_at', 'id']),
+    ('ix_inventory_transactions_branch_created_at_id', 'inventory_transactions', ['branch_id', 'created_at', 'id']),
+    ('ix_audit_logs_user_created_at_id', 'audit_logs', ['user_id', 'created_at', 'id']),
+]
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
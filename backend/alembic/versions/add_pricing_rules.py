@@ -0,0 +1,78 @@
+"""add pricing rules
+
+Revision ID: add_pricing_rules
+Revises: add_sale_filter_indexes
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_pricing_rules'
+down_revision = 'add_sale_filter_indexes'
+branch_labels = None
+depends_on = None
+
+def _targets():
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=True),
+        sa.Column('product_id', sa.Integer(), nullable=True),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('name', sa.String(length=100), nullable=False),
+    ]
+
+def _constraints():
+    return [
+        sa.ForeignKeyConstraint(['branch_id'], ['branches.id']),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id']),
+        sa.PrimaryKeyConstraint('id'),
+    ]
+
+def upgrade():
+    op.create_table(
+        'tax_rates',
+        *_targets(),
+        sa.Column('rate', sa.Numeric(7, 4), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        *_constraints()
+    )
+    op.create_index('ix_tax_rates_branch_active', 'tax_rates', ['branch_id', 'is_active'])
+
+    op.create_table(
+        'promotions',
+        *_targets(),
+        sa.Column('discount_type', sa.String(length=10), nullable=False, server_default='percent'),
+        sa.Column('value', sa.Numeric(12, 4), nullable=False),
+        sa.Column('min_quantity', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('starts_at', sa.DateTime(), nullable=True),
+        sa.Column('ends_at', sa.DateTime(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        *_constraints()
+    )
+    op.create_index('ix_promotions_branch_active', 'promotions', ['branch_id', 'is_active'])
+
+    with op.batch_alter_table('sale_items') as batch_op:
+        batch_op.add_column(sa.Column('promotion_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('promotion_discount', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('tax_rate', sa.Numeric(7, 4), nullable=True))
+        batch_op.add_column(sa.Column('tax_amount', sa.Float(), nullable=False, server_default='0'))
+        batch_op.create_foreign_key('fk_sale_items_promotion_id', 'promotions', ['promotion_id'], ['id'])
+
+def downgrade():
+    with op.batch_alter_table('sale_items') as batch_op:
+        batch_op.drop_constraint('fk_sale_items_promotion_id', type_='foreignkey')
+        batch_op.drop_column('tax_amount')
+        batch_op.drop_column('tax_rate')
+        batch_op.drop_column('promotion_discount')
+        batch_op.drop_column('promotion_id')
+    op.drop_index('ix_promotions_branch_active', table_name='promotions')
+    op.drop_table('promotions')
+    op.drop_index('ix_tax_rates_branch_active', table_name='tax_rates')
+    op.drop_table('tax_rates')
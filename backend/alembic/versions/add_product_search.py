@@ -0,0 +1,71 @@
+"""add product search index
+
+Revision ID: add_product_search
+Revises: add_pricing_rules
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_search'
+down_revision = 'add_pricing_rules'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("""
+            ALTER TABLE products ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(sku, '') || ' ' || coalesce(barcode, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(description, '')), 'D')
+            ) STORED
+        """)
+        op.execute("CREATE INDEX ix_products_search_vector ON products USING gin (search_vector)")
+        op.execute("CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)")
+    elif dialect == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE products_fts USING fts5(
+                name, sku, barcode, description,
+                content='products', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+            )
+        """)
+        op.execute("CREATE VIRTUAL TABLE products_fts_vocab USING fts5vocab(products_fts, row)")
+        op.execute("""
+            CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts(rowid, name, sku, barcode, description)
+                VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name, sku, barcode, description)
+                VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER products_fts_au AFTER UPDATE OF name, sku, barcode, description ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name, sku, barcode, description)
+                VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+                INSERT INTO products_fts(rowid, name, sku, barcode, description)
+                VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+            END
+        """)
+        op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_products_search_vector")
+        op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS products_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_ai")
+        op.execute("DROP TABLE IF EXISTS products_fts_vocab")
+        op.execute("DROP TABLE IF EXISTS products_fts")
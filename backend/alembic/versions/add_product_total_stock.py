@@ -0,0 +1,25 @@
+"""add denormalized total_stock to products
+
+Revision ID: add_product_total_stock
+Revises: add_stock_ledger
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_total_stock'
+down_revision = 'add_stock_ledger'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('products', sa.Column('total_stock', sa.Integer(), nullable=False, server_default='0'))
+    op.execute(
+        "UPDATE products SET total_stock = ("
+        "SELECT COALESCE(SUM(quantity), 0) FROM inventory WHERE inventory.product_id = products.id)"
+    )
+
+def downgrade():
+    op.drop_column('products', 'total_stock')
@@ -0,0 +1,30 @@
+"""add sale branch and inventory lead time
+
+Revision ID: add_replenishment_fields
+Revises: add_inventory_batches
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_replenishment_fields'
+down_revision = 'add_inventory_batches'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Demand per (branch, product) needs the branch of each sale.
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.add_column(sa.Column('branch_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_sales_branch_id', 'branches', ['branch_id'], ['id'])
+        batch_op.create_index('ix_sales_branch_id', ['branch_id'])
+    op.add_column('inventory', sa.Column('lead_time_days', sa.Integer(), nullable=True))
+
+def downgrade():
+    op.drop_column('inventory', 'lead_time_days')
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.drop_index('ix_sales_branch_id')
+        batch_op.drop_constraint('fk_sales_branch_id', type_='foreignkey')
+        batch_op.drop_column('branch_id')
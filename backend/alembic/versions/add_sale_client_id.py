@@ -0,0 +1,25 @@
+"""add sale client id
+
+Revision ID: add_sale_client_id
+Revises: add_inventory_sales_velocity
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sale_client_id'
+down_revision = 'add_inventory_sales_velocity'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.add_column(sa.Column('client_sale_id', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_sales_client_sale_id', ['client_sale_id'])
+
+def downgrade():
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.drop_constraint('uq_sales_client_sale_id', type_='unique')
+        batch_op.drop_column('client_sale_id')
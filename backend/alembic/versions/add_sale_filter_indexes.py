@@ -0,0 +1,37 @@
+"""add sale filter indexes
+
+Revision ID: add_sale_filter_indexes
+Revises: add_keyset_indexes
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sale_filter_indexes'
+down_revision = 'add_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+# Composite indexes for the SaleFilter shapes; (created_at, id) last so the
+# date range and newest-first order come from the index too.
+INDEXES = [
+    ('ix_sales_branch_status_created_at_id', ['branch_id', 'status', 'created_at', 'id']),
+    ('ix_sales_created_by_created_at_id', ['created_by', 'created_at', 'id']),
+    ('ix_sales_customer_created_at_id', ['customer_id', 'created_at', 'id']),
+    ('ix_sales_status_created_at_id', ['status', 'created_at', 'id']),
+    ('ix_sales_payment_method_created_at_id', ['payment_method', 'created_at', 'id']),
+    ('ix_sales_total_amount', ['total_amount']),
+]
+
+def upgrade():
+    for name, columns in INDEXES:
+        op.create_index(name, 'sales', columns)
+    # Superseded by ix_sales_branch_created_at_id
+    op.drop_index('ix_sales_branch_id', table_name='sales')
+
+def downgrade():
+    op.create_index('ix_sales_branch_id', 'sales', ['branch_id'])
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='sales')
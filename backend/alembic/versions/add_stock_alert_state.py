@@ -0,0 +1,45 @@
+"""add job watermarks and inventory alert state
+
+Revision ID: add_stock_alert_state
+Revises: add_inventory_branch_product_unique
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_stock_alert_state'
+down_revision = 'add_inventory_branch_product_unique'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'job_watermarks',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('value', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table(
+        'inventory_alert_states',
+        sa.Column('inventory_id', sa.Integer(), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=False),
+        sa.Column('state', sa.String(length=20), nullable=False),
+        sa.Column('alerted_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['inventory_id'], ['inventory.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['branch_id'], ['branches.id']),
+        sa.PrimaryKeyConstraint('inventory_id')
+    )
+    op.create_index('ix_inventory_alert_states_alerted_at', 'inventory_alert_states', ['alerted_at'])
+    # The alert job scans inventory changed since its last run.
+    op.create_index('ix_inventory_created_at', 'inventory', ['created_at'])
+    op.create_index('ix_inventory_updated_at', 'inventory', ['updated_at'])
+
+def downgrade():
+    op.drop_index('ix_inventory_updated_at', table_name='inventory')
+    op.drop_index('ix_inventory_created_at', table_name='inventory')
+    op.drop_index('ix_inventory_alert_states_alerted_at', table_name='inventory_alert_states')
+    op.drop_table('inventory_alert_states')
+    op.drop_table('job_watermarks')
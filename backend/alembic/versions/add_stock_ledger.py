@@ -0,0 +1,65 @@
+"""add stock ledger and snapshots
+
+Revision ID: add_stock_ledger
+Revises: add_stock_alert_state
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_stock_ledger'
+down_revision = 'add_stock_alert_state'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'stock_ledger',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.Column('entry_type', sa.String(length=20), nullable=False),
+        sa.Column('reference_type', sa.String(length=20), nullable=True),
+        sa.Column('reference_id', sa.Integer(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['branch_id'], ['branches.id']),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stock_ledger_branch_product_id', 'stock_ledger', ['branch_id', 'product_id', 'id'])
+    op.create_index('ix_stock_ledger_created_at', 'stock_ledger', ['created_at'])
+
+    op.create_table(
+        'stock_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('branch_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('ledger_id', sa.BigInteger(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('as_of', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['branch_id'], ['branches.id']),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('branch_id', 'product_id', 'ledger_id', name='uq_stock_snapshot_branch_product_ledger')
+    )
+    op.create_index('ix_stock_snapshots_branch_product_as_of', 'stock_snapshots', ['branch_id', 'product_id', 'as_of'])
+
+    # Open the ledger with the current quantity of every inventory row.
+    op.execute(
+        "INSERT INTO stock_ledger (branch_id, product_id, delta, entry_type) "
+        "SELECT branch_id, product_id, quantity, 'opening' FROM inventory "
+        "WHERE quantity IS NOT NULL AND quantity <> 0"
+    )
+
+def downgrade():
+    op.drop_index('ix_stock_snapshots_branch_product_as_of', table_name='stock_snapshots')
+    op.drop_table('stock_snapshots')
+    op.drop_index('ix_stock_ledger_created_at', table_name='stock_ledger')
+    op.drop_index('ix_stock_ledger_branch_product_id', table_name='stock_ledger')
+    op.drop_table('stock_ledger')
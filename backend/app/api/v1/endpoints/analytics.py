@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.api import deps
 from app.models.user import User
 from app.models.sale import Sale
+from app.services.classification_service import ClassificationService
 import numpy as np
 import os
 import joblib
@@ -49,4 +51,19 @@ def financial_forecast(business_id: int, db: Session = Depends(deps.get_db), cur
     return {
         "predicted_revenue_next_7_days": predictions.tolist(),
         "confidence": float(model.score(X, y)),
-    } 
\ No newline at end of file
+    }
+
+@router.get("/inventory/classification")
+def inventory_classification(
+    branch_id: Optional[int] = None,
+    abc_class: Optional[str] = Query(None, regex="^[ABC]$"),
+    xyz_class: Optional[str] = Query(None, regex="^[XYZ]$"),
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_user),
+):
+    """
+    ABC/XYZ classification matrix: items, units and stock value per class.
+    """
+    if branch_id is not None and not current_user.can_access_branch(branch_id):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return ClassificationService.summary(db, branch_id=branch_id, abc_class=abc_class, xyz_class=xyz_class)
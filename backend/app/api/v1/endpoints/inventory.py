@@ -1,8 +1,12 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse
 from app import crud, models, schemas
 from app.api import deps
+from app.core.exceptions import InsufficientStockException
+from app.services.transfer_service import TransferService
+from app.services.batch_service import BatchService
 
 router = APIRouter()
 
@@ -115,21 +119,76 @@ def get_branch_inventory(
     branch_id: int,
     skip: int = 0,
     limit: int = 100,
+    abc_class: Optional[str] = Query(None, regex="^[ABC]$"),
+    xyz_class: Optional[str] = Query(None, regex="^[XYZ]$"),
     current_user: models.User = Depends(deps.get_current_user),
 ) -> Any:
     """
-    Get inventory for a specific branch.
+    Get inventory for a specific branch, optionally filtered by ABC/XYZ class.
     """
     if not current_user.can_access_branch(branch_id):
         raise HTTPException(
             status_code=403,
             detail="Not enough permissions",
         )
-    inventory = crud.inventory.get_multi_by_branch(
-        db=db, branch_id=branch_id, skip=skip, limit=limit
+    inventory = crud.inventory.get_multi(
+        db=db, branch_id=branch_id, skip=skip, limit=limit,
+        abc_class=abc_class, xyz_class=xyz_class
     )
     return inventory
 
+@router.get("/stock/{branch_id}/expiring", response_model=List[schemas.InventoryBatch])
+def get_expiring_stock(
+    *,
+    db: Session = Depends(deps.get_db),
+    branch_id: int,
+    days: int = Query(30, ge=0),
+    include_expired: bool = False,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Get stock batches at a branch that expire within the given number of days.
+    """
+    if not current_user.can_access_branch(branch_id):
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions",
+        )
+    return BatchService.expiring(
+        db, branch_id=branch_id, within_days=days,
+        include_expired=include_expired, skip=skip, limit=limit
+    )
+
+@router.post("/stock/{branch_id}/batches", response_model=List[schemas.InventoryBatch])
+def receive_batches(
+    *,
+    db: Session = Depends(deps.get_db),
+    branch_id: int,
+    batches_in: List[schemas.InventoryBatchCreate],
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Receive stock at a branch as tracked batches with expiry dates.
+    """
+    if not current_user.has_permission("manage_stock"):
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions",
+        )
+    try:
+        ids = BatchService.receive(
+            db,
+            [dict(batch.dict(), branch_id=branch_id) for batch in batches_in],
+            created_by=current_user.id
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return db.query(models.InventoryBatch).filter(models.InventoryBatch.id.in_(ids)).order_by(models.InventoryBatch.id).all()
+
 @router.post("/stock/{branch_id}", response_model=schemas.Inventory)
 def add_stock(
     *,
@@ -212,10 +271,54 @@ def transfer_stock(
             status_code=403,
             detail="Not enough permissions for one or both branches",
         )
-    transfer = crud.inventory.create_transfer(
-        db=db, obj_in=transfer_in, user_id=current_user.id
-    )
-    return transfer
+    try:
+        result = TransferService.transfer_batch(
+            db, [transfer_in.dict()], requested_by=current_user.id
+        )
+    except InsufficientStockException:
+        raise HTTPException(
+            status_code=400,
+            detail="Insufficient stock in source branch",
+        )
+    return db.get(models.InventoryTransfer, result["lines"][0]["transfer_id"])
+
+@router.post("/stock/transfer/batch", response_model=schemas.InventoryTransferBatchResult)
+def transfer_stock_batch(
+    *,
+    db: Session = Depends(deps.get_db),
+    batch_in: schemas.InventoryTransferBatchCreate,
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Transfer many products between branches in one transaction.
+
+    Without ``allow_partial`` the batch is all-or-nothing: if any line lacks
+    stock nothing is moved and the short lines are reported as failed.
+    """
+    if not current_user.has_permission("manage_stock"):
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions",
+        )
+    branch_ids = {line.source_branch_id for line in batch_in.lines} | \
+        {line.target_branch_id for line in batch_in.lines}
+    if not all(current_user.can_access_branch(branch_id) for branch_id in branch_ids):
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions for one or more branches",
+        )
+    lines = [line.dict() for line in batch_in.lines]
+    try:
+        return TransferService.transfer_batch(
+            db, lines, requested_by=current_user.id, allow_partial=batch_in.allow_partial
+        )
+    except InsufficientStockException as e:
+        results = TransferService.shortage_results(lines, e)
+        failed = sum(1 for result in results if result["status"] == "failed")
+        return JSONResponse(
+            status_code=409,
+            content={"transferred": 0, "failed": failed, "lines": results},
+        )
 
 @router.get("/stock/transfers", response_model=List[schemas.InventoryTransfer])
 def get_stock_transfers(
@@ -4,6 +4,8 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app import crud, models, schemas
 from app.api import deps
+from app.services.stock_ledger_service import StockLedgerService
+from app.services.sales_velocity_service import SalesVelocityService
 
 router = APIRouter()
 
@@ -64,6 +66,65 @@ def get_inventory_summary(
     )
     return summary
 
+@router.get("/inventory/valuation")
+def get_inventory_valuation(
+    *,
+    db: Session = Depends(deps.get_db),
+    business_id: int,
+    branch_id: int = Query(None),
+    at: datetime = Query(None, description="Point in time; defaults to now"),
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Get inventory value at cost at a point in time, from the stock ledger.
+    """
+    if not current_user.has_permission("view_reports"):
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions",
+        )
+    
+    return StockLedgerService.valuation(
+        db,
+        at=at,
+        branch_id=branch_id,
+        business_id=business_id,
+    )
+
+@router.get("/inventory/dead-stock")
+def get_dead_stock(
+    *,
+    db: Session = Depends(deps.get_db),
+    business_id: int,
+    branch_id: int = Query(None),
+    days: int = Query(None, ge=1, description="Days without sales; defaults to DEAD_STOCK_DAYS"),
+    kind: str = Query("dead", enum=["dead", "slow"]),
+    max_units: int = Query(None, ge=0, description="Slow movers: most units sold in 30 days"),
+    skip: int = 0,
+    limit: int = Query(100, le=1000),
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Get stock value tied up in items without sales in the given number of
+    days (or slow movers), per branch.
+    """
+    if not current_user.has_permission("view_reports"):
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions",
+        )
+    
+    return SalesVelocityService.dead_stock(
+        db,
+        branch_id=branch_id,
+        business_id=business_id,
+        days=days,
+        slow=kind == "slow",
+        max_units=max_units,
+        skip=skip,
+        limit=limit,
+    )
+
 @router.get("/sales/trends", response_model=List[schemas.SalesTrend])
 def get_sales_trends(
     *,
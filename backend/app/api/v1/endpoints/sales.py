@@ -1,9 +1,13 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app import crud, models, schemas
 from app.api import deps
 from app.api.v1.endpoints.firebase import broadcast_notification
+from app.services.pricing_service import PricingService
+from app.services.sale_sync_service import SaleSyncService
+from app.utils.pagination import NEXT_CURSOR_HEADER, keyset_page, next_cursor
 
 router = APIRouter()
 
@@ -30,23 +34,99 @@ async def create_transaction(
     await broadcast_notification(f"New sale created by {current_user.email} for {transaction.total}!")
     return transaction
 
+@router.post("/sync", response_model=schemas.SaleSyncResponse)
+async def sync_offline_sales(
+    *,
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Upload sales recorded offline as NDJSON (one sale per line, optionally
+    gzip-compressed). Sales already synced are reported as duplicates.
+    """
+    if not current_user.has_permission("process_sales"):
+        raise HTTPException(
+            status_code=403,
+            detail="Not enough permissions",
+        )
+    payload = await request.body()
+    content_encoding = request.headers.get("content-encoding")
+
+    def parse_and_sync():
+        # Decompressing and parsing up to SALE_SYNC_MAX_BYTES is CPU work; keep it off the event loop
+        entries = SaleSyncService.parse(payload, content_encoding=content_encoding)
+        return SaleSyncService.sync(
+            db, entries, created_by=current_user.id, can_access_branch=current_user.can_access_branch
+        )
+
+    return await run_in_threadpool(parse_and_sync)
+
+@router.post("/quote", response_model=schemas.SaleQuoteResponse)
+def quote_sale(
+    *,
+    db: Session = Depends(deps.get_db),
+    quote_in: schemas.SaleQuote,
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Price a basket (promotions, discounts and taxes) without recording a sale.
+    """
+    return PricingService.price_basket(db, _basket(quote_in))
+
+@router.post("/quotes", response_model=List[schemas.SaleQuoteResponse])
+def quote_sales(
+    *,
+    db: Session = Depends(deps.get_db),
+    quotes_in: List[schemas.SaleQuote],
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Price several baskets in one pass.
+    """
+    return PricingService.price_baskets(db, [_basket(quote_in) for quote_in in quotes_in])
+
+@router.post("/reprice", response_model=schemas.SaleRepriceResponse)
+def reprice_sales(
+    *,
+    db: Session = Depends(deps.get_db),
+    reprice_in: schemas.SaleReprice,
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Reprice stored (by default pending) sales at the current prices, promotions and tax rates.
+    """
+    return PricingService.reprice_sales(
+        db, branch_id=reprice_in.branch_id, sale_ids=reprice_in.sale_ids, status=reprice_in.status.value
+    )
+
+def _basket(quote_in: schemas.SaleQuote) -> dict:
+    basket = quote_in.dict()
+    basket['items'] = [item.dict() for item in quote_in.items]
+    return basket
+
 @router.get("/transactions/", response_model=List[schemas.Transaction])
 def get_transactions(
     *,
     db: Session = Depends(deps.get_db),
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: models.User = Depends(deps.get_current_user),
 ) -> Any:
     """
-    Retrieve transactions.
+    Retrieve transactions, newest first.
+    Send the X-Next-Cursor header of a page back as ``cursor`` for the next one.
     """
-    if current_user.role == models.UserRole.OWNER:
-        transactions = crud.transaction.get_multi(db=db, skip=skip, limit=limit)
-    else:
-        transactions = crud.transaction.get_multi_by_user(
-            db=db, user_id=current_user.id, skip=skip, limit=limit
-        )
+    query = db.query(models.Transaction)
+    if current_user.role != models.UserRole.OWNER:
+        query = query.filter(models.Transaction.cashier_id == current_user.id)
+    query = keyset_page(query, models.Transaction, cursor=cursor)
+    transactions = query.limit(limit).all() if cursor else query.offset(skip).limit(limit).all()
+    following = next_cursor(transactions, limit)
+    if following:
+        response.headers[NEXT_CURSOR_HEADER] = following
     return transactions
 
 @router.get("/transactions/{transaction_id}", response_model=schemas.Transaction)
@@ -164,19 +244,24 @@ async def create_order(
 def get_orders(
     *,
     db: Session = Depends(deps.get_db),
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: models.User = Depends(deps.get_current_user),
 ) -> Any:
     """
-    Retrieve orders.
+    Retrieve orders, newest first.
+    Send the X-Next-Cursor header of a page back as ``cursor`` for the next one.
     """
-    if current_user.role == models.UserRole.OWNER:
-        orders = crud.order.get_multi(db=db, skip=skip, limit=limit)
-    else:
-        orders = crud.order.get_multi_by_user(
-            db=db, user_id=current_user.id, skip=skip, limit=limit
-        )
+    query = db.query(models.Order)
+    if current_user.role != models.UserRole.OWNER:
+        query = query.filter(models.Order.user_id == current_user.id)
+    query = keyset_page(query, models.Order, cursor=cursor)
+    orders = query.limit(limit).all() if cursor else query.offset(skip).limit(limit).all()
+    following = next_cursor(orders, limit)
+    if following:
+        response.headers[NEXT_CURSOR_HEADER] = following
     return orders
 
 @router.get("/orders/{order_id}", response_model=schemas.Order)
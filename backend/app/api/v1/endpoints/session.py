@@ -2,7 +2,6 @@ from fastapi import APIRouter, Depends, HTTPException
 from app.core import session as session_utils
 from app.api import deps
 from app.models.user import User
-from app.extensions import redis_client
 
 router = APIRouter()
 
@@ -30,23 +29,13 @@ def destroy_session(session_id: str):
 
 @router.get("/list")
 def list_sessions(current_user: User = Depends(deps.get_current_user)):
-    pattern = "session:*"
-    session_keys = redis_client.keys(pattern)
-    user_sessions = []
-    for key in session_keys:
-        session = redis_client.hgetall(key)
-        if session.get("user_id") == str(current_user.id):
-            user_sessions.append({"session_id": key.split(":", 1)[1], **session})
+    user_sessions = [
+        {"session_id": session.id, **session._asdict()}
+        for session in session_utils.session_store.user_sessions(current_user.id)
+    ]
     return {"sessions": user_sessions}
 
 @router.delete("/force-logout")
 def force_logout(current_user: User = Depends(deps.get_current_user)):
-    pattern = "session:*"
-    session_keys = redis_client.keys(pattern)
-    count = 0
-    for key in session_keys:
-        session = redis_client.hgetall(key)
-        if session.get("user_id") == str(current_user.id):
-            redis_client.delete(key)
-            count += 1
-    return {"success": True, "sessions_terminated": count} 
\ No newline at end of file
+    count = session_utils.session_store.revoke_user(current_user.id)
+    return {"success": True, "sessions_terminated": count}
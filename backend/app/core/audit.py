@@ -3,6 +3,7 @@ from fastapi import Request
 from sqlalchemy.orm import Session
 from ..models.audit_log import AuditLog
 from ..core.logging import logger
+from ..utils.pagination import keyset_page
 
 class AuditService:
     def __init__(self, db: Session):
@@ -42,15 +43,18 @@ class AuditService:
         user_id: int,
         skip: int = 0,
         limit: int = 100,
+        cursor: Optional[str] = None,
     ) -> list[AuditLog]:
         """
-        Get audit logs for a user.
+        Get audit logs for a user, newest first.
+        Pass the ``next_cursor`` of the previous page as ``cursor`` to page by
+        keyset instead of ``skip``.
         """
-        return (
-            self.db.query(AuditLog)
-            .filter(AuditLog.user_id == user_id)
-            .order_by(AuditLog.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        ) 
\ No newline at end of file
+        query = keyset_page(
+            self.db.query(AuditLog).filter(AuditLog.user_id == user_id),
+            AuditLog,
+            cursor=cursor,
+        )
+        if cursor:
+            return query.limit(limit).all()
+        return query.offset(skip).limit(limit).all()
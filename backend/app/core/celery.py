@@ -11,16 +11,38 @@ celery_app = Celery(
 celery_app.conf.task_routes = {
     "app.core.notifications.*": {"queue": "notifications"},
     "app.core.email.*": {"queue": "emails"},
+    "app.core.stock_tasks.*": {"queue": "inventory"},
 }
 
 celery_app.conf.beat_schedule = {
     "check-low-stock-alerts": {
         "task": "app.core.notifications.check_low_stock_alerts",
-        "schedule": crontab(minute="*/30"),  # Every 30 minutes
+        "schedule": crontab(minute="*/15"),  # Every 15 minutes (covers out of stock too)
     },
-    "check-out-of-stock-alerts": {
-        "task": "app.core.notifications.check_out_of_stock_alerts",
-        "schedule": crontab(minute="*/15"),  # Every 15 minutes
+    "snapshot-stock-ledger": {
+        "task": "app.core.stock_tasks.snapshot_stock_ledger",
+        "schedule": crontab(hour=1, minute=0),  # Daily at 01:00
+    },
+    "reconcile-stock-ledger": {
+        "task": "app.core.stock_tasks.reconcile_stock_ledger",
+        "schedule": crontab(hour=1, minute=30),  # Daily at 01:30
+    },
+    "recalculate-reorder-points": {
+        "task": "app.core.stock_tasks.recalculate_reorder_points",
+        "schedule": crontab(hour=2, minute=0),  # Daily at 02:00
+    },
+    "refresh-sales-velocity": {
+        "task": "app.core.stock_tasks.refresh_sales_velocity",
+        "schedule": crontab(hour=2, minute=15),  # Daily at 02:15
+    },
+    "refresh-inventory-classification": {
+        "task": "app.core.stock_tasks.refresh_inventory_classification",
+        "schedule": crontab(hour=2, minute=30),  # Daily at 02:30
+    },
+    "reclassify-all-inventory": {
+        "task": "app.core.stock_tasks.refresh_inventory_classification",
+        "schedule": crontab(hour=3, minute=0, day_of_week=0),  # Sundays at 03:00
+        "kwargs": {"full": True},
     },
 }
 
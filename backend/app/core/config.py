@@ -1,4 +1,4 @@
-from typing import List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any
 from pydantic import PostgresDsn, field_validator, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
@@ -73,6 +73,14 @@ class Settings(BaseSettings):
         description="JSON list of allowed file extensions"
     )
 
+    # Image Settings
+    IMAGE_DIR: str = "images"  # Content-addressed images, under UPLOAD_DIR
+    IMAGE_THUMBNAIL_SIZES: List[int] = [128, 512]  # Longest side of each WebP thumbnail
+    IMAGE_MAX_DIMENSION: int = 2048  # Longest side of the full-size WebP
+    IMAGE_WEBP_QUALITY: int = 80
+    IMAGE_MAX_PIXELS: int = 40_000_000  # Larger images are rejected (decompression bombs)
+    IMAGE_WORKERS: int = 0  # Image processing processes; 0 for one per CPU
+
     # Logging Settings
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -103,6 +111,31 @@ class Settings(BaseSettings):
     FACEBOOK_CLIENT_ID: Optional[str] = None
     FACEBOOK_CLIENT_SECRET: Optional[str] = None
 
+    # Rate Limit Settings ("<requests>/<seconds>" token buckets, shared by all workers through Redis)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_IP: str = "100/60"  # Requests without a valid bearer token, per client IP
+    RATE_LIMIT_USER: str = "600/60"  # Requests with a valid bearer token, per user
+    RATE_LIMIT_ROUTES: Dict[str, str] = {  # Path pattern -> extra limit per user or IP on matching paths
+        r"/api/v1/auth/(login.*|business-login|supplier/login|customer/login|register|change-password|reset-password.*|password-reset)": "5/60",
+    }
+    RATE_LIMIT_EXEMPT_PATHS: str = r"/metrics|/docs.*|/redoc|/openapi\.json|/api/v1/health.*|/uploads/.*"
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.1  # Seconds before a Redis call counts as failed
+    RATE_LIMIT_REDIS_RETRY: int = 5  # Seconds limiting per worker after Redis fails
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 100000  # Buckets kept per worker while Redis is unreachable
+
+    # Session Settings
+    SESSION_TTL: int = 86400  # Seconds a login session lasts
+    SESSION_CACHE_TTL: float = 5.0  # Seconds a worker serves a validated session from memory
+    SESSION_CACHE_SIZE: int = 10000  # Sessions cached per worker
+    SESSION_REVOKED_CHANNEL: str = "sessions:revoked"  # Redis channel for revoked session IDs
+    SESSION_FLUSH_INTERVAL: float = 1.0  # Seconds session rows wait to be written in a batch
+    SESSION_FLUSH_BATCH_SIZE: int = 500  # Session changes written per transaction
+
+    # Password Hashing Settings
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # bcrypt cost of new hashes; older hashes are upgraded on login
+    PASSWORD_HASH_WORKERS: int = 2  # Threads hashing passwords, per API worker
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64  # Hashing calls waiting for a thread before requests get 503
+
     # Backup Settings
     BACKUP_DIR: str = "backups"
     BACKUP_SCHEDULE: str = "0 0 * * *"  # Daily at midnight
@@ -113,11 +146,69 @@ class Settings(BaseSettings):
     CACHE_MAX_SIZE: int = 1000
     CACHE_STRATEGY: str = "LRU"
 
+    # Idempotency Settings
+    IDEMPOTENCY_TTL: int = 86400  # Seconds a completed response is replayed
+    IDEMPOTENCY_LOCK_TTL: int = 60  # Seconds an in-flight request holds its key
+    IDEMPOTENCY_WAIT: float = 10.0  # Seconds a retry waits for an in-flight original
+    IDEMPOTENCY_REDIS_TIMEOUT: float = 0.1  # Seconds before a Redis call counts as failed
+    IDEMPOTENCY_REDIS_RETRY: int = 5  # Seconds requests run unprotected after Redis fails
+    IDEMPOTENT_PATHS: List[str] = [  # POST routes honouring Idempotency-Key, matched in full
+        r"/api/v1/sales/sales",
+        r"/api/v1/sales/sales/[^/]+/items",
+        r"/api/v1/sales/sync",
+        r"/api/v1/sales/quotes?",
+        r"/api/v1/sales/reprice",
+        r"/api/v1/sales/transactions/",
+        r"/api/v1/sales/transactions/[^/]+/(complete|cancel)",
+        r"/api/v1/sales/orders/",
+        r"/api/v1/sales/orders/[^/]+/(process|cancel)",
+    ]
+
+    # Offline Sale Sync Settings
+    SALE_SYNC_MAX_SALES: int = 10000  # Sales per upload
+    SALE_SYNC_MAX_BYTES: int = 50 * 1024 * 1024  # Decompressed upload size
+    SALE_SYNC_CHUNK_SIZE: int = 500  # Sales per transaction
+
+    # Pricing Settings
+    PRICING_RULES_CACHE_TTL: int = 300  # Seconds a branch's tax and promotion rules stay cached
+    PRICING_REDIS_TIMEOUT: float = 0.1  # Seconds before a rule version check counts as failed
+    PRICING_REDIS_RETRY: int = 5  # Seconds cached rules are used unchecked after Redis fails
+
+    # Search Settings
+    SEARCH_FUZZY_MIN_LENGTH: int = 4  # Shortest autocomplete term corrected for typos
+    SEARCH_FUZZY_MAX_CANDIDATES: int = 50  # Corrected spellings tried per term
+    SEARCH_FUZZY_SIMILARITY: float = 0.4  # pg_trgm word similarity threshold (PostgreSQL)
+
+    # Scan Index Settings
+    SCAN_INDEX_ENABLED: bool = True  # Keep an in-memory SKU/barcode index in each API worker
+    SCAN_INDEX_CHANNEL: str = "scan_index:changes"  # Redis channel for product change notifications
+    SCAN_INDEX_RELOAD_INTERVAL: int = 3600  # Seconds between full reloads (catches missed notifications)
+    SCAN_INDEX_REDIS_TIMEOUT: float = 0.5  # Seconds before publishing a change counts as failed
+    SCAN_INDEX_REDIS_RETRY: int = 5  # Seconds changes go unpublished after Redis fails
+
+    # Catalog Sync Settings
+    CATALOG_SYNC_PAGE_SIZE: int = 5000  # Changed rows per GET /products/changes response
+
     # Analytics Settings
     ANALYTICS_ENABLED: bool = True
     ANALYTICS_SAMPLE_RATE: float = 1.0
     ANALYTICS_BATCH_SIZE: int = 100
 
+    # Replenishment Settings
+    REORDER_HISTORY_DAYS: int = 90  # Sales history used to estimate demand
+    REORDER_SERVICE_LEVEL: float = 0.95  # Probability of not stocking out during lead time
+    REORDER_LEAD_TIME_DAYS: int = 7  # Used when an inventory row has no lead time
+    REORDER_REVIEW_DAYS: int = 14  # Days of demand covered by one reorder
+
+    # ABC/XYZ Classification Settings
+    CLASSIFICATION_HISTORY_DAYS: int = 90  # Sales history used for classification
+    ABC_A_SHARE: float = 0.8  # Top items making up this share of branch revenue are A
+    ABC_B_SHARE: float = 0.95  # Items up to this cumulative share are B, the rest C
+    XYZ_X_MAX_CV: float = 0.5  # Daily demand coefficient of variation for X
+    XYZ_Y_MAX_CV: float = 1.0  # Daily demand coefficient of variation for Y, above is Z
+    DEAD_STOCK_DAYS: int = 90  # Stock without sales for this many days is dead
+    SLOW_MOVER_UNITS_30D: int = 2  # Stock selling at most this many units in 30 days is slow
+
     # Notification Settings
     NOTIFICATION_QUEUE_SIZE: int = 1000
     NOTIFICATION_BATCH_SIZE: int = 100
@@ -45,4 +45,24 @@ class BadRequestException(HTTPException):
         super().__init__(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=detail
-        ) 
\ No newline at end of file
+        )
+
+class ServiceUnavailableException(HTTPException):
+    def __init__(self, detail: str = "Service temporarily unavailable", retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class InsufficientStockException(BusinessException):
+    def __init__(self, shortages: list):
+        self.shortages = shortages
+        items = ", ".join(
+            f"{s['key']} (requested {s['requested']}, available {s['available']})"
+            for s in shortages
+        )
+        super().__init__(
+            detail=f"Insufficient stock for {items}",
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
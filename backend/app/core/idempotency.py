@@ -0,0 +1,232 @@
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from redis import Redis
+from redis.backoff import NoBackoff
+from redis.exceptions import RedisError
+from redis.retry import Retry
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from ..core.config import settings
+from ..core.logging import logger
+from ..core.rate_limit import bearer_user_id
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+# Responses that depend on who is asking or when, not on the request itself,
+# are not stored so a retry re-executes.
+NOT_STORED_STATUSES = {401, 403, 408, 429}
+
+POLL_INTERVAL = 0.1
+
+# Replace or drop the record only if it still belongs to the caller's attempt.
+_FINISH_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current or cjson.decode(current)['token'] ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] == '' then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return 1
+"""
+
+class IdempotencyStore:
+    """
+    Redis-backed record of requests made with an ``Idempotency-Key``.
+
+    A key holds a JSON record that is ``in_progress`` while the first request
+    runs (created with ``SET NX`` and a short TTL, so a crashed worker cannot
+    block the key forever) and ``completed`` with the stored response once it
+    finishes. Every attempt carries a random token; only the attempt that
+    created the record can complete or release it.
+    """
+
+    def __init__(self, client: Optional[Redis] = None):
+        self.client = client or Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            socket_timeout=settings.IDEMPOTENCY_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.IDEMPOTENCY_REDIS_TIMEOUT,
+            retry=Retry(NoBackoff(), 0)  # Fail fast; the middleware backs off instead
+        )
+        self._finish = self.client.register_script(_FINISH_SCRIPT)
+
+    def begin(self, key: str, token: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Claim ``key``; return the existing record if another attempt holds it."""
+        record = json.dumps({'state': 'in_progress', 'token': token, 'fingerprint': fingerprint})
+        if self.client.set(key, record, nx=True, ex=settings.IDEMPOTENCY_LOCK_TTL):
+            return None
+        existing = self.client.get(key)
+        if existing is None:
+            # Expired or released between the two calls; try again
+            return self.begin(key, token, fingerprint)
+        return json.loads(existing)
+
+    def complete(self, key: str, token: str, fingerprint: str, response: Dict[str, Any]) -> bool:
+        """Store the response of the attempt holding ``key``."""
+        record = json.dumps({
+            'state': 'completed',
+            'token': token,
+            'fingerprint': fingerprint,
+            'response': response,
+        })
+        return bool(self._finish(keys=[key], args=[token, record, settings.IDEMPOTENCY_TTL]))
+
+    def release(self, key: str, token: str) -> bool:
+        """Drop the in-progress record so the request can be retried."""
+        return bool(self._finish(keys=[key], args=[token, '', 0]))
+
+class IdempotencyMiddleware:
+    """
+    Replay the stored response for a retried POST with the same
+    ``Idempotency-Key`` instead of executing it again.
+
+    Applies to POST requests to an ``IDEMPOTENT_PATHS`` route that send the
+    header. Keys are scoped to the path and the user of the bearer token, so a
+    retry still replays after the client refreshes its token. A retry with
+    the same key but a different body is rejected with 422; a retry of a
+    request that is still running waits up to ``IDEMPOTENCY_WAIT`` seconds
+    for it, then gets 409. Server errors are not stored. If Redis fails,
+    requests run without idempotency protection for
+    ``IDEMPOTENCY_REDIS_RETRY`` seconds before Redis is tried again.
+    """
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self.store = store
+        self.paths = re.compile('|'.join(f'(?:{pattern})' for pattern in settings.IDEMPOTENT_PATHS))
+        self._redis_retry_at = 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or not self.paths.fullmatch(scope['path']):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope['headers'])
+        raw_key = headers.get(IDEMPOTENCY_HEADER)
+        if raw_key is None or time.monotonic() < self._redis_retry_at:
+            await self.app(scope, receive, send)
+            return
+        if not raw_key or len(raw_key) > MAX_KEY_LENGTH:
+            await JSONResponse(
+                {'detail': f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}, status_code=400
+            )(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        key = 'idempotency:' + hashlib.sha256(b'\0'.join([
+            scope['path'].encode(), (bearer_user_id(scope) or '').encode(), raw_key
+        ])).hexdigest()
+        fingerprint = hashlib.sha256(body).hexdigest()
+        token = uuid.uuid4().hex
+
+        if self.store is None:
+            self.store = IdempotencyStore()
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+        try:
+            record = await run_in_threadpool(self.store.begin, key, token, fingerprint)
+            while record is not None:
+                if record['fingerprint'] != fingerprint:
+                    await JSONResponse(
+                        {'detail': "Idempotency-Key was already used with a different request body"},
+                        status_code=422
+                    )(scope, receive, send)
+                    return
+                if record['state'] == 'completed':
+                    await self._replay(record['response'], send)
+                    return
+                if time.monotonic() >= deadline:
+                    await JSONResponse(
+                        {'detail': "A request with this Idempotency-Key is still being processed"},
+                        status_code=409, headers={'Retry-After': '1'}
+                    )(scope, receive, send)
+                    return
+                await asyncio.sleep(POLL_INTERVAL)
+                record = await run_in_threadpool(self.store.begin, key, token, fingerprint)
+        except (RedisError, OSError) as e:
+            if not self._redis_retry_at:  # Once per outage
+                logger.warning("Idempotency store cannot reach Redis (%s); processing requests without it", e)
+            self._redis_retry_at = time.monotonic() + settings.IDEMPOTENCY_REDIS_RETRY
+            await self.app(scope, self._replay_body(body, receive), send)
+            return
+        if self._redis_retry_at:
+            logger.info("Idempotency store reached Redis again")
+            self._redis_retry_at = 0.0
+
+        response = {'status': 500, 'headers': [], 'body': []}
+
+        async def capture(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = [[name.decode('latin-1'), value.decode('latin-1')]
+                                       for name, value in message.get('headers', [])]
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, self._replay_body(body, receive), capture)
+        except BaseException:
+            await self._finish(self.store.release, key, token)
+            raise
+
+        if response['status'] >= 500 or response['status'] in NOT_STORED_STATUSES:
+            await self._finish(self.store.release, key, token)
+        else:
+            stored = {
+                'status': response['status'],
+                'headers': response['headers'],
+                'body': base64.b64encode(b''.join(response['body'])).decode(),
+            }
+            await self._finish(self.store.complete, key, token, fingerprint, stored)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks: List[bytes] = []
+        while True:
+            message = await receive()
+            if message['type'] != 'http.request':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+    @staticmethod
+    def _replay_body(body: bytes, receive):
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+
+        return replay
+
+    @staticmethod
+    async def _replay(response: Dict[str, Any], send) -> None:
+        headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in response['headers']]
+        headers.append((b'idempotent-replayed', b'true'))
+        await send({'type': 'http.response.start', 'status': response['status'], 'headers': headers})
+        await send({'type': 'http.response.body', 'body': base64.b64decode(response['body'])})
+
+    @staticmethod
+    async def _finish(method, *args) -> None:
+        try:
+            await run_in_threadpool(method, *args)
+        except RedisError:
+            logger.warning("Could not update idempotency record %s", args[0])
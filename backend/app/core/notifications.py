@@ -121,68 +121,24 @@ def send_sms_notification(user_id: int, notification_id: int):
 @celery_app.task
 def check_low_stock_alerts():
     """
-    Periodic task to check for low stock and create notifications.
+    Periodic task to detect low / out of stock crossings and notify branch
+    managers and business owners (one notification per branch and state).
     """
     from app.db.session import SessionLocal
-    
+    from app.services.stock_alert_service import StockAlertService
+
     db = SessionLocal()
     try:
-        # Get all inventory items with low stock
-        low_stock_items = db.query(models.Inventory).filter(
-            models.Inventory.is_low_stock()
-        ).all()
-        
-        for item in low_stock_items:
-            # Create notification for each low stock item
-            notification = models.Notification(
-                type=schemas.NotificationType.LOW_STOCK,
-                title=f"Low Stock Alert: {item.product.name}",
-                message=f"Product {item.product.name} is running low on stock at {item.branch.name}. "
-                        f"Current quantity: {item.quantity}, Reorder point: {item.reorder_point}",
-                priority=schemas.NotificationPriority.HIGH,
-                data={
-                    "product_id": item.product_id,
-                    "branch_id": item.branch_id,
-                    "quantity": item.quantity,
-                    "reorder_point": item.reorder_point
-                },
-                target_roles=[models.UserRole.OWNER, models.UserRole.BRANCH_MANAGER]
-            )
-            db.add(notification)
-        
-        db.commit()
+        return StockAlertService.run(db)
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 
 @celery_app.task
 def check_out_of_stock_alerts():
     """
-    Periodic task to check for out of stock items and create notifications.
+    Kept for already-queued tasks; out of stock is handled by the same job.
     """
-    from app.db.session import SessionLocal
-    
-    db = SessionLocal()
-    try:
-        # Get all out of stock items
-        out_of_stock_items = db.query(models.Inventory).filter(
-            models.Inventory.quantity == 0
-        ).all()
-        
-        for item in out_of_stock_items:
-            # Create notification for each out of stock item
-            notification = models.Notification(
-                type=schemas.NotificationType.OUT_OF_STOCK,
-                title=f"Out of Stock Alert: {item.product.name}",
-                message=f"Product {item.product.name} is out of stock at {item.branch.name}.",
-                priority=schemas.NotificationPriority.URGENT,
-                data={
-                    "product_id": item.product_id,
-                    "branch_id": item.branch_id
-                },
-                target_roles=[models.UserRole.OWNER, models.UserRole.BRANCH_MANAGER]
-            )
-            db.add(notification)
-        
-        db.commit()
-    finally:
-        db.close() 
\ No newline at end of file
+    return check_low_stock_alerts()
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, TypeVar
+
+import bcrypt
+from prometheus_client import Counter, Gauge, Histogram
+from werkzeug.security import check_password_hash
+
+from .config import settings
+from .exceptions import ServiceUnavailableException
+
+T = TypeVar('T')
+
+PASSWORD_HASH_QUEUE_TIME = Histogram(
+    'password_hash_queue_seconds',
+    'Time password hashing work waited for a worker thread',
+    ['operation'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+PASSWORD_HASH_TIME = Histogram(
+    'password_hash_seconds',
+    'Time spent hashing or verifying a password',
+    ['operation'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1, 2)
+)
+PASSWORD_HASH_PENDING = Gauge(
+    'password_hash_pending',
+    'Password hashing work queued or running'
+)
+PASSWORD_HASH_REJECTED = Counter(
+    'password_hash_rejected_total',
+    'Password hashing work rejected because the queue was full'
+)
+
+class PasswordHasher:
+    """
+    Password hashing and verification off the event loop.
+
+    bcrypt is deliberately slow (tens to hundreds of milliseconds per call)
+    and holds the CPU while it runs, so in an ``async def`` route it stalls
+    every other request on the worker. The async methods run it on a
+    dedicated pool of ``PASSWORD_HASH_WORKERS`` threads instead, which also
+    caps how much CPU a burst of logins can take. At most
+    ``PASSWORD_HASH_QUEUE_LIMIT`` calls wait for a thread; beyond that the
+    request is rejected with 503 and ``Retry-After`` rather than queueing
+    for longer than a client would wait.
+
+    New hashes use bcrypt with ``PASSWORD_BCRYPT_ROUNDS``. Hashes made with
+    other rounds, and the werkzeug hashes (scrypt, pbkdf2) that older
+    accounts have, still verify; ``verify_and_update`` returns a new hash for
+    them so the login that proved the password can store it.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    # Synchronous API, for code that already runs in a thread (sync routes, CRUD helpers, scripts)
+
+    def hash_sync(self, password: str) -> str:
+        """Hash a password with the configured bcrypt cost."""
+        salt = bcrypt.gensalt(rounds=settings.PASSWORD_BCRYPT_ROUNDS)
+        return bcrypt.hashpw(_secret(password), salt).decode('ascii')
+
+    def verify_sync(self, password: str, hashed: Optional[str]) -> bool:
+        """Whether a password matches a bcrypt or werkzeug hash; False for empty or malformed hashes."""
+        if not password or not hashed:
+            return False
+        if _is_bcrypt(hashed):
+            try:
+                return bcrypt.checkpw(_secret(password), hashed.encode('ascii'))
+            except ValueError:
+                return False
+        try:
+            return check_password_hash(hashed, password)
+        except (ValueError, TypeError):
+            return False
+
+    def needs_rehash(self, hashed: Optional[str]) -> bool:
+        """Whether a hash was made with another scheme or cost than new hashes use."""
+        if not hashed or not _is_bcrypt(hashed):
+            return True
+        try:
+            return int(hashed.split('$')[2]) != settings.PASSWORD_BCRYPT_ROUNDS
+        except (IndexError, ValueError):
+            return True
+
+    def verify_and_update_sync(self, password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and rehash it if its hash is outdated.
+
+        Returns:
+            tuple: Whether the password matches, and the new hash to store (None if the hash is current)
+        """
+        if not self.verify_sync(password, hashed):
+            return False, None
+        return True, self.hash_sync(password) if self.needs_rehash(hashed) else None
+
+    # Asynchronous API, for async routes
+
+    async def hash(self, password: str) -> str:
+        """``hash_sync`` on the hashing pool."""
+        return await self._run('hash', self.hash_sync, password)
+
+    async def verify(self, password: str, hashed: Optional[str]) -> bool:
+        """``verify_sync`` on the hashing pool."""
+        return await self._run('verify', self.verify_sync, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """``verify_and_update_sync`` on the hashing pool."""
+        return await self._run('verify', self.verify_and_update_sync, password, hashed)
+
+    def shutdown(self) -> None:
+        """Stop the hashing threads."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def _run(self, operation: str, func: Callable[..., T], *args) -> T:
+        with self._lock:
+            if self._pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_LIMIT:
+                PASSWORD_HASH_REJECTED.inc()
+                raise ServiceUnavailableException("Too many sign-in attempts in progress, try again shortly")
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash'
+                )
+            executor = self._executor
+        PASSWORD_HASH_PENDING.inc()
+        queued = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            PASSWORD_HASH_QUEUE_TIME.labels(operation).observe(started - queued)
+            try:
+                return func(*args)
+            finally:
+                PASSWORD_HASH_TIME.labels(operation).observe(time.perf_counter() - started)
+
+        def release(_):
+            with self._lock:
+                self._pending -= 1
+            PASSWORD_HASH_PENDING.dec()
+
+        try:
+            future = executor.submit(timed)
+        except BaseException:
+            release(None)
+            raise
+        # Released when the work finishes, not when a disconnected client stops waiting for it
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+def _secret(password: str) -> bytes:
+    # bcrypt only uses the first 72 bytes; newer releases raise instead of truncating
+    return password.encode('utf-8')[:72]
+
+def _is_bcrypt(hashed: str) -> bool:
+    return hashed.startswith(('$2a$', '$2b$', '$2y$'))
+
+password_hasher = PasswordHasher()
@@ -1,57 +1,250 @@
-from fastapi import HTTPException, Request, status
-from fastapi.middleware.base import BaseHTTPMiddleware
+import math
+import re
 import time
-from typing import Dict, Tuple
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from jose import JWTError, jwt
+from redis.asyncio import Redis
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis.exceptions import RedisError
+from starlette.responses import JSONResponse
+
+from ..core.config import settings
 from ..core.logging import logger
 
+# Token buckets checked and charged together: the request is allowed only if
+# every bucket has the tokens, and then all of them are charged. Clock is the
+# Redis server's, so workers with skewed clocks share one view of time.
+# KEYS: bucket keys. ARGV: cost, then capacity and period (ms) per key.
+# Returns: allowed (0/1), remaining tokens and capacity of the tightest
+# bucket, milliseconds until the request would be allowed.
+_TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local allowed = 1
+local retry_ms = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = capacity / tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now_ms - (tonumber(bucket[2]) or now_ms))
+    available = math.min(capacity, available + elapsed * rate)
+    if available < cost then
+        allowed = 0
+        retry_ms = math.max(retry_ms, math.ceil((cost - available) / rate))
+    end
+    tokens[i] = available
+end
+local remaining, limit = -1, 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = capacity / tonumber(ARGV[2 * i + 1])
+    local available = tokens[i]
+    if allowed == 1 then
+        available = available - cost
+    end
+    redis.call('HSET', key, 'tokens', tostring(available), 'ts', now_ms)
+    redis.call('PEXPIRE', key, math.ceil((capacity - available) / rate) + 1000)
+    if remaining < 0 or available < remaining then
+        remaining, limit = available, capacity
+    end
+end
+return {allowed, math.floor(remaining), limit, retry_ms}
+"""
+
+def bearer_user_id(scope) -> Optional[str]:
+    """The user ID of the request's bearer token if it is valid, or None."""
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            scheme, _, token = value.decode('latin-1').partition(' ')
+            if scheme.lower() != 'bearer' or not token:
+                return None
+            try:
+                payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+            except JWTError:
+                return None
+            user_id = payload.get('user_id') or payload.get('sub')
+            return str(user_id) if user_id is not None else None
+    return None
+
+class RateLimit(NamedTuple):
+    """``requests`` per ``period`` seconds, refilled continuously, with bursts up to ``requests``."""
+    requests: int
+    period: float
+
+    @classmethod
+    def parse(cls, spec: str) -> 'RateLimit':
+        """Parse ``"<requests>/<seconds>"``, e.g. ``"100/60"``."""
+        requests, _, period = spec.partition('/')
+        limit = cls(int(requests), float(period or 1))
+        if limit.requests < 1 or limit.period <= 0:
+            raise ValueError(f"Invalid rate limit: {spec!r}")
+        return limit
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int  # Capacity of the tightest bucket
+    remaining: int  # Requests left in the tightest bucket
+    retry_after: float  # Seconds until a rejected request would be allowed
+
+class LocalTokenBuckets:
+    """
+    Token buckets in process memory, used while Redis is unreachable.
+
+    They only see this worker's traffic, so with N workers a client can make
+    up to N times the limit. The least recently used buckets are dropped
+    beyond ``max_keys``, which at worst hands a client a fresh bucket.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()  # Key -> (tokens, timestamp)
+
+    def hit(self, buckets: Sequence[Tuple[str, RateLimit]], cost: int = 1) -> RateLimitResult:
+        now = time.monotonic()
+        allowed, retry_after, state = True, 0.0, []
+        for key, limit in buckets:
+            rate = limit.requests / limit.period
+            tokens, updated = self._buckets.get(key, (limit.requests, now))
+            tokens = min(limit.requests, tokens + (now - updated) * rate)
+            if tokens < cost:
+                allowed = False
+                retry_after = max(retry_after, (cost - tokens) / rate)
+            state.append(tokens)
+        remaining, capacity = None, 0
+        for (key, limit), tokens in zip(buckets, state):
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if remaining is None or tokens < remaining:
+                remaining, capacity = tokens, limit.requests
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return RateLimitResult(allowed, capacity, math.floor(remaining or 0), math.ceil(retry_after * 1000) / 1000)
+
 class RateLimiter:
-    def __init__(self, max_requests: int, time_window: int):
-        self.max_requests = max_requests
-        self.time_window = time_window
-        self.requests: Dict[str, list[float]] = {}
+    """
+    Token-bucket rate limiter shared by all workers through Redis.
+
+    Each request costs one Lua script call, whatever the number of buckets
+    it is charged to, and each bucket is a two-field hash that expires once
+    it would be full again, so cost and memory do not grow with traffic. If
+    Redis fails, the limiter switches to ``LocalTokenBuckets`` for
+    ``RATE_LIMIT_REDIS_RETRY`` seconds before trying Redis again, so an
+    outage neither blocks requests nor turns the limit off.
+    """
 
-    def is_allowed(self, key: str) -> Tuple[bool, int]:
+    def __init__(self, client: Optional[Redis] = None, prefix: str = 'ratelimit:'):
+        self.client = client or Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            socket_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT,
+            retry=Retry(NoBackoff(), 0)  # Fail fast; hit() backs off instead
+        )
+        self.prefix = prefix
+        self.local = LocalTokenBuckets(settings.RATE_LIMIT_LOCAL_MAX_KEYS)
+        self._script = self.client.register_script(_TOKEN_BUCKET_SCRIPT)
+        self._redis_retry_at = 0.0
+
+    async def hit(self, buckets: Sequence[Tuple[str, RateLimit]], cost: int = 1) -> RateLimitResult:
         """
-        Check if a request is allowed based on rate limits.
-        Returns (is_allowed, remaining_requests)
+        Charge a request to buckets, unless one of them is empty.
+
+        Args:
+            buckets: Bucket key (without prefix) and limit for each bucket
+            cost: Tokens taken from every bucket
+
+        Returns:
+            RateLimitResult: Whether the request is allowed, and the state of the tightest bucket
         """
-        current_time = time.time()
-        if key not in self.requests:
-            self.requests[key] = []
-
-        # Remove old requests
-        self.requests[key] = [
-            t for t in self.requests[key]
-            if current_time - t < self.time_window
+        if time.monotonic() >= self._redis_retry_at:
+            args: List = [cost]
+            for _, limit in buckets:
+                args += [limit.requests, int(limit.period * 1000)]
+            try:
+                allowed, remaining, limit, retry_ms = await self._script(
+                    keys=[self.prefix + key for key, _ in buckets], args=args
+                )
+            except (RedisError, OSError) as e:
+                if not self._redis_retry_at:  # Once per outage
+                    logger.warning("Rate limiter cannot reach Redis (%s); limiting per worker", e)
+                self._redis_retry_at = time.monotonic() + settings.RATE_LIMIT_REDIS_RETRY
+            else:
+                if self._redis_retry_at:
+                    logger.info("Rate limiter reached Redis again")
+                    self._redis_retry_at = 0.0
+                return RateLimitResult(bool(allowed), int(limit), max(int(remaining), 0), int(retry_ms) / 1000)
+        return self.local.hit(buckets, cost)
+
+class RateLimitMiddleware:
+    """
+    Rate limit requests per client IP, per user and per route.
+
+    A request with a valid bearer token is charged to its user's bucket
+    (``RATE_LIMIT_USER``), any other request to its IP's bucket
+    (``RATE_LIMIT_IP``), so staff sharing a shop's IP address do not share a
+    limit. Requests whose path matches a ``RATE_LIMIT_ROUTES`` pattern are
+    also charged to a bucket for that route and user or IP, which keeps the
+    sign-in endpoints to a few attempts a minute. Rejected requests get 429
+    with ``Retry-After``; every limited response carries
+    ``X-RateLimit-Limit`` and ``X-RateLimit-Remaining``.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter
+        self.ip_limit = RateLimit.parse(settings.RATE_LIMIT_IP)
+        self.user_limit = RateLimit.parse(settings.RATE_LIMIT_USER)
+        self.routes = [
+            (re.compile(pattern), RateLimit.parse(spec)) for pattern, spec in settings.RATE_LIMIT_ROUTES.items()
         ]
+        self.exempt = re.compile(settings.RATE_LIMIT_EXEMPT_PATHS)
 
-        if len(self.requests[key]) >= self.max_requests:
-            return False, 0
-
-        self.requests[key].append(current_time)
-        return True, self.max_requests - len(self.requests[key])
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, max_requests: int = 5, time_window: int = 60):
-        super().__init__(app)
-        self.rate_limiter = RateLimiter(max_requests, time_window)
-
-    async def dispatch(self, request: Request, call_next):
-        # Only apply rate limiting to auth endpoints
-        if request.url.path.startswith("/api/v1/auth"):
-            client_ip = request.client.host
-            is_allowed, remaining = self.rate_limiter.is_allowed(client_ip)
-
-            if not is_allowed:
-                logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Too many requests",
-                    headers={"X-RateLimit-Remaining": str(remaining)},
-                )
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not settings.RATE_LIMIT_ENABLED or self.exempt.fullmatch(scope['path']):
+            await self.app(scope, receive, send)
+            return
+
+        user_id = bearer_user_id(scope)
+        if user_id is not None:
+            client = f'user:{user_id}'
+            buckets = [(client, self.user_limit)]
+        else:
+            client = f"ip:{scope['client'][0] if scope.get('client') else 'unknown'}"
+            buckets = [(client, self.ip_limit)]
+        for index, (pattern, limit) in enumerate(self.routes):
+            if pattern.fullmatch(scope['path']):
+                buckets.append((f'route:{index}:{client}', limit))
+
+        if self.limiter is None:
+            self.limiter = RateLimiter()
+        result = await self.limiter.hit(buckets)
+        headers = [
+            (b'x-ratelimit-limit', str(result.limit).encode()),
+            (b'x-ratelimit-remaining', str(result.remaining).encode()),
+        ]
+        if not result.allowed:
+            logger.warning("Rate limit exceeded for %s on %s", client, scope['path'])
+            retry_after = str(max(math.ceil(result.retry_after), 1))
+            await JSONResponse(
+                {'detail': "Too many requests"},
+                status_code=429,
+                headers={'Retry-After': retry_after, 'X-RateLimit-Limit': str(result.limit), 'X-RateLimit-Remaining': '0'}
+            )(scope, receive, send)
+            return
 
-            response = await call_next(request)
-            response.headers["X-RateLimit-Remaining"] = str(remaining)
-            return response
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': [*message.get('headers', []), *headers]}
+            await send(message)
 
-        return await call_next(request) 
\ No newline at end of file
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,388 @@
+import json
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from redis import Redis
+from redis.backoff import NoBackoff
+from redis.exceptions import RedisError
+from redis.retry import Retry
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+
+from ..models.product import Product, ProductVariant
+from ..utils.money import to_cents
+from .cache import cache
+from .config import settings
+from .logging import logger
+
+# Session.info key collecting the products and variants a transaction changed
+_CHANGED = 'scan_index_changed'
+
+class ScanRecord(NamedTuple):
+    """What the till needs for a scanned code."""
+    product_id: int
+    variant_id: Optional[int]
+    name: str
+    price: int  # Cents
+    stock: int
+
+class ScanIndex:
+    """
+    Per-worker hash index from every product SKU and barcode and every
+    variant SKU to a ``ScanRecord``, so a scan is a dict lookup.
+
+    ``start`` loads the index in a background thread and keeps it fresh:
+    committed changes to products and variants (ORM writes, the stock engine
+    and the importer) are published on ``SCAN_INDEX_CHANNEL`` and every
+    worker reloads just those rows. A worker that was disconnected from
+    Redis, or started before a change was published, reloads everything
+    on reconnect and every ``SCAN_INDEX_RELOAD_INTERVAL`` seconds.
+    Until the first load completes, and for codes it does not know,
+    ``lookup_db`` falls back to the database. Changes are sent to Redis by
+    a publisher thread, never by the committing request, and are dropped for
+    ``SCAN_INDEX_REDIS_RETRY`` seconds after Redis fails.
+
+    Product records carry ``Product.total_stock``; variant records the
+    variant's own stock and the product price plus its adjustment.
+    """
+
+    def __init__(self):
+        self._codes: Dict[str, ScanRecord] = {}
+        self._owned: Dict[Tuple[str, int], Tuple[str, ...]] = {}  # ('product' | 'variant', id) -> codes
+        self._lock = threading.Lock()
+        self._queue: 'queue.Queue[dict]' = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        self._outbox: 'queue.Queue[Optional[dict]]' = queue.Queue()
+        self._publisher: Optional[threading.Thread] = None
+        self._publisher_lock = threading.Lock()
+        self._redis: Optional[Redis] = None
+        self._redis_retry_at = 0.0
+        self._session_factory: Optional[Callable[[], Session]] = None
+        self.origin = uuid.uuid4().hex
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def lookup(self, code: str) -> Optional[ScanRecord]:
+        """Record for a scanned SKU or barcode, or None if the index does not know it."""
+        return self._codes.get(code.strip())
+
+    def lookup_db(self, db: Session, code: str) -> Optional[ScanRecord]:
+        """
+        Record for a scanned code, from the index or else the database.
+
+        Args:
+            db: Database session
+            code: Scanned SKU or barcode
+
+        Returns:
+            ScanRecord: The product or variant, or None if no product has the code
+        """
+        code = code.strip()
+        record = self._codes.get(code)
+        if record is not None:
+            return record
+        products, variants = Product.__table__, ProductVariant.__table__
+        product_ids = db.execute(
+            select(products.c.id).where(or_(products.c.sku == code, products.c.barcode == code))
+        ).scalars().all()
+        variant_ids = db.execute(select(variants.c.id).where(variants.c.sku == code)).scalars().all()
+        if not product_ids and not variant_ids:
+            return None
+        self.refresh(db, product_ids=product_ids, variant_ids=variant_ids)
+        return self._codes.get(code)
+
+    def load(self, db: Session) -> int:
+        """
+        Replace the whole index with the current products and variants.
+
+        Args:
+            db: Database session
+
+        Returns:
+            int: Number of codes indexed
+        """
+        codes, owned = {}, {}
+        for owner, record, keys in self._rows(db):
+            owned[owner] = keys
+            for code in keys:
+                codes[code] = record
+        with self._lock:
+            self._codes, self._owned = codes, owned
+        self.ready = True
+        return len(codes)
+
+    def refresh(
+        self,
+        db: Session,
+        *,
+        product_ids: Iterable[int] = (),
+        variant_ids: Iterable[int] = (),
+        skus: Iterable[str] = ()
+    ) -> None:
+        """
+        Reload some products (with their variants) and variants; codes of
+        deleted rows and replaced codes are dropped.
+
+        Args:
+            db: Database session
+            product_ids: Changed products
+            variant_ids: Changed variants
+            skus: SKUs of changed products
+        """
+        product_ids, variant_ids, skus = set(product_ids), set(variant_ids), sorted(set(skus))
+        if skus:
+            products = Product.__table__
+            product_ids.update(db.execute(select(products.c.id).where(products.c.sku.in_(skus))).scalars())
+        if not product_ids and not variant_ids:
+            return
+        rows = list(self._rows(db, product_ids=product_ids, variant_ids=variant_ids))
+        stale = {('product', product_id) for product_id in product_ids}
+        stale |= {('variant', variant_id) for variant_id in variant_ids}
+        with self._lock:
+            # Variants of changed products are reloaded too; drop theirs as well
+            stale |= {owner for owner, _, _ in rows}
+            for owner in stale:
+                for code in self._owned.pop(owner, ()):
+                    self._codes.pop(code, None)
+            for owner, record, keys in rows:
+                self._owned[owner] = keys
+                for code in keys:
+                    self._codes[code] = record
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """Load the index and follow changes in background threads."""
+        if self._threads or not settings.SCAN_INDEX_ENABLED:
+            return
+        self._session_factory = session_factory
+        self._stop.clear()
+        self._queue.put({'all': True})
+        self._threads = [
+            threading.Thread(target=self._apply_changes, name='scan-index', daemon=True),
+            threading.Thread(target=self._listen, name='scan-index-listener', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stop following changes."""
+        self._stop.set()
+        self._queue.put({})
+        self._threads = []
+        self._outbox.put(None)  # The publisher sends what is queued, then exits
+
+    @staticmethod
+    def mark_changed(
+        db: Session,
+        *,
+        product_ids: Iterable[int] = (),
+        variant_ids: Iterable[int] = (),
+        skus: Iterable[str] = (),
+        everything: bool = False
+    ) -> None:
+        """
+        Record rows changed by statements that bypass the ORM; they are
+        published when the session commits.
+
+        Args:
+            db: Database session making the change
+            product_ids: Changed products
+            variant_ids: Changed variants
+            skus: SKUs of changed products, when their IDs are not known
+            everything: Too many or unknown rows changed; reload the whole index
+        """
+        changed = db.info.setdefault(_CHANGED, {'products': set(), 'variants': set(), 'skus': set(), 'all': False})
+        changed['products'].update(product_ids)
+        changed['variants'].update(variant_ids)
+        changed['skus'].update(skus)
+        changed['all'] = changed['all'] or everything
+
+    def publish(self, changed: dict) -> None:
+        """Queue committed changes for this worker and for the publisher thread to send to the others."""
+        message = {
+            'products': sorted(changed['products']),
+            'variants': sorted(changed['variants']),
+            'skus': sorted(changed['skus']),
+            'all': changed['all'],
+        }
+        if self._threads:
+            self._queue.put(message)
+        self._outbox.put(message)
+        if self._publisher is None:
+            with self._publisher_lock:
+                if self._publisher is None:
+                    self._publisher = threading.Thread(
+                        target=self._publish_changes, name='scan-index-publisher', daemon=True
+                    )
+                    self._publisher.start()
+
+    def _publish_changes(self) -> None:
+        """Send queued changes to the other workers, merging those that queued up meanwhile."""
+        while True:
+            messages = [self._outbox.get()]
+            while True:
+                try:
+                    messages.append(self._outbox.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in messages
+            messages = [message for message in messages if message]
+            if messages and time.monotonic() >= self._redis_retry_at:
+                merged = {
+                    'products': sorted({i for message in messages for i in message['products']}),
+                    'variants': sorted({i for message in messages for i in message['variants']}),
+                    'skus': sorted({sku for message in messages for sku in message['skus']}),
+                    'all': any(message['all'] for message in messages),
+                    'origin': self.origin,
+                }
+                try:
+                    self._client().publish(settings.SCAN_INDEX_CHANNEL, json.dumps(merged))
+                except (RedisError, OSError) as e:
+                    if not self._redis_retry_at:  # Once per outage
+                        logger.warning(
+                            "Could not publish scan index changes (%s); other workers catch up on their next reload", e
+                        )
+                    self._redis_retry_at = time.monotonic() + settings.SCAN_INDEX_REDIS_RETRY
+                else:
+                    if self._redis_retry_at:
+                        logger.info("Scan index publisher reached Redis again")
+                        self._redis_retry_at = 0.0
+            if stopping:
+                with self._publisher_lock:
+                    self._publisher = None
+                return
+
+    def _client(self) -> Redis:
+        """Redis client for publishing, with short timeouts so an outage does not hold up changes."""
+        if self._redis is None:
+            self._redis = Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                password=settings.REDIS_PASSWORD,
+                socket_timeout=settings.SCAN_INDEX_REDIS_TIMEOUT,
+                socket_connect_timeout=settings.SCAN_INDEX_REDIS_TIMEOUT,
+                retry=Retry(NoBackoff(), 0)
+            )
+        return self._redis
+
+    def _listen(self) -> None:
+        """Feed change notifications from Redis to the apply thread, reconnecting as needed."""
+        delay = 1
+        while not self._stop.is_set():
+            pubsub = cache.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(settings.SCAN_INDEX_CHANNEL)
+                if delay > 1:
+                    self._queue.put({'all': True})  # Changes may have been missed while disconnected
+                delay = 1
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    try:
+                        change = json.loads(message['data'])
+                    except (TypeError, ValueError):
+                        continue
+                    if change.get('origin') != self.origin:
+                        self._queue.put(change)
+            except RedisError:
+                delay = min(delay * 2, 60)
+                self._stop.wait(delay)
+            finally:
+                try:
+                    pubsub.close()
+                except RedisError:
+                    pass
+
+    def _apply_changes(self) -> None:
+        """Apply queued changes in batches; reload everything periodically."""
+        last_load = 0.0
+        while not self._stop.is_set():
+            timeout = max(last_load + settings.SCAN_INDEX_RELOAD_INTERVAL - time.monotonic(), 0.1)
+            try:
+                changes = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                changes = [{'all': True}]
+            while True:
+                try:
+                    changes.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if self._stop.is_set():
+                return
+
+            reload_all = any(change.get('all') for change in changes)
+            product_ids: Set[int] = set()
+            variant_ids: Set[int] = set()
+            skus: Set[str] = set()
+            for change in changes:
+                product_ids.update(change.get('products', ()))
+                variant_ids.update(change.get('variants', ()))
+                skus.update(change.get('skus', ()))
+            db = self._session_factory()
+            try:
+                if reload_all:
+                    started = time.perf_counter()
+                    count = self.load(db)
+                    last_load = time.monotonic()
+                    logger.info(f"Scan index loaded {count} codes in {time.perf_counter() - started:.1f}s")
+                else:
+                    self.refresh(db, product_ids=product_ids, variant_ids=variant_ids, skus=skus)
+            except Exception:
+                logger.exception("Scan index refresh failed")
+                if reload_all:
+                    last_load = time.monotonic() - settings.SCAN_INDEX_RELOAD_INTERVAL + 30  # Retry soon
+            finally:
+                db.close()
+
+    @staticmethod
+    def _rows(db: Session, *, product_ids: Optional[Set[int]] = None, variant_ids: Optional[Set[int]] = None):
+        """``(owner, record, codes)`` for all products and variants, or only the given ones."""
+        products, variants = Product.__table__, ProductVariant.__table__
+        query = select(
+            products.c.id, products.c.name, products.c.sku, products.c.barcode,
+            products.c.price, products.c.total_stock
+        )
+        if product_ids is not None:
+            query = query.where(products.c.id.in_(sorted(product_ids)))
+        if product_ids is None or product_ids:
+            for row in db.execute(query).yield_per(10000):
+                keys = tuple(code for code in (row.sku, row.barcode) if code)
+                yield ('product', row.id), ScanRecord(row.id, None, row.name, to_cents(row.price or 0), row.total_stock or 0), keys
+
+        query = select(
+            variants.c.id, variants.c.product_id, variants.c.name, variants.c.sku, variants.c.stock,
+            variants.c.price_adjustment, products.c.name.label('product_name'), products.c.price
+        ).join(products, products.c.id == variants.c.product_id)
+        if product_ids is not None:
+            query = query.where(or_(
+                variants.c.product_id.in_(sorted(product_ids)), variants.c.id.in_(sorted(variant_ids or ()))
+            ))
+        for row in db.execute(query).yield_per(10000):
+            if row.sku:
+                yield ('variant', row.id), ScanRecord(
+                    row.product_id, row.id, f'{row.product_name} - {row.name}',
+                    to_cents(row.price or 0) + to_cents(row.price_adjustment or 0), row.stock or 0
+                ), (row.sku,)
+
+scan_index = ScanIndex()
+
+@event.listens_for(Session, 'after_flush')
+def _collect_product_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Product):
+            ScanIndex.mark_changed(session, product_ids=[obj.id])
+        elif isinstance(obj, ProductVariant):
+            ScanIndex.mark_changed(session, variant_ids=[obj.id])
+
+@event.listens_for(Session, 'after_commit')
+def _publish_product_changes(session):
+    changed = session.info.pop(_CHANGED, None)
+    if changed and any(changed.values()):
+        scan_index.publish(changed)
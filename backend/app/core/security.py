@@ -1,6 +1,5 @@
 from datetime import datetime, timedelta
 from typing import Any, Union
-from passlib.context import CryptContext
 from fastapi import HTTPException, status
 
 # Import JWT functions from our custom implementation
@@ -12,8 +11,7 @@ from app.auth.jwt import (
     get_current_active_superuser
 )
 
-# Password context for hashing and verifying passwords
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .passwords import password_hasher
 
 def create_access_token(
     subject: Union[str, Any], expires_delta: timedelta = None, **kwargs
@@ -46,12 +44,12 @@ def create_refresh_token(
     )
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify that a password matches a hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify that a password matches a hash. Blocks for the hash's cost; async routes should await password_hasher.verify"""
+    return password_hasher.verify_sync(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Generate a password hash"""
-    return pwd_context.hash(password)
+    """Generate a password hash. Blocks for the hash's cost; async routes should await password_hasher.hash"""
+    return password_hasher.hash_sync(password)
 
 def verify_token(token: str) -> dict:
     """
@@ -54,36 +54,3 @@ class SecurityMiddleware(BaseHTTPMiddleware):
                 response.headers[header] = value
                 
         return response
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, limit: int = 100, window: int = 60):
-        super().__init__(app)
-        self.limit = limit
-        self.window = window
-        self.requests = {}
-
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        current_time = int(request.scope.get("time", 0))
-        
-        # Clean up old requests
-        self.requests = {
-            ip: times
-            for ip, times in self.requests.items()
-            if current_time - min(times) < self.window
-        }
-        
-        # Check rate limit
-        if client_ip in self.requests:
-            request_times = self.requests[client_ip]
-            if len(request_times) >= self.limit:
-                logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-                return Response(
-                    content="Rate limit exceeded",
-                    status_code=429
-                )
-            request_times.append(current_time)
-        else:
-            self.requests[client_ip] = [current_time]
-        
-        return await call_next(request) 
\ No newline at end of file
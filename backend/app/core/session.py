@@ -1,35 +1,510 @@
-import uuid
+import queue
+import threading
 import time
-from app.extensions import redis_client
+import uuid
+from collections import Counter, OrderedDict
+from datetime import UTC, datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ..models.session import Session as UserSession
+from .cache import cache
+from .config import settings
+from .logging import logger
 
 SESSION_EXPIRY_SECONDS = 3600  # 1 hour
 
+_sessions = UserSession.__table__
+
+# Mark sessions inactive and tell every worker to drop them from its cache.
+# A revoked session keeps its hash, as a tombstone, until it would have
+# expired, so a database row that has not been updated yet cannot revive it.
+# KEYS: session hashes. ARGV: channel, TTL for hashes that are missing, session IDs.
+_REVOKE_SCRIPT = """
+local revoked = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('HGET', key, 'active') == '1' then
+        revoked = revoked + 1
+    end
+    redis.call('HSET', key, 'active', '0')
+    if redis.call('TTL', key) < 0 then
+        redis.call('EXPIRE', key, ARGV[2])
+    end
+end
+redis.call('PUBLISH', ARGV[1], table.concat(ARGV, ' ', 3))
+return revoked
+"""
+
+# The same for all of a user's sessions, read from the user's set in the
+# script so a session created meanwhile is either revoked or created after.
+# KEYS: the user's session set. ARGV: channel, TTL, session key prefix.
+_REVOKE_USER_SCRIPT = """
+local ids = redis.call('SMEMBERS', KEYS[1])
+for _, id in ipairs(ids) do
+    local key = ARGV[3] .. id
+    redis.call('HSET', key, 'active', '0')
+    if redis.call('TTL', key) < 0 then
+        redis.call('EXPIRE', key, ARGV[2])
+    end
+end
+redis.call('DEL', KEYS[1])
+if #ids > 0 then
+    redis.call('PUBLISH', ARGV[1], table.concat(ids, ' '))
+end
+return #ids
+"""
+
+class SessionRecord(NamedTuple):
+    id: str
+    user_id: int
+    created_at: datetime  # Naive UTC, as stored in user_sessions
+    expires_at: datetime
+    device_info: Optional[str]
+    ip_address: Optional[str]
+    is_active: bool
+
+    @property
+    def valid(self) -> bool:
+        return self.is_active and self.expires_at > datetime.now(UTC).replace(tzinfo=None)
+
+class SessionStore:
+    """
+    Login sessions kept in Redis, with their ``user_sessions`` rows written behind.
+
+    A session is a hash ``session:<id>`` that expires with the session, listed
+    in the set ``user:<user_id>:sessions``; creating one is a single pipelined
+    round trip. Its database row is queued and inserted in batches by a
+    background thread every ``SESSION_FLUSH_INTERVAL`` seconds, so logins do
+    not wait for the database; Redis is the source of truth and the table is
+    the record for listings and for sessions Redis no longer holds (after a
+    restart, they are loaded back on first use).
+
+    Each worker serves sessions it validated in the last ``SESSION_CACHE_TTL``
+    seconds from memory. Revoking a session marks its hash inactive and
+    publishes its ID on ``SESSION_REVOKED_CHANNEL`` in the same script, and
+    every worker drops it from its cache on receipt; a worker that is not
+    subscribed does not cache at all.
+
+    Revocations are written to the database before they return, so a row
+    cannot put a revoked session back into Redis, and written again behind
+    any queued inserts. If Redis fails, the revocation is applied to the
+    database alone and retried on Redis by the writer thread.
+    """
+
+    def __init__(self, prefix: str = 'session:'):
+        self.prefix = prefix
+        self._cache: 'OrderedDict[str, Tuple[SessionRecord, float]]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._revocations = 0  # Bumped on every eviction, so a read that raced one is not cached
+        self._subscribed = threading.Event()
+        self._queue: 'queue.Queue[Optional[tuple]]' = queue.Queue()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._session_factory: Optional[Callable[[], Session]] = None
+        self._pending_lock = threading.Lock()
+        self._pending: Counter = Counter()  # ('session', id) / ('user', id) with revocations not yet flushed
+        self._redis_retries: List[tuple] = []  # Revocations Redis missed
+        self._revoke = cache.redis_client.register_script(_REVOKE_SCRIPT)
+        self._revoke_user = cache.redis_client.register_script(_REVOKE_USER_SCRIPT)
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """Write session rows and follow revocations in background threads."""
+        if self._threads:
+            return
+        self._session_factory = session_factory
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._flush_loop, name='session-writer', daemon=True),
+            threading.Thread(target=self._listen, name='session-revocations', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Write the queued rows and stop the background threads."""
+        self._stop.set()
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self._threads = []
+        self._subscribed.clear()
+        with self._cache_lock:
+            self._cache.clear()
+
+    def create(
+        self,
+        user_id: int,
+        *,
+        device_info: Optional[str] = None,
+        ip_address: Optional[str] = None,
+        ttl: Optional[int] = None
+    ) -> SessionRecord:
+        """
+        Start a session.
+
+        Args:
+            user_id: User signing in
+            device_info: Client description
+            ip_address: Client address
+            ttl: Seconds the session lasts (defaults to ``SESSION_TTL``)
+
+        Returns:
+            SessionRecord: The new session
+        """
+        ttl = ttl or settings.SESSION_TTL
+        created_at = int(time.time())
+        record = SessionRecord(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            created_at=_from_timestamp(created_at),
+            expires_at=_from_timestamp(created_at + ttl),
+            device_info=device_info,
+            ip_address=ip_address,
+            is_active=True
+        )
+        try:
+            self._store(record, ttl)
+        except RedisError:
+            # Without Redis the row is the session; write it now rather than behind
+            logger.warning("Session store cannot reach Redis; writing session %s to the database", record.id)
+            self._write([('insert', record)])
+            return record
+        self._persist(('insert', record))
+        return record
+
+    def get(self, session_id: str, db: Optional[Session] = None) -> Optional[SessionRecord]:
+        """
+        A session, active or not.
+
+        Args:
+            session_id: Session ID
+            db: Database session, to look up sessions Redis does not hold
+
+        Returns:
+            SessionRecord: The session, or None if it is unknown or has expired from Redis and ``db`` was not given
+        """
+        if self._subscribed.is_set():
+            with self._cache_lock:
+                cached = self._cache.get(session_id)
+            if cached is not None and time.monotonic() - cached[1] < settings.SESSION_CACHE_TTL:
+                return cached[0]
+        revocations = self._revocations
+        try:
+            data = cache.redis_client.hgetall(self.prefix + session_id)
+        except RedisError:
+            logger.warning("Session store cannot reach Redis; reading session %s from the database", session_id)
+            return self._load(db, session_id, restore=False) if db is not None else None
+        record = _parse(session_id, data)
+        if record is None and db is not None:
+            record = self._load(db, session_id, restore=not data)
+            if record is not None and data:
+                # A tombstone: revoked before its row was updated
+                record = record._replace(is_active=False)
+        if record is not None and record.valid and self._subscribed.is_set():
+            with self._cache_lock:
+                if self._revocations != revocations:
+                    return record
+                self._cache[session_id] = (record, time.monotonic())
+                self._cache.move_to_end(session_id)
+                while len(self._cache) > settings.SESSION_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return record
+
+    def validate(self, session_id: str, db: Optional[Session] = None) -> Optional[SessionRecord]:
+        """The session if it is active and has not expired, otherwise None."""
+        record = self.get(session_id, db)
+        return record if record is not None and record.valid else None
+
+    def user_sessions(self, user_id: int) -> List[SessionRecord]:
+        """A user's valid sessions, in two round trips; forgets expired ones."""
+        key = f'user:{user_id}:sessions'
+        session_ids = sorted(cache.redis_client.smembers(key))
+        if not session_ids:
+            return []
+        pipe = cache.redis_client.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.hgetall(self.prefix + session_id)
+        records, gone = [], []
+        for session_id, data in zip(session_ids, pipe.execute()):
+            record = _parse(session_id, data)
+            if record is not None and record.valid:
+                records.append(record)
+            elif record is None:
+                gone.append(session_id)
+        if gone:
+            cache.redis_client.srem(key, *gone)
+        return records
+
+    def revoke(self, session_ids: Iterable[str]) -> int:
+        """
+        End sessions on every worker at once, in Redis and in the database.
+
+        Returns:
+            int: Number of sessions that were active
+        """
+        session_ids = list(session_ids)
+        if not session_ids:
+            return 0
+        change = ('revoke', session_ids)
+        self._hold(change)
+        try:
+            revoked = self._redis_revoke(change)
+            self._evict(session_ids)
+            written = self._write([change], raise_errors=True)
+        except Exception:
+            self._release([change])
+            raise
+        self._persist(change)  # Again after any queued insert of these sessions
+        return written if revoked is None else max(revoked, written)
+
+    def revoke_user(self, user_id: int) -> int:
+        """
+        End all of a user's sessions on every worker at once, in Redis and in the database.
+
+        Returns:
+            int: Number of sessions revoked
+        """
+        change = ('revoke_user', user_id)
+        self._hold(change)
+        try:
+            revoked = self._redis_revoke(change)
+            with self._cache_lock:
+                self._revocations += 1
+                for session_id in [key for key, (record, _) in self._cache.items() if record.user_id == user_id]:
+                    del self._cache[session_id]
+            written = self._write([change], raise_errors=True)
+        except Exception:
+            self._release([change])
+            raise
+        self._persist(change)  # Again after any queued insert of the user's sessions
+        return written if revoked is None else max(revoked, written)
+
+    def _redis_revoke(self, change: tuple) -> Optional[int]:
+        """Apply a revocation to Redis; None if Redis failed, in which case it is retried later."""
+        kind, payload = change
+        try:
+            if kind == 'revoke':
+                return int(self._revoke(
+                    keys=[self.prefix + session_id for session_id in payload],
+                    args=[settings.SESSION_REVOKED_CHANNEL, settings.SESSION_TTL, *payload]
+                ))
+            return int(self._revoke_user(
+                keys=[f'user:{payload}:sessions'],
+                args=[settings.SESSION_REVOKED_CHANNEL, settings.SESSION_TTL, self.prefix]
+            ))
+        except RedisError:
+            logger.warning("Session store cannot reach Redis; revoking in the database and retrying Redis later")
+            with self._pending_lock:
+                self._redis_retries.append(change)
+            return None
+
+    def _retry_redis(self) -> None:
+        """Apply revocations Redis missed, keeping those that fail again."""
+        with self._pending_lock:
+            retries, self._redis_retries = self._redis_retries, []
+        for change in retries:
+            self._redis_revoke(change)
+
+    def _hold(self, change: tuple) -> None:
+        """Keep rows of the revoked sessions out of Redis until the revocation is flushed."""
+        kind, payload = change
+        with self._pending_lock:
+            if kind == 'revoke':
+                self._pending.update(('session', session_id) for session_id in payload)
+            else:
+                self._pending[('user', payload)] += 1
+
+    def _release(self, changes: Iterable[tuple]) -> None:
+        with self._pending_lock:
+            for kind, payload in changes:
+                if kind == 'revoke':
+                    self._pending.subtract(('session', session_id) for session_id in payload)
+                elif kind == 'revoke_user':
+                    self._pending[('user', payload)] -= 1
+            self._pending = +self._pending  # Drop zero counts
+
+    def _held(self, record: SessionRecord) -> bool:
+        with self._pending_lock:
+            return bool(self._pending[('session', record.id)] or self._pending[('user', record.user_id)])
+
+    def _store(self, record: SessionRecord, ttl: int) -> None:
+        key, user_key = self.prefix + record.id, f'user:{record.user_id}:sessions'
+        pipe = cache.redis_client.pipeline()
+        pipe.hset(key, mapping={
+            'user_id': record.user_id,
+            'created_at': int(record.created_at.replace(tzinfo=UTC).timestamp()),
+            'expires_at': int(record.expires_at.replace(tzinfo=UTC).timestamp()),
+            'device_info': record.device_info or '',
+            'ip_address': record.ip_address or '',
+            'active': '1' if record.is_active else '0',
+        })
+        pipe.expire(key, ttl)
+        pipe.sadd(user_key, record.id)
+        pipe.expire(user_key, max(ttl, settings.SESSION_TTL))
+        pipe.execute()
+
+    def _load(self, db: Session, session_id: str, *, restore: bool) -> Optional[SessionRecord]:
+        """Read a session from its row; with ``restore``, put a valid one back into Redis."""
+        row = db.execute(_sessions.select().where(_sessions.c.id == session_id)).first()
+        if row is None:
+            return None
+        record = SessionRecord(
+            id=row.id,
+            user_id=row.user_id,
+            created_at=row.created_at,
+            expires_at=row.expires_at,
+            device_info=row.device_info,
+            ip_address=row.ip_address,
+            is_active=bool(row.is_active)
+        )
+        if restore and record.valid and not self._held(record):
+            remaining = int((record.expires_at - datetime.now(UTC).replace(tzinfo=None)).total_seconds())
+            try:
+                self._store(record, max(remaining, 1))
+            except RedisError:
+                pass
+        return record
+
+    def _evict(self, session_ids: Iterable[str]) -> None:
+        with self._cache_lock:
+            self._revocations += 1
+            for session_id in session_ids:
+                self._cache.pop(session_id, None)
+
+    def _persist(self, change: tuple) -> None:
+        if self._threads:
+            self._queue.put(change)
+        else:
+            self._write([change])
+            self._release([change])
+
+    def _flush_loop(self) -> None:
+        """Write queued changes in batches of up to SESSION_FLUSH_BATCH_SIZE every SESSION_FLUSH_INTERVAL seconds."""
+        stopping = False
+        while True:
+            changes: List[tuple] = []
+            deadline = None
+            while len(changes) < settings.SESSION_FLUSH_BATCH_SIZE:
+                try:
+                    if stopping:
+                        change = self._queue.get_nowait()
+                    elif deadline is None:
+                        # Idle until the first change of a batch, or retry revocations Redis missed
+                        change = self._queue.get(timeout=settings.SESSION_FLUSH_INTERVAL if self._redis_retries else None)
+                        deadline = time.monotonic() + settings.SESSION_FLUSH_INTERVAL
+                    else:
+                        change = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if change is None:
+                    stopping = True
+                else:
+                    changes.append(change)
+            if changes:
+                self._write(changes)
+                self._release(changes)
+            if self._redis_retries:
+                self._retry_redis()
+            if stopping and self._queue.empty():
+                return
+
+    def _write(self, changes: List[tuple], *, raise_errors: bool = False) -> int:
+        """
+        Apply changes in order, inserting consecutive new sessions with one
+        statement; returns the number of sessions revoked.
+        """
+        factory = self._session_factory
+        if factory is None:
+            from ..extensions import SessionLocal
+            factory = SessionLocal
+        db = factory()
+        revoked = 0
+        try:
+            inserts: List[Dict] = []
+            for kind, payload in changes + [('end', None)]:
+                if kind != 'insert' and inserts:
+                    db.execute(_sessions.insert(), inserts)
+                    inserts = []
+                if kind == 'insert':
+                    inserts.append({**payload._asdict(), 'last_activity': payload.created_at})
+                elif kind == 'revoke':
+                    revoked += db.execute(
+                        update(_sessions)
+                        .where(_sessions.c.id.in_(payload), _sessions.c.is_active.is_(True))
+                        .values(is_active=False)
+                    ).rowcount
+                elif kind == 'revoke_user':
+                    revoked += db.execute(
+                        update(_sessions)
+                        .where(_sessions.c.user_id == payload, _sessions.c.is_active.is_(True))
+                        .values(is_active=False)
+                    ).rowcount
+            db.commit()
+        except Exception:
+            db.rollback()
+            if raise_errors:
+                raise
+            logger.exception("Could not write %d session changes to the database", len(changes))
+        finally:
+            db.close()
+        return revoked
+
+    def _listen(self) -> None:
+        """Drop revoked sessions from the cache, reconnecting as needed; caching is off while disconnected."""
+        delay = 1
+        while not self._stop.is_set():
+            pubsub = cache.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(settings.SESSION_REVOKED_CHANNEL)
+                self._subscribed.set()
+                delay = 1
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and isinstance(message['data'], str):
+                        self._evict(message['data'].split())
+            except RedisError:
+                delay = min(delay * 2, 60)
+            finally:
+                # Revocations may be missed until subscribed again
+                self._subscribed.clear()
+                with self._cache_lock:
+                    self._cache.clear()
+                try:
+                    pubsub.close()
+                except RedisError:
+                    pass
+            self._stop.wait(delay)
+
+def _from_timestamp(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, UTC).replace(tzinfo=None)
+
+def _parse(session_id: str, data: Dict[str, str]) -> Optional[SessionRecord]:
+    if not data or 'user_id' not in data:
+        return None  # Missing, or a tombstone for a session Redis never held
+    return SessionRecord(
+        id=session_id,
+        user_id=int(data['user_id']),
+        created_at=_from_timestamp(int(data['created_at'])),
+        expires_at=_from_timestamp(int(data['expires_at'])),
+        device_info=data.get('device_info') or None,
+        ip_address=data.get('ip_address') or None,
+        is_active=data.get('active') == '1'
+    )
+
+session_store = SessionStore()
 
 def create_session(user_id):
-    session_id = str(uuid.uuid4())
-    session_data = {
-        "user_id": str(user_id),
-        "created_at": str(int(time.time())),
-        "expires_at": str(int(time.time()) + SESSION_EXPIRY_SECONDS)
-    }
-    redis_client.hmset(f"session:{session_id}", session_data)
-    redis_client.expire(f"session:{session_id}", SESSION_EXPIRY_SECONDS)
-    return session_id
+    return session_store.create(int(user_id), ttl=SESSION_EXPIRY_SECONDS).id
 
 def validate_session(session_id):
-    session = redis_client.hgetall(f"session:{session_id}")
-    if not session:
-        return False
-    if int(session["expires_at"]) < int(time.time()):
-        destroy_session(session_id)
-        return False
-    return True
+    return session_store.validate(session_id) is not None
 
 def get_session_user(session_id):
-    session = redis_client.hgetall(f"session:{session_id}")
-    if session and int(session["expires_at"]) >= int(time.time()):
-        return session["user_id"]
-    return None
+    record = session_store.validate(session_id)
+    return str(record.user_id) if record else None
 
 def destroy_session(session_id):
-    redis_client.delete(f"session:{session_id}") 
\ No newline at end of file
+    session_store.revoke([session_id])
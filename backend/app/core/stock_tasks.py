@@ -0,0 +1,90 @@
+from app.core.celery import celery_app
+
+@celery_app.task
+def snapshot_stock_ledger():
+    """
+    Periodic task to checkpoint the stock ledger so point-in-time stock
+    lookups only replay entries since the last snapshot.
+    """
+    from app.db.session import SessionLocal
+    from app.services.stock_ledger_service import StockLedgerService
+
+    db = SessionLocal()
+    try:
+        return {'snapshots': StockLedgerService.take_snapshots(db)}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+def reconcile_stock_ledger(repair: bool = False):
+    """
+    Periodic task to verify inventory quantities against the stock ledger.
+    """
+    from app.db.session import SessionLocal
+    from app.services.stock_ledger_service import StockLedgerService
+
+    db = SessionLocal()
+    try:
+        return StockLedgerService.reconcile(db, repair=repair)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+def recalculate_reorder_points():
+    """
+    Periodic task to recompute reorder points, safety stock and reorder
+    quantities from sales history.
+    """
+    from app.db.session import SessionLocal
+    from app.services.replenishment_service import ReplenishmentService
+
+    db = SessionLocal()
+    try:
+        return ReplenishmentService.recalculate(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+def refresh_inventory_classification(full: bool = False):
+    """
+    Periodic task to reclassify inventory (ABC/XYZ) for branches with new
+    sales or stock since the previous run.
+    """
+    from app.db.session import SessionLocal
+    from app.services.classification_service import ClassificationService
+
+    db = SessionLocal()
+    try:
+        return ClassificationService.refresh(db, full=full)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@celery_app.task
+def refresh_sales_velocity():
+    """
+    Periodic task to age sales out of the rolling 30-day unit counts used by
+    the dead-stock and slow-mover reports.
+    """
+    from app.db.session import SessionLocal
+    from app.services.sales_velocity_service import SalesVelocityService
+
+    db = SessionLocal()
+    try:
+        return SalesVelocityService.refresh(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
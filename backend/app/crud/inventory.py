@@ -1,9 +1,14 @@
 from typing import List, Optional, Dict, Any, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+from sqlalchemy import and_, or_
 from datetime import datetime
-from ..models.inventory import Inventory, StockMovement, BranchInventory, InventoryTransaction
+from ..models.inventory import Inventory, StockMovement, BranchInventory, InventoryTransaction, InventoryBatch
 from ..schemas.inventory import InventoryCreate, InventoryUpdate, StockMovementCreate, InventoryTransactionCreate, InventoryTransactionUpdate
+from ..services.stock_service import StockService
+from ..services.stock_ledger_service import StockLedgerService
+from ..services.batch_service import BatchService
+from ..services.sales_velocity_service import SalesVelocityService
+from ..utils.pagination import keyset_page
 
 class InventoryCRUD:
     def get(self, db: Session, id: int) -> Optional[Inventory]:
@@ -26,7 +31,9 @@ class InventoryCRUD:
         skip: int = 0, 
         limit: int = 100,
         branch_id: Optional[int] = None,
-        low_stock: Optional[bool] = None
+        low_stock: Optional[bool] = None,
+        abc_class: Optional[str] = None,
+        xyz_class: Optional[str] = None
     ) -> List[Inventory]:
         """Get multiple inventory items with optional filters"""
         query = db.query(Inventory)
@@ -37,6 +44,12 @@ class InventoryCRUD:
         if low_stock:
             query = query.filter(Inventory.quantity <= Inventory.reorder_point)
             
+        if abc_class:
+            query = query.filter(Inventory.abc_class == abc_class)
+            
+        if xyz_class:
+            query = query.filter(Inventory.xyz_class == xyz_class)
+            
         return query.offset(skip).limit(limit).all()
     
     def create(self, db: Session, *, obj_in: InventoryCreate) -> Inventory:
@@ -54,6 +67,11 @@ class InventoryCRUD:
             expiry_date=obj_in.expiry_date
         )
         db.add(db_obj)
+        StockLedgerService.record(
+            db, {(obj_in.branch_id, obj_in.product_id): obj_in.quantity}, entry_type='opening'
+        )
+        db.flush()
+        StockService.refresh_total_stock(db, [obj_in.product_id])
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -76,6 +94,11 @@ class InventoryCRUD:
                 setattr(db_obj, field, update_data[field])
                 
         db.add(db_obj)
+        if 'quantity' in update_data:
+            # Absolute stock count: post the difference to the ledger
+            db.flush()
+            StockLedgerService.true_up(db, [(db_obj.branch_id, db_obj.product_id)], entry_type='adjustment')
+            StockService.refresh_total_stock(db, [db_obj.product_id])
         db.commit()
         db.refresh(db_obj)
         return db_obj
@@ -96,8 +119,15 @@ class InventoryCRUD:
         if not inventory:
             return None
             
-        # Update quantity
-        inventory.quantity += quantity_change
+        # Update quantity atomically in the database
+        try:
+            StockService.apply_changes(
+                db, {inventory_id: quantity_change}, model=Inventory, key_columns=('id',),
+                ledger={'entry_type': movement_type, 'reference_type': 'stock_movement', 'created_by': created_by}
+            )
+        except Exception:
+            db.rollback()
+            raise
         
         # Create stock movement
         stock_movement = StockMovement(
@@ -110,7 +140,6 @@ class InventoryCRUD:
         )
         db.add(stock_movement)
         
-        db.add(inventory)
         db.commit()
         db.refresh(inventory)
         return inventory
@@ -136,6 +165,22 @@ class InventoryCRUD:
         db.refresh(db_obj)
         return db_obj
     
+    def get_expiring(
+        self,
+        db: Session,
+        *,
+        branch_id: int,
+        within_days: int = 30,
+        include_expired: bool = False,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[InventoryBatch]:
+        """Get batches at a branch expiring within the given number of days"""
+        return BatchService.expiring(
+            db, branch_id=branch_id, within_days=within_days,
+            include_expired=include_expired, skip=skip, limit=limit
+        )
+    
     def get_branch_inventory(
         self,
         db: Session,
@@ -170,14 +215,32 @@ class InventoryCRUD:
         db.add(db_obj)
         
         # Update branch inventory
-        inventory = self.get_by_branch_product(db, branch_id=obj_in.branch_id, product_id=obj_in.product_id)
-        if inventory:
-            if obj_in.transaction_type in ["purchase", "return"]:
-                inventory.quantity += obj_in.quantity
+        key = (obj_in.branch_id, obj_in.product_id)
+        ledger = {
+            'entry_type': obj_in.transaction_type,
+            'reference_type': obj_in.reference_type,
+            'reference_id': obj_in.reference_id,
+            'created_by': created_by
+        }
+        try:
+            if obj_in.transaction_type == "purchase" and (obj_in.batch_number or obj_in.expiry_date):
+                BatchService.receive(db, [{
+                    'branch_id': obj_in.branch_id,
+                    'product_id': obj_in.product_id,
+                    'quantity': obj_in.quantity,
+                    'batch_number': obj_in.batch_number,
+                    'expiry_date': obj_in.expiry_date
+                }], created_by=created_by, ledger=ledger)
+            elif obj_in.transaction_type in ["purchase", "return"]:
+                StockService.apply_changes(db, {key: obj_in.quantity}, create_missing=True, ledger=ledger)
             elif obj_in.transaction_type in ["sale", "waste"]:
-                inventory.quantity -= obj_in.quantity
-            
-            db.add(inventory)
+                # Pick from the earliest-expiring batches first
+                BatchService.fulfil(db, {key: obj_in.quantity}, ledger=ledger)
+                if obj_in.transaction_type == "sale":
+                    SalesVelocityService.record(db, {key: obj_in.quantity})
+        except Exception:
+            db.rollback()
+            raise
             
         db.commit()
         db.refresh(db_obj)
@@ -191,9 +254,10 @@ class InventoryCRUD:
         product_id: Optional[int] = None,
         transaction_type: Optional[str] = None,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        cursor: Optional[str] = None
     ) -> List[InventoryTransaction]:
-        """Get inventory transactions with filters"""
+        """Get inventory transactions with filters, newest first; ``cursor`` pages by keyset"""
         query = db.query(InventoryTransaction)
         
         if branch_id:
@@ -205,7 +269,10 @@ class InventoryCRUD:
         if transaction_type:
             query = query.filter(InventoryTransaction.transaction_type == transaction_type)
             
-        return query.order_by(desc(InventoryTransaction.created_at)).offset(skip).limit(limit).all()
+        query = keyset_page(query, InventoryTransaction, cursor=cursor)
+        if cursor:
+            return query.limit(limit).all()
+        return query.offset(skip).limit(limit).all()
 
 # Create an instance
 inventory_crud = InventoryCRUD() 
\ No newline at end of file
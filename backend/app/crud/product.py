@@ -1,8 +1,8 @@
 from typing import List, Optional, Dict, Any, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from ..models.product import Product, Category
 from ..schemas.product import ProductCreate, ProductUpdate, ProductSearchParams
+from ..services.search_service import ProductSearchService
 
 class ProductCRUD:
     def get(self, db: Session, id: int) -> Optional[Product]:
@@ -92,16 +92,8 @@ class ProductCRUD:
         skip: int = 0,
         limit: int = 100
     ) -> List[Product]:
-        """Search products by name, sku, or description"""
-        search_query = f"%{query}%"
-        return db.query(Product).filter(
-            or_(
-                Product.name.ilike(search_query),
-                Product.sku.ilike(search_query),
-                Product.description.ilike(search_query),
-                Product.barcode.ilike(search_query)
-            )
-        ).offset(skip).limit(limit).all()
+        """Search products by name, sku, barcode or description, best match first"""
+        return ProductSearchService.search(db, query, skip=skip, limit=limit)
     
     def get_categories(self, db: Session) -> List[str]:
         """Get all product categories"""
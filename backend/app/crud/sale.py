@@ -1,9 +1,14 @@
+from collections import defaultdict
 from typing import List, Optional, Dict, Any, Union
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy.orm import Query, Session
+from sqlalchemy import and_
 from datetime import datetime
 from ..models.sale import Sale, SaleItem
 from ..schemas.sale import SaleCreate, SaleUpdate, SaleFilter
+from ..services.checkout_service import CheckoutService
+from ..services.pricing_service import PricingService
+from ..services.sales_velocity_service import SalesVelocityService
+from ..utils.pagination import keyset_page
 
 class SaleCRUD:
     def get(self, db: Session, id: int) -> Optional[Sale]:
@@ -16,9 +21,32 @@ class SaleCRUD:
         *, 
         skip: int = 0, 
         limit: int = 100,
-        filters: Optional[SaleFilter] = None
+        filters: Optional[SaleFilter] = None,
+        cursor: Optional[str] = None
     ) -> List[Sale]:
-        """Get multiple sales with optional filters"""
+        """Get multiple sales with optional filters, newest first.
+
+        Pass the ``next_cursor`` of the previous page as ``cursor`` to page by
+        keyset instead of ``skip``.
+        """
+        query = self.filter_query(db, filters=filters, cursor=cursor)
+        if cursor:
+            return query.limit(limit).all()
+        return query.offset(skip).limit(limit).all()
+
+    def filter_query(
+        self,
+        db: Session,
+        *,
+        filters: Optional[SaleFilter] = None,
+        cursor: Optional[str] = None
+    ) -> Query:
+        """Query the sales matching ``filters``, newest first, starting after ``cursor``.
+
+        The ``ix_sales_*`` composite indexes are laid out for these filter
+        shapes: equality columns first, then ``(created_at, id)`` for the date
+        range and the ordering.
+        """
         query = db.query(Sale)
         
         if filters:
@@ -26,7 +54,8 @@ class SaleCRUD:
                 query = query.filter(Sale.branch_id == filters.branch_id)
             
             if filters.cashier_id:
-                query = query.filter(Sale.cashier_id == filters.cashier_id)
+                # The cashier is the user who rang the sale up
+                query = query.filter(Sale.created_by == filters.cashier_id)
                 
             if filters.customer_id:
                 query = query.filter(Sale.customer_id == filters.customer_id)
@@ -56,53 +85,48 @@ class SaleCRUD:
                 query = query.filter(Sale.created_at <= filters.end_date)
         
         # Always order by creation time (newest first)
-        query = query.order_by(desc(Sale.created_at))
-            
-        return query.offset(skip).limit(limit).all()
+        return keyset_page(query, Sale, cursor=cursor)
     
     def create(self, db: Session, *, obj_in: SaleCreate) -> Sale:
-        """Create new sale with items"""
-        # Create sale object
-        total_amount = 0
+        """Create new sale with items, priced by PricingService"""
+        # Price the whole basket: line and sale discounts are percentages,
+        # items without a tax rate are taxed by the branch's tax rules
+        priced = PricingService.price_basket(db, {
+            'branch_id': obj_in.branch_id,
+            'discount': obj_in.discount,
+            'tax': obj_in.tax,
+            'items': [
+                {
+                    'product_id': item_data.product_id,
+                    'quantity': item_data.quantity,
+                    'unit_price': item_data.unit_price,
+                    'discount': item_data.discount,
+                    'tax_rate': item_data.tax_rate,
+                }
+                for item_data in obj_in.items
+            ],
+        })
         
         db_sale = Sale(
             customer_id=obj_in.customer_id,
-            cashier_id=obj_in.cashier_id,
+            created_by=obj_in.cashier_id,
             branch_id=obj_in.branch_id,
             payment_method=obj_in.payment_method,
             status=obj_in.status,
-            discount=obj_in.discount,
-            tax=obj_in.tax,
             notes=obj_in.notes,
-            total_amount=total_amount  # Will be updated after adding items
+            **PricingService.sale_totals(priced)
         )
+        db_sale.sale_number = db_sale.generate_sale_number()
         db.add(db_sale)
         db.flush()  # Flush to get the sale ID
         
-        # Create sale items
-        for item_data in obj_in.items:
-            db_item = SaleItem(
-                sale_id=db_sale.id,
-                product_id=item_data.product_id,
-                quantity=item_data.quantity,
-                unit_price=item_data.unit_price,
-                discount=item_data.discount,
-                tax_rate=item_data.tax_rate
-            )
-            db.add(db_item)
-            
-            # Calculate item total and add to sale total
-            item_total = (item_data.unit_price * item_data.quantity) * (1 - item_data.discount / 100)
-            if item_data.tax_rate:
-                item_total = item_total * (1 + item_data.tax_rate / 100)
-            total_amount += item_total
-        
-        # Apply sale-level discount and tax
-        total_amount = total_amount * (1 - db_sale.discount / 100)
-        total_amount = total_amount * (1 + db_sale.tax / 100)
+        # Write the items with one executemany
+        CheckoutService.insert_items(db, db_sale.id, PricingService.item_rows(priced))
         
-        # Update sale total
-        db_sale.total_amount = total_amount
+        units = defaultdict(int)
+        for item_data in obj_in.items:
+            units[(obj_in.branch_id, item_data.product_id)] += item_data.quantity
+        SalesVelocityService.record(db, units)
         
         db.commit()
         db.refresh(db_sale)
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -19,6 +21,38 @@ def get_db():
     finally:
         db.close()
 
+# Async drivers for the synchronous DATABASE_URL dialects
+ASYNC_DRIVERS = {
+    'postgresql': 'asyncpg',
+    'sqlite': 'aiosqlite',
+}
+
+def async_database_url(url) -> str:
+    """Point a database URL at the async driver of its dialect."""
+    url = make_url(str(url))
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {url.get_backend_name()}")
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+# Async database, for async route handlers: queries await the driver instead
+# of blocking the event loop. Built on first use, so a DATABASE_URL without an
+# async driver only fails the async routes, not importing the app.
+_async_sessionmaker = None
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """The async session factory, creating the async engine on first call."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        async_engine = create_async_engine(async_database_url(settings.DATABASE_URL), pool_pre_ping=True)
+        _async_sessionmaker = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+# Async database dependency
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
 # Create a reference to db for backward compatibility
 db = SessionLocal()
 
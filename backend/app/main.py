@@ -11,6 +11,7 @@ from .core.logging import logger
 from .db.session import SessionLocal, engine
 from .db.init_db import init_db
 from .core.rate_limit import RateLimitMiddleware
+from .core.idempotency import IdempotencyMiddleware
 from .core.security_middleware import ContentSecurityPolicyMiddleware, SecurityMiddleware
 from .core.error_handlers import (
     http_exception_handler,
@@ -51,8 +52,12 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 
+# Replay retried sale/transaction POSTs sent with an Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
+
 # Add security middleware
 app.add_middleware(ContentSecurityPolicyMiddleware)
 app.add_middleware(SecurityMiddleware)
@@ -18,9 +18,12 @@ from .business import Business
 from .expense import Expense
 from .revenue import Revenue
 from .financial_report import FinancialReport
-from .inventory import BranchInventory, InventoryTransaction
+from .inventory import BranchInventory, InventoryTransfer, InventoryTransaction, InventoryBatch, InventoryAlertState, StockLedgerEntry, StockSnapshot
 from .feedback import BranchFeedback
 from .session import Session
+from .job import JobWatermark
+from .pricing import TaxRate, Promotion
+from .catalog import CatalogChange
 
 # We now use SQLAlchemy directly instead of db.Model
 
@@ -61,7 +64,16 @@ __all__ = [
     'Revenue',
     'FinancialReport',
     'BranchInventory',
+    'InventoryTransfer',
     'InventoryTransaction',
+    'InventoryBatch',
+    'InventoryAlertState',
+    'StockLedgerEntry',
+    'StockSnapshot',
     'BranchFeedback',
     'Session',
+    'JobWatermark',
+    'TaxRate',
+    'Promotion',
+    'CatalogChange',
 ] 
\ No newline at end of file
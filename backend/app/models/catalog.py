@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
+from sqlalchemy.sql import func
+from ..extensions import Base
+
+class CatalogChange(Base):
+    """
+    Latest change to a catalog row (a category, product or variant).
+
+    ``version`` increases with every change and a row keeps only its latest
+    entry, so the changes since a version are the rows created, updated or
+    deleted after it. Entries are written by database triggers installed by
+    ``CatalogSyncService.install`` (and the migration), which see every
+    write including bulk Core statements.
+    """
+    __tablename__ = 'catalog_changes'
+    __table_args__ = (
+        Index('ix_catalog_changes_entity', 'entity', 'entity_id', unique=True),
+        {'sqlite_autoincrement': True},  # Never reuse the version of a removed entry
+    )
+
+    version = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)  # 'category', 'product' or 'variant'
+    entity_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f"<CatalogChange {self.version} {self.entity} {self.entity_id}>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, String, Boolean
+from sqlalchemy import Column, Integer, BigInteger, Float, DateTime, ForeignKey, String, Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..extensions import Base
@@ -7,6 +7,14 @@ from datetime import datetime
 
 class Inventory(Base):
     __tablename__ = 'inventory'
+    __table_args__ = (
+        UniqueConstraint('branch_id', 'product_id', name='uq_inventory_branch_product'),
+        Index('ix_inventory_created_at', 'created_at'),
+        Index('ix_inventory_updated_at', 'updated_at'),
+        Index('ix_inventory_branch_expiry', 'branch_id', 'expiry_date'),
+        Index('ix_inventory_branch_class', 'branch_id', 'abc_class', 'xyz_class'),
+        Index('ix_inventory_branch_last_sold', 'branch_id', 'last_sold_at'),
+    )
 
     id = Column(Integer, primary_key=True)
     branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
@@ -16,7 +24,15 @@ class Inventory(Base):
     maximum_stock = Column(Integer, default=100)
     reorder_point = Column(Integer, default=20)
     reorder_quantity = Column(Integer, default=50)
+    lead_time_days = Column(Integer)  # Supplier lead time; settings.REORDER_LEAD_TIME_DAYS if unset
+    # Revenue contribution (A/B/C) and demand variability (X/Y/Z) within the branch
+    abc_class = Column(String(1))
+    xyz_class = Column(String(1))
+    # Sales velocity, maintained on sale and trued up nightly
+    last_sold_at = Column(DateTime(timezone=True))
+    units_sold_30d = Column(Integer, nullable=False, default=0, server_default='0')
     location = Column(String(100))  # Storage location within branch
+    # Earliest-expiring batch with stock left, maintained from InventoryBatch
     batch_number = Column(String(100))
     expiry_date = Column(DateTime(timezone=True))
     last_restock_date = Column(DateTime(timezone=True))
@@ -101,6 +117,113 @@ class Inventory(Base):
     def __repr__(self) -> str:
         return f"<Inventory {self.product_id} at Branch {self.branch_id}>"
 
+class InventoryBatch(Base):
+    """
+    A received lot of a product at a branch, with its own expiry date.
+
+    ``branch_id`` and ``product_id`` are copied from the inventory row so that
+    expiry scans and first-expiry-first-out picking are index range scans.
+    """
+    __tablename__ = 'inventory_batches'
+    __table_args__ = (
+        Index('ix_inventory_batches_branch_expiry', 'branch_id', 'expiry_date'),
+        Index('ix_inventory_batches_fefo', 'branch_id', 'product_id', 'expiry_date', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    inventory_id = Column(Integer, ForeignKey('inventory.id', ondelete='CASCADE'), nullable=False, index=True)
+    branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    batch_number = Column(String(100))
+    quantity = Column(Integer, nullable=False, default=0)
+    expiry_date = Column(DateTime(timezone=True))
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_by = Column(Integer, ForeignKey('users.id'))
+
+    def to_dict(self) -> dict:
+        """Convert inventory batch to dictionary"""
+        return {
+            'id': self.id,
+            'inventory_id': self.inventory_id,
+            'branch_id': self.branch_id,
+            'product_id': self.product_id,
+            'batch_number': self.batch_number,
+            'quantity': self.quantity,
+            'expiry_date': self.expiry_date.isoformat() if self.expiry_date else None,
+            'received_at': self.received_at.isoformat() if self.received_at else None
+        }
+
+    def __repr__(self) -> str:
+        return f"<InventoryBatch {self.batch_number} ({self.branch_id}, {self.product_id}) {self.quantity}>"
+
+class InventoryAlertState(Base):
+    """
+    Current stock alert state of an inventory row.
+
+    Only rows that are low or out of stock have an entry. The alert job compares
+    it with the live quantity to find threshold crossings, so an item is
+    reported once when it crosses, not on every run while it stays low.
+    """
+    __tablename__ = 'inventory_alert_states'
+
+    inventory_id = Column(Integer, ForeignKey('inventory.id', ondelete='CASCADE'), primary_key=True)
+    branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
+    state = Column(String(20), nullable=False)  # low_stock, out_of_stock
+    alerted_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<InventoryAlertState {self.inventory_id} {self.state}>"
+
+class StockLedgerEntry(Base):
+    """
+    Append-only record of every change to ``Inventory.quantity``.
+
+    Rows are never updated or deleted; the on-hand quantity of a (branch,
+    product) is the sum of its deltas. ``StockSnapshot`` checkpoints keep
+    historical lookups short.
+    """
+    __tablename__ = 'stock_ledger'
+    __table_args__ = (
+        Index('ix_stock_ledger_branch_product_id', 'branch_id', 'product_id', 'id'),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    delta = Column(Integer, nullable=False)
+    entry_type = Column(String(20), nullable=False)  # opening, purchase, sale, adjustment, transfer, waste, return, import, correction
+    reference_type = Column(String(20))
+    reference_id = Column(Integer)
+    created_by = Column(Integer, ForeignKey('users.id'))
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<StockLedgerEntry {self.entry_type} {self.delta:+d} ({self.branch_id}, {self.product_id})>"
+
+class StockSnapshot(Base):
+    """
+    Quantity of a (branch, product) after ledger entry ``ledger_id``.
+
+    ``as_of`` is the ``created_at`` of that entry, so the level at any time T
+    is the latest snapshot with ``as_of <= T`` plus the few entries after it.
+    """
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (
+        UniqueConstraint('branch_id', 'product_id', 'ledger_id', name='uq_stock_snapshot_branch_product_ledger'),
+        Index('ix_stock_snapshots_branch_product_as_of', 'branch_id', 'product_id', 'as_of'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    ledger_id = Column(BigInteger, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    as_of = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f"<StockSnapshot ({self.branch_id}, {self.product_id}) {self.quantity} at {self.as_of}>"
+
 class StockMovement(Base):
     __tablename__ = 'stock_movements'
 
@@ -215,6 +338,11 @@ class InventoryTransfer(Base):
 
 class InventoryTransaction(Base):
     __tablename__ = 'inventory_transactions'
+    __table_args__ = (
+        # Keyset pagination, newest first
+        Index('ix_inventory_transactions_created_at_id', 'created_at', 'id'),
+        Index('ix_inventory_transactions_branch_created_at_id', 'branch_id', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from ..extensions import Base
+
+class JobWatermark(Base):
+    """
+    High-water mark of a periodic job.
+
+    Incremental jobs record the point up to which they have processed changes,
+    so the next run only looks at rows modified after it.
+    """
+    __tablename__ = 'job_watermarks'
+
+    name = Column(String(100), primary_key=True)
+    value = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self) -> str:
+        return f"<JobWatermark {self.name} at {self.value}>"
@@ -2,12 +2,17 @@ from datetime import datetime
 import random
 import string
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime, Numeric
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime, Numeric, Index
 from sqlalchemy.orm import relationship
 from ..extensions import Base
 
 class Order(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Keyset pagination, newest first
+        Index('ix_orders_created_at_id', 'created_at', 'id'),
+        Index('ix_orders_user_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True)
     order_number = Column(String(32), unique=True, nullable=False)
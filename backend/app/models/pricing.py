@@ -0,0 +1,65 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Numeric, Index
+from sqlalchemy.sql import func
+from ..extensions import Base
+
+class TaxRate(Base):
+    """
+    Tax rate applied to sale lines.
+
+    A rate targets one product, one category, or (with neither set) every
+    item. ``branch_id`` limits it to one branch; rates without a branch apply
+    to all branches, and a branch rate overrides them for the same target.
+    The most specific active rate wins: product, then category, then default.
+    """
+    __tablename__ = 'tax_rates'
+    __table_args__ = (
+        Index('ix_tax_rates_branch_active', 'branch_id', 'is_active'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    branch_id = Column(Integer, ForeignKey('branches.id'), nullable=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=True)
+    category_id = Column(Integer, ForeignKey('categories.id'), nullable=True)
+    name = Column(String(100), nullable=False)
+    rate = Column(Numeric(7, 4), nullable=False)  # Percent, e.g. 7.2500
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def __repr__(self) -> str:
+        return f"<TaxRate {self.name} {self.rate}%>"
+
+class Promotion(Base):
+    """
+    Automatic line discount.
+
+    ``discount_type`` is ``percent`` (``value`` percent off the line) or
+    ``amount`` (``value`` off each unit). Targets and branch scope work as for
+    ``TaxRate``; a promotion applies from ``min_quantity`` units within its
+    ``starts_at``/``ends_at`` window, and a line gets the best single
+    promotion it qualifies for.
+    """
+    __tablename__ = 'promotions'
+    __table_args__ = (
+        Index('ix_promotions_branch_active', 'branch_id', 'is_active'),
+    )
+
+    PERCENT = 'percent'
+    AMOUNT = 'amount'
+
+    id = Column(Integer, primary_key=True)
+    branch_id = Column(Integer, ForeignKey('branches.id'), nullable=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=True)
+    category_id = Column(Integer, ForeignKey('categories.id'), nullable=True)
+    name = Column(String(100), nullable=False)
+    discount_type = Column(String(10), nullable=False, default=PERCENT)
+    value = Column(Numeric(12, 4), nullable=False)
+    min_quantity = Column(Integer, nullable=False, default=1)
+    starts_at = Column(DateTime, nullable=True)
+    ends_at = Column(DateTime, nullable=True)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def __repr__(self) -> str:
+        return f"<Promotion {self.name}>"
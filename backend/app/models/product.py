@@ -1,7 +1,7 @@
 from datetime import datetime
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy import Column, Integer, String, Text, Float, Boolean, ForeignKey, Numeric, JSON, DateTime, Enum, Table
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy.orm import relationship, backref, object_session
 from sqlalchemy.sql import func
 from ..extensions import Base
 import enum
@@ -97,6 +97,8 @@ class Product(Base):
     status = Column(Enum(ProductStatus), default=ProductStatus.ACTIVE)
     category = Column(Enum(ProductCategory), nullable=False)
     quantity = Column(Integer, default=0)
+    # Sum of Inventory.quantity across branches, maintained by StockService
+    total_stock = Column(Integer, nullable=False, default=0, server_default='0')
     min_quantity = Column(Integer, default=0)
     max_quantity = Column(Integer, default=0)
     unit = Column(String(20))
@@ -118,6 +120,8 @@ class Product(Base):
     sales_items = relationship("SaleItem", back_populates="product")
     business = relationship("Business", back_populates="products")
     category = relationship('Category', back_populates='products', foreign_keys=[category_id])
+    images = relationship('ProductImage', order_by='ProductImage.id', passive_deletes=True)
+    variants = relationship('ProductVariant', order_by='ProductVariant.id', passive_deletes=True)
     
     def __init__(
         self,
@@ -230,13 +234,22 @@ class Product(Base):
         return 0
 
     def get_total_stock(self) -> int:
-        """Get total stock across all branches"""
-        return sum(item.quantity for item in self.inventory_items)
+        """Get total stock across all branches (denormalized, no query)"""
+        return self.total_stock or 0
 
     def get_stock_by_branch(self, branch_id: int) -> int:
-        """Get stock level for a specific branch"""
-        inventory_item = next((item for item in self.inventory_items if item.branch_id == branch_id), None)
-        return inventory_item.quantity if inventory_item else 0
+        """
+        Get stock level for a specific branch.
+
+        Reads one row instead of loading ``inventory_items``; for many products
+        use ``StockService.get_product_stock`` instead.
+        """
+        if 'inventory_items' in self.__dict__:
+            inventory_item = next((item for item in self.inventory_items if item.branch_id == branch_id), None)
+            return inventory_item.quantity if inventory_item else 0
+
+        from ..services.stock_service import StockService
+        return StockService.get_product_stock(object_session(self), [self.id], branch_id=branch_id).get(self.id, 0)
 
     def is_low_stock(self, threshold: int = 10) -> bool:
         """Check if product is low in stock"""
@@ -2,16 +2,32 @@ from datetime import datetime
 import random
 import string
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime, Numeric
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime, Numeric, UniqueConstraint, Index
 from sqlalchemy.orm import relationship, backref
 from ..extensions import Base
+from ..utils.money import from_cents, to_cents
 
 class Sale(Base):
     __tablename__ = 'sales'
+    __table_args__ = (
+        UniqueConstraint('client_sale_id', name='uq_sales_client_sale_id'),
+        # Keyset pagination, newest first, and the SaleFilter shapes:
+        # equality filters lead, (created_at, id) serves the date range and order
+        Index('ix_sales_created_at_id', 'created_at', 'id'),
+        Index('ix_sales_branch_created_at_id', 'branch_id', 'created_at', 'id'),
+        Index('ix_sales_branch_status_created_at_id', 'branch_id', 'status', 'created_at', 'id'),
+        Index('ix_sales_created_by_created_at_id', 'created_by', 'created_at', 'id'),
+        Index('ix_sales_customer_created_at_id', 'customer_id', 'created_at', 'id'),
+        Index('ix_sales_status_created_at_id', 'status', 'created_at', 'id'),
+        Index('ix_sales_payment_method_created_at_id', 'payment_method', 'created_at', 'id'),
+        Index('ix_sales_total_amount', 'total_amount'),
+    )
     
     id = Column(Integer, primary_key=True)
     sale_number = Column(String(32), unique=True, nullable=False)
+    client_sale_id = Column(String(64))  # Client-generated id of a sale recorded offline
     customer_id = Column(Integer, ForeignKey('customers.id'), nullable=True)
+    branch_id = Column(Integer, ForeignKey('branches.id'), nullable=True)
     total_amount = Column(Float, nullable=False)
     subtotal = Column(Float, nullable=False)
     tax_amount = Column(Float, default=0.0)
@@ -46,8 +62,11 @@ class Sale(Base):
         return f'SL-{timestamp}-{random_suffix}'
     
     def calculate_totals(self):
-        self.subtotal = sum(item.subtotal for item in self.items)
-        self.total_amount = self.subtotal - self.discount_amount + self.tax_amount
+        subtotal = sum(to_cents(item.subtotal) for item in self.items)
+        self.subtotal = float(from_cents(subtotal))
+        self.total_amount = float(from_cents(
+            subtotal - to_cents(self.discount_amount or 0) + to_cents(self.tax_amount or 0)
+        ))
         return self.total_amount
     
     def to_dict(self):
@@ -78,7 +97,11 @@ class SaleItem(Base):
     variant_id = Column(Integer, ForeignKey('product_variants.id'))
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
-    discount = Column(Float, default=0.0)
+    discount = Column(Float, default=0.0)  # Amount off the line, promotion included
+    promotion_id = Column(Integer, ForeignKey('promotions.id'))
+    promotion_discount = Column(Float, nullable=False, default=0.0, server_default='0')
+    tax_rate = Column(Numeric(7, 4))  # Percent applied to the line
+    tax_amount = Column(Float, nullable=False, default=0.0, server_default='0')
     notes = Column(Text)
     
     # Relationships
@@ -87,7 +110,11 @@ class SaleItem(Base):
     
     @hybrid_property
     def subtotal(self):
-        return (self.quantity * self.price) - self.discount
+        return float(from_cents(self.quantity * to_cents(self.price) - to_cents(self.discount or 0)))
+    
+    @subtotal.expression
+    def subtotal(cls):
+        return (cls.quantity * cls.price) - cls.discount
     
     def __repr__(self):
         return f'<SaleItem {self.id}>'
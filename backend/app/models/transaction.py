@@ -1,9 +1,10 @@
 from datetime import datetime
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy import Column, Integer, String, Float, Boolean, Text, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, Text, ForeignKey, DateTime, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..extensions import Base
+from ..utils.money import from_cents, to_cents
 from typing import List
 import enum
 
@@ -31,6 +32,11 @@ class TransactionStatus(str, enum.Enum):
 
 class Transaction(Base):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # Keyset pagination, newest first
+        Index('ix_transactions_created_at_id', 'created_at', 'id'),
+        Index('ix_transactions_cashier_created_at_id', 'cashier_id', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True)
     branch_id = Column(Integer, ForeignKey('branches.id'), nullable=False)
@@ -79,9 +85,10 @@ class Transaction(Base):
         return item
 
     def calculate_totals(self) -> None:
-        """Calculate transaction totals"""
-        self.subtotal = sum(item.total for item in self.items)
-        self.total = self.subtotal + self.tax - self.discount
+        """Calculate transaction totals in exact cents"""
+        subtotal = sum(to_cents(item.total) for item in self.items)
+        self.subtotal = float(from_cents(subtotal))
+        self.total = float(from_cents(subtotal + to_cents(self.tax or 0) - to_cents(self.discount or 0)))
 
     def complete(self) -> None:
         """Mark transaction as completed"""
@@ -148,8 +155,8 @@ class TransactionItem(Base):
 
     @property
     def total(self) -> float:
-        """Calculate total for this item"""
-        return (self.quantity * self.unit_price) - self.discount
+        """Calculate total for this item in exact cents"""
+        return float(from_cents(self.quantity * to_cents(self.unit_price) - to_cents(self.discount or 0)))
 
     def to_dict(self) -> dict:
         """Convert transaction item to dictionary"""
@@ -1,11 +1,11 @@
 from datetime import datetime, UTC
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Table, Enum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB
 import enum
 from ..extensions import Base
+from ..core.passwords import password_hasher
 from typing import List
 from app.models.business import Business
 from app.models.branch import Branch
@@ -160,16 +160,18 @@ class User(Base):
     
     def set_password(self, password):
         """
-        Set user password.
+        Set user password. Blocks for the hash's cost; async routes
+        should store ``await password_hasher.hash(password)`` instead.
         
         Args:
             password (str): Password to set
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash_sync(password)
     
     def check_password(self, password):
         """
-        Check user password.
+        Check user password. Blocks for the hash's cost; async routes
+        should use ``await password_hasher.verify_and_update(...)`` instead.
         
         Args:
             password (str): Password to check
@@ -177,7 +179,7 @@ class User(Base):
         Returns:
             bool: True if password matches, False otherwise
         """
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify_sync(password, self.password_hash)
     
     def get_id(self):
         """
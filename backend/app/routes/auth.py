@@ -10,9 +10,9 @@ from ..utils.email import send_password_reset_email
 from ..utils.security import generate_reset_token, verify_reset_token
 from ..utils.auth import get_current_user
 from ..core.config import get_settings
+from ..core.passwords import password_hasher
 from ..auth.jwt import create_access_token, create_refresh_token, verify_token
 from jose import JWTError, jwt
-import bcrypt
 import uuid
 
 router = APIRouter(tags=["Authentication"])
@@ -67,18 +67,6 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def hash_password(password: str) -> str:
-    pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed_pwd = bcrypt.hashpw(pwd_bytes, salt)
-    return hashed_pwd.decode('utf-8')
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(
-        plain_password.encode('utf-8'),
-        hashed_password.encode('utf-8')
-    )
-
 # Routes
 @router.post("/login", response_model=Token)
 async def login(
@@ -99,7 +87,8 @@ async def login(
     
     print(f"User found: {user.email}, is_active: {user.is_active}")  # Debug log
     
-    if not user.check_password(form_data.password):
+    valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.password_hash)
+    if not valid:
         print("Password check failed")  # Debug log
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -114,8 +103,10 @@ async def login(
             detail="Account is deactivated"
         )
     
-    # Update last login
+    # Update last login, and upgrade the hash if its cost is outdated
     user.updated_at = datetime.now(UTC)
+    if new_hash:
+        user.password_hash = new_hash
     db.commit()
     
     # Create proper JWT tokens
@@ -192,7 +183,7 @@ async def register(
             full_name=user.name,
             is_active=True
         )
-        db_user.set_password(user.password)
+        db_user.password_hash = await password_hasher.hash(user.password)
         db_user.roles.append(role)
         
         db.add(db_user)
@@ -301,13 +292,13 @@ async def change_password(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    if not current_user.check_password(current_password):
+    if not await password_hasher.verify(current_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Current password is incorrect"
         )
     
-    current_user.set_password(new_password)
+    current_user.password_hash = await password_hasher.hash(new_password)
     db.commit()
     
     return {"message": "Password changed successfully"}
@@ -398,7 +389,7 @@ async def reset_password(
             detail="User not found"
         )
     
-    user.set_password(new_password)
+    user.password_hash = await password_hasher.hash(new_password)
     db.commit()
     
     return {"message": "Password reset successfully"}
@@ -446,7 +437,8 @@ async def login_with_business_id(
         )
     
     # Verify password
-    if not verify_password(form_data.password, user.hashed_password):
+    valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
@@ -470,6 +462,11 @@ async def login_with_business_id(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Upgrade the hash if its cost is outdated
+    if new_hash:
+        user.password_hash = new_hash
+        db.commit()
+    
     # Create token data with business info
     token_data = {
         "sub": user.email,
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from ..utils.auth import get_current_user
+from ..utils.auth import get_current_user, get_current_user_async
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 
-from ..models import Branch, BranchInventory, User, Sale
-from ..services.analytics_service import AnalyticsService
-from ..extensions import get_db
+from ..models import Branch, BranchInventory, Product, User, Sale, SaleItem
+from ..services.transfer_service import TransferService
+from ..core.exceptions import InsufficientStockException
+from ..extensions import get_async_db, get_db
 from app.schemas.user import UserResponse
 from app.schemas.inventory import BranchInventoryResponse
 
@@ -52,6 +55,16 @@ class TransferRequest(BaseModel):
     target_branch_id: int
     quantity: int
 
+class BatchTransferItem(BaseModel):
+    product_id: int
+    quantity: int
+    target_branch_id: Optional[int] = None
+
+class BatchTransferRequest(BaseModel):
+    target_branch_id: Optional[int] = None
+    items: List[BatchTransferItem]
+    allow_partial: bool = False
+
 # Routes
 @router.get("/branches", response_model=List[BranchResponse])
 async def get_branches(
@@ -204,41 +217,107 @@ async def transfer_inventory(
             detail="Source inventory item not found"
         )
     
-    if source_item.quantity < transfer.quantity:
+    lines = [{
+        "source_branch_id": branch_id,
+        "target_branch_id": transfer.target_branch_id,
+        "product_id": source_item.product_id,
+        "quantity": transfer.quantity
+    }]
+    try:
+        TransferService.transfer_batch(
+            db, lines, requested_by=current_user.id, model=BranchInventory
+        )
+    except InsufficientStockException:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Insufficient inventory"
         )
-    
-    # Create or update target branch inventory
-    target_item = db.query(BranchInventory).filter_by(
-        branch_id=transfer.target_branch_id,
-        product_id=source_item.product_id
-    ).first()
-    
-    if target_item:
-        target_item.quantity += transfer.quantity
-    else:
-        target_item = BranchInventory(
-            branch_id=transfer.target_branch_id,
-            product_id=source_item.product_id,
-            quantity=transfer.quantity,
-            min_stock_level=source_item.min_stock_level,
-            max_stock_level=source_item.max_stock_level
-        )
-        db.add(target_item)
-    
-    source_item.quantity -= transfer.quantity
-    db.commit()
     return {"message": "Transfer successful"}
 
+@router.post("/branches/{branch_id}/inventory/transfer")
+async def transfer_inventory_batch(
+    branch_id: int,
+    transfer: BatchTransferRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Move many products out of a branch in one transaction."""
+    lines = [{
+        "source_branch_id": branch_id,
+        "target_branch_id": item.target_branch_id or transfer.target_branch_id,
+        "product_id": item.product_id,
+        "quantity": item.quantity
+    } for item in transfer.items]
+    if any(line["target_branch_id"] is None for line in lines):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Every item needs a target branch"
+        )
+    try:
+        return TransferService.transfer_batch(
+            db, lines, requested_by=current_user.id, model=BranchInventory,
+            allow_partial=transfer.allow_partial
+        )
+    except InsufficientStockException as e:
+        results = TransferService.shortage_results(lines, e)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "Insufficient inventory",
+                "lines": [result for result in results if result["status"] == "failed"]
+            }
+        )
+
 # Branch Performance Endpoints
+async def _top_products(db: AsyncSession, branch_id: int, start_date: datetime, end_date: datetime, limit: int = 5):
+    revenue = func.sum(SaleItem.quantity * SaleItem.price - func.coalesce(SaleItem.discount, 0))
+    result = await db.execute(
+        select(Product.id, Product.name, func.sum(SaleItem.quantity), revenue)
+        .select_from(SaleItem)
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .join(Product, Product.id == SaleItem.product_id)
+        .where(Sale.branch_id == branch_id, Sale.created_at.between(start_date, end_date))
+        .group_by(Product.id, Product.name)
+        .order_by(revenue.desc())
+        .limit(limit)
+    )
+    return [
+        {"id": product_id, "name": name, "quantity": int(quantity or 0), "revenue": float(total or 0)}
+        for product_id, name, quantity, total in result
+    ]
+
+async def _customer_retention(db: AsyncSession, branch_id: int, start_date: datetime, end_date: datetime) -> float:
+    """Percentage of the period's customers who had bought at the branch before it."""
+    in_period = (
+        select(Sale.customer_id)
+        .where(
+            Sale.branch_id == branch_id,
+            Sale.customer_id.isnot(None),
+            Sale.created_at.between(start_date, end_date)
+        )
+        .distinct()
+        .subquery()
+    )
+    returning = (
+        select(Sale.customer_id)
+        .where(
+            Sale.branch_id == branch_id,
+            Sale.customer_id == in_period.c.customer_id,
+            Sale.created_at < start_date
+        )
+        .exists()
+    )
+    customers, retained = (await db.execute(
+        select(func.count(), func.count().filter(returning)).select_from(in_period)
+    )).one()
+    return round(100.0 * retained / customers, 2) if customers else 0.0
+
 @router.get("/branches/{branch_id}/performance")
 async def get_branch_performance(
     branch_id: int,
     time_range: str = Query("week", regex="^(day|week|month|year)$"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     end_date = datetime.now()
     
@@ -252,10 +331,12 @@ async def get_branch_performance(
         start_date = end_date - timedelta(days=365)
     
     # Get sales data
-    sales = db.query(Sale).filter(
-        Sale.branch_id == branch_id,
-        Sale.created_at.between(start_date, end_date)
-    ).all()
+    sales = (await db.execute(
+        select(Sale.created_at, Sale.total_amount).where(
+            Sale.branch_id == branch_id,
+            Sale.created_at.between(start_date, end_date)
+        )
+    )).all()
     
     # Calculate metrics
     revenue = sum(sale.total_amount for sale in sales)
@@ -263,17 +344,21 @@ async def get_branch_performance(
     average_order_value = revenue / orders if orders > 0 else 0
     
     # Get inventory data
-    inventory = db.query(BranchInventory).filter_by(branch_id=branch_id).all()
+    inventory = (await db.execute(
+        select(Product.name, BranchInventory.quantity)
+        .join(Product, Product.id == BranchInventory.product_id)
+        .where(BranchInventory.branch_id == branch_id)
+    )).all()
     inventory_data = [{
-        "name": item.product.name,
+        "name": item.name,
         "quantity": item.quantity
     } for item in inventory]
     
     # Get top products
-    top_products = AnalyticsService.get_top_products(branch_id, start_date, end_date)
+    top_products = await _top_products(db, branch_id, start_date, end_date)
     
     # Calculate customer retention
-    customer_retention = AnalyticsService.calculate_customer_retention(branch_id, start_date, end_date)
+    customer_retention = await _customer_retention(db, branch_id, start_date, end_date)
     
     return {
         "revenue": revenue,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from ..utils.auth import get_current_user
 from sqlalchemy.orm import Session
 from sqlalchemy import func, or_
@@ -10,6 +10,7 @@ from ..models import Product, Category, ProductVariant, Supplier, Transaction, U
 from ..extensions import get_db
 from ..utils.decorators import admin_required
 from ..utils.validation import validate_inventory_data
+from ..services.import_service import ImportService, DEFAULT_CHUNK_SIZE
 
 router = APIRouter()
 
@@ -100,6 +101,28 @@ async def get_inventory(
         "current_page": page
     }
 
+@router.post("/inventory/import", response_model=dict)
+def import_inventory(
+    branch_id: Optional[int] = Query(None),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=100, le=50000),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(admin_required())
+):
+    """
+    Bulk create or update branch inventory from a CSV or XLSX file, keyed by
+    (branch_id, product_id). Rows may give a ``sku`` instead of ``product_id``.
+    """
+    if not file.filename.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only CSV and XLSX files are supported"
+        )
+    
+    return ImportService.import_inventory(
+        db, file.file, file.filename, branch_id=branch_id, chunk_size=chunk_size
+    )
+
 @router.post("/inventory/adjust", response_model=dict)
 async def adjust_inventory(
     adjustment: InventoryAdjust,
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
-from ..utils.auth import get_current_user
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, UploadFile, File
+from ..utils.auth import get_current_user, get_current_user_async
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
-from sqlalchemy import or_
+from sqlalchemy import select
 
 from ..models import Product, Category, ProductImage, ProductVariant, User
-from ..extensions import get_db
+from ..extensions import get_async_db, get_db
+from ..core.scan_index import scan_index
 from ..utils.decorators import admin_required
-from ..utils.images import save_image, delete_image
+from ..utils.images import InvalidImage, save_image, delete_image, ensure_image
+from ..utils.money import from_cents
 from ..utils.validation import validate_product_data
+from ..services.catalog_sync_service import CatalogSyncService
+from ..services.import_service import ImportService, DEFAULT_CHUNK_SIZE
+from ..services.listing_service import ProductListingService
+from ..services.search_service import ProductSearchService
 from app.schemas.product import ProductImageResponse, ProductVariantResponse
 
 router = APIRouter()
@@ -41,6 +48,29 @@ class ProductResponse(ProductBase):
     class Config:
         from_attributes = True
 
+class ProductSuggestion(BaseModel):
+    id: int
+    name: str
+    sku: str
+    price: float
+    score: float
+
+class CatalogChanges(BaseModel):
+    version: int
+    more: bool
+    categories: List[dict]
+    products: List[dict]
+    variants: List[dict]
+    deleted: Dict[str, List[int]]
+
+class ScanResponse(BaseModel):
+    code: str
+    product_id: int
+    variant_id: Optional[int] = None
+    name: str
+    price: float
+    stock: int
+
 class ProductVariantBase(BaseModel):
     name: str
     sku: str
@@ -79,39 +109,65 @@ async def get_products(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     in_stock: Optional[bool] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,name,price,images.url"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    query = db.query(Product)
+    try:
+        listing_fields = ProductListingService.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    query = select(Product)
+    order_by = [Product.created_at.desc()]
     
     if category_id:
         query = query.filter_by(category_id=category_id)
     if search:
-        query = query.filter(
-            or_(
-                Product.name.ilike(f'%{search}%'),
-                Product.sku.ilike(f'%{search}%'),
-                Product.description.ilike(f'%{search}%')
-            )
-        )
+        # Ranked full-text match instead of a scan with ILIKE '%term%'
+        ranked = await db.run_sync(ProductSearchService.ranked, search)
+        if ranked is None:
+            return []
+        query = query.join(ranked, ranked.c.id == Product.id)
+        order_by = [ranked.c.score.desc(), Product.id]
     if min_price is not None:
-        query = query.filter(Product.price >= min_price)
+        query = query.where(Product.price >= min_price)
     if max_price is not None:
-        query = query.filter(Product.price <= max_price)
+        query = query.where(Product.price <= max_price)
     if in_stock:
-        query = query.filter(Product.stock > 0)
+        query = query.where(Product.total_stock > 0)
     
-    products = query.order_by(Product.created_at.desc())\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
-    
-    # Convert images and variants to Pydantic response models for each product
-    for product in products:
-        product.images = [ProductImageResponse.from_orm(img) for img in getattr(product, 'images', [])]
-        product.variants = [ProductVariantResponse.from_orm(var) for var in getattr(product, 'variants', [])]
-    
-    return products
+    # Serialized from column tuples by the listing service; ProductResponse documents the full shape
+    body = await db.run_sync(
+        ProductListingService.render,
+        query.order_by(*order_by).offset(skip).limit(limit),
+        listing_fields
+    )
+    return Response(content=body, media_type="application/json")
+
+@router.get("/products/autocomplete", response_model=List[ProductSuggestion])
+async def autocomplete_products(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    return await db.run_sync(ProductSearchService.autocomplete, q, limit=limit)
+
+@router.get("/products/changes", response_model=CatalogChanges)
+async def get_catalog_changes(
+    since: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=50000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    Categories, products and variants created, updated or deleted since a
+    catalog version. Pass the returned ``version`` next time, and ask again
+    right away while ``more`` is true. Responses are gzip-compressed for
+    clients that accept it.
+    """
+    body = await db.run_sync(CatalogSyncService.render, since, limit=limit)
+    return Response(content=body, media_type="application/json")
 
 @router.post("/products", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
@@ -154,20 +210,42 @@ async def create_product(
     
     return db_product
 
+@router.post("/products/import")
+def import_products(
+    business_id: int = Query(...),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=100, le=50000),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(admin_required())
+):
+    """
+    Bulk create or update products from a CSV or XLSX file, keyed by SKU.
+    Runs in the threadpool so a large file doesn't block the event loop.
+    """
+    if not file.filename.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only CSV and XLSX files are supported"
+        )
+    
+    return ImportService.import_products(
+        db, file.file, file.filename, business_id=business_id, chunk_size=chunk_size
+    )
+
 @router.get("/products/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    product = db.query(Product).get(product_id)
+    product = await db.get(
+        Product, product_id, options=[selectinload(Product.images), selectinload(Product.variants)]
+    )
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
-    product.images = [ProductImageResponse.from_orm(img) for img in getattr(product, 'images', [])]
-    product.variants = [ProductVariantResponse.from_orm(var) for var in getattr(product, 'variants', [])]
     return product
 
 @router.put("/products/{product_id}", response_model=ProductResponse)
@@ -232,12 +310,14 @@ async def delete_product(
         )
     
     # Delete associated images
+    filenames = [image.filename for image in product.images]
     for image in product.images:
-        delete_image(image.filename)
         db.delete(image)
     
     db.delete(product)
     db.commit()
+    for filename in filenames:
+        delete_image(db, filename)
     
     return {"message": "Product deleted successfully"}
 
@@ -261,21 +341,26 @@ async def add_product_image(
             detail="No image file provided"
         )
     
-    filename = save_image(image)
+    try:
+        stored = await save_image(image)
+    except InvalidImage as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     db_image = ProductImage(
         product_id=product_id,
-        filename=filename,
-        url=f"/uploads/{filename}",
+        filename=stored.filename,
+        url=stored.url,
         is_primary=not product.images
     )
     
     db.add(db_image)
     db.commit()
+    await ensure_image(image, stored)
     db.refresh(db_image)
     
     return {
         "message": "Image added successfully",
-        "image": db_image
+        "image": db_image,
+        "thumbnails": stored.thumbnails
     }
 
 @router.delete("/products/{product_id}/images/{image_id}")
@@ -299,9 +384,9 @@ async def delete_product_image(
             detail="Image not found"
         )
     
-    delete_image(image.filename)
     db.delete(image)
     db.commit()
+    delete_image(db, image.filename)
     
     return {"message": "Image deleted successfully"}
 
@@ -395,20 +480,22 @@ async def delete_product_variant(
     
     return {"message": "Variant deleted successfully"}
 
-@router.post("/scan-barcode")
-async def scan_barcode(
+@router.post("/scan-barcode", response_model=ScanResponse)
+def scan_barcode(
     barcode: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    product = db.query(Product).filter_by(barcode=barcode).first()
-    if not product:
+    # Product or variant SKU or barcode; the in-memory index answers
+    # without a query unless the code is unknown to it
+    record = scan_index.lookup_db(db, barcode)
+    if not record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
-    return product
+    return ScanResponse(**dict(record._asdict(), code=barcode, price=float(from_cents(record.price))))
 
 @router.post("/products/{product_id}/barcodes", response_model=BarcodeResponse)
 async def add_barcode(
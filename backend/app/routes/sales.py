@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from ..utils.auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from ..utils.auth import get_current_user, get_current_user_async
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 
 from ..models import Sale, SaleItem, Order, OrderItem, Product, Transaction, User
-from ..extensions import get_db
+from ..extensions import get_async_db, get_db
 from ..utils.decorators import admin_required
 from ..utils.validation import validate_sale_data
+from ..services.stock_service import StockService
+from ..services.checkout_service import CheckoutService
+from ..services.pricing_service import PricingService
+from ..core.exceptions import InsufficientStockException
+from ..utils.pagination import NEXT_CURSOR_HEADER, keyset_page, next_cursor
 from app.schemas.product import ProductResponse
 
 router = APIRouter()
@@ -61,17 +67,30 @@ class SalesResponse(BaseModel):
     pages: int
     current_page: int
 
-# Routes
-@router.get("/sales", response_model=SalesResponse)
-async def get_sales(
-    page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=100),
-    start_date: Optional[datetime] = None,
-    end_date: Optional[datetime] = None,
-    status: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+def _apply_stock_changes(db: Session, changes, products: dict) -> None:
+    """Apply product stock changes, reporting shortages by product name."""
+    try:
+        StockService.apply_changes(db, changes, model=Product)
+    except InsufficientStockException as e:
+        db.rollback()
+        names = ", ".join(products[s['key'][0]].name for s in e.shortages)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Insufficient stock for product {names}"
+        )
+
+# The sale handlers run their ORM work through AsyncSession.run_sync: the
+# code stays synchronous (dynamic relationships, the stock engine) while the
+# async driver yields to the event loop on every query.
+def _list_sales(
+    db: Session,
+    page: int,
+    per_page: int,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    status: Optional[str],
+    cursor: Optional[str]
+) -> Tuple[SalesResponse, Optional[str]]:
     query = db.query(Sale)
     
     if start_date:
@@ -81,41 +100,29 @@ async def get_sales(
     if status:
         query = query.filter_by(payment_status=status)
     
-    sales = query.order_by(Sale.created_at.desc()).offset(
-        (page - 1) * per_page
-    ).limit(per_page).all()
-    
     total = query.count()
     
+    page_query = keyset_page(query, Sale, cursor=cursor)
+    if not cursor:
+        page_query = page_query.offset((page - 1) * per_page)
+    sales = page_query.limit(per_page).all()
+    
     # Convert product to ProductResponse for each sale item in each sale
     for sale in sales:
         for item in getattr(sale, 'items', []):
             item.product = ProductResponse.from_orm(item.product) if item.product else None
     
-    return {
-        "sales": sales,
-        "total": total,
-        "pages": (total + per_page - 1) // per_page,
-        "current_page": page
-    }
+    return SalesResponse(
+        sales=[SaleResponse.from_orm(sale) for sale in sales],
+        total=total,
+        pages=(total + per_page - 1) // per_page,
+        current_page=page
+    ), next_cursor(sales, per_page)
 
-@router.post("/sales", response_model=SaleResponse, status_code=status.HTTP_201_CREATED)
-async def create_sale(
-    sale: SaleCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    # Validate sale data
-    errors = validate_sale_data(sale.dict())
-    if errors:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=errors
-        )
-    
+def _record_sale(db: Session, sale: SaleCreate, user_id: int) -> SaleResponse:
     # Create sale
     db_sale = Sale(
-        user_id=current_user.id,
+        user_id=user_id,
         customer_name=sale.customer_name,
         customer_email=sale.customer_email,
         customer_phone=sale.customer_phone,
@@ -124,40 +131,33 @@ async def create_sale(
         notes=sale.notes
     )
     
-    # Add sale items
-    total_amount = 0
-    for item_data in sale.items:
-        product = db.query(Product).get(item_data.product_id)
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product {item_data.product_id} not found"
-            )
-        
-        if product.stock < item_data.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Insufficient stock for product {product.name}"
-            )
-        
-        sale_item = SaleItem(
-            sale=db_sale,
-            product=product,
-            variant_id=item_data.variant_id,
-            quantity=item_data.quantity,
-            price=product.price,
-            discount=item_data.discount,
-            notes=item_data.notes
-        )
-        
-        # Update product stock
-        product.stock -= item_data.quantity
-        
-        db_sale.items.append(sale_item)
-        total_amount += sale_item.subtotal
+    # Load and lock every referenced product and variant in one query each
+    lines = [item.dict() for item in sale.items]
+    loaded = CheckoutService.load_products(
+        db,
+        [line['product_id'] for line in lines],
+        [line['variant_id'] for line in lines if line['variant_id'] is not None]
+    )
+    # The line discount here is an amount; prices come from the catalogue
+    priced = PricingService.price_basket(db, {
+        'items': [
+            dict(line, unit_price=None, discount=0, discount_amount=line['discount'])
+            for line in lines
+        ]
+    }, loaded=loaded)
+    items = PricingService.item_rows(priced)
+    products = loaded['products']
+    
+    # Decrement stock for the whole basket in one conditional update
+    _apply_stock_changes(db, [(item['product_id'], -item['quantity']) for item in items], products)
+    
+    for column, value in PricingService.sale_totals(priced).items():
+        setattr(db_sale, column, value)
+    total_amount = db_sale.total_amount
+    db.add(db_sale)
+    db.flush()
     
-    db_sale.total_amount = total_amount
-    db_sale.subtotal = total_amount
+    CheckoutService.insert_items(db, db_sale.id, items)
     
     # Create transaction record
     if sale.payment_method == "cash":
@@ -170,18 +170,12 @@ async def create_sale(
         )
         db.add(transaction)
     
-    db.add(db_sale)
     db.commit()
     db.refresh(db_sale)
     
-    return db_sale
+    return SaleResponse.from_orm(db_sale)
 
-@router.get("/sales/{sale_id}", response_model=SaleResponse)
-async def get_sale(
-    sale_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+def _read_sale(db: Session, sale_id: int) -> SaleResponse:
     sale = db.query(Sale).get(sale_id)
     if not sale:
         raise HTTPException(
@@ -190,7 +184,55 @@ async def get_sale(
         )
     for item in getattr(sale, 'items', []):
         item.product = ProductResponse.from_orm(item.product) if item.product else None
-    return sale
+    return SaleResponse.from_orm(sale)
+
+# Routes
+@router.get("/sales", response_model=SalesResponse)
+async def get_sales(
+    response: Response,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """
+    List sales, newest first.
+    Send the X-Next-Cursor header of a page back as ``cursor`` for the next one.
+    """
+    sales, following = await db.run_sync(
+        _list_sales, page, per_page, start_date, end_date, status, cursor
+    )
+    if following:
+        response.headers[NEXT_CURSOR_HEADER] = following
+    return sales
+
+@router.post("/sales", response_model=SaleResponse, status_code=status.HTTP_201_CREATED)
+async def create_sale(
+    sale: SaleCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    # Validate sale data
+    errors = validate_sale_data(sale.dict())
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=errors
+        )
+    
+    return await db.run_sync(_record_sale, sale, current_user.id)
+
+@router.get("/sales/{sale_id}", response_model=SaleResponse)
+async def get_sale(
+    sale_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    return await db.run_sync(_read_sale, sale_id)
 
 @router.put("/sales/{sale_id}", response_model=SaleResponse)
 async def update_sale(
@@ -244,11 +286,7 @@ async def add_sale_item(
             detail=f"Product {item.product_id} not found"
         )
     
-    if product.stock < item.quantity:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Insufficient stock for product {product.name}"
-        )
+    _apply_stock_changes(db, [(product.id, -item.quantity)], {product.id: product})
     
     sale_item = SaleItem(
         sale=sale,
@@ -260,9 +298,6 @@ async def add_sale_item(
         notes=item.notes
     )
     
-    # Update product stock
-    product.stock -= item.quantity
-    
     sale.items.append(sale_item)
     sale.calculate_totals()
     
@@ -298,18 +333,14 @@ async def update_sale_item(
             detail="Item does not belong to this sale"
         )
     
-    # Restore previous stock
-    sale_item.product.stock += sale_item.quantity
-    
-    # Update item
+    # Update item, moving only the net quantity difference in stock
     if item_update.quantity:
-        if sale_item.product.stock < item_update.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Insufficient stock for product {sale_item.product.name}"
-            )
+        _apply_stock_changes(
+            db,
+            [(sale_item.product_id, sale_item.quantity - item_update.quantity)],
+            {sale_item.product_id: sale_item.product}
+        )
         sale_item.quantity = item_update.quantity
-        sale_item.product.stock -= item_update.quantity
     
     if item_update.price:
         sale_item.price = item_update.price
@@ -351,7 +382,7 @@ async def delete_sale_item(
         )
     
     # Restore product stock
-    sale_item.product.stock += sale_item.quantity
+    StockService.apply_changes(db, [(sale_item.product_id, sale_item.quantity)], model=Product)
     
     db.delete(sale_item)
     sale.calculate_totals()
@@ -4,12 +4,12 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from pydantic import BaseModel
 from datetime import datetime
-import os
-from werkzeug.utils import secure_filename
 
 from ..models import User, Business, SystemSetting
 from ..extensions import get_db
+from ..core.passwords import password_hasher
 from ..utils.email import send_email
+from ..utils.images import InvalidImage, delete_image, ensure_image, save_image
 
 router = APIRouter()
 
@@ -88,12 +88,12 @@ async def update_user_profile(
 
     # Handle password change if provided
     if profile_update.current_password and profile_update.new_password:
-        if not current_user.check_password(profile_update.current_password):
+        if not await password_hasher.verify(profile_update.current_password, current_user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Current password is incorrect"
             )
-        current_user.set_password(profile_update.new_password)
+        current_user.password_hash = await password_hasher.hash(profile_update.new_password)
 
     db.commit()
     db.refresh(current_user)
@@ -118,33 +118,26 @@ async def upload_avatar(
         )
 
     try:
-        filename = secure_filename(avatar.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        
-        # Ensure upload directory exists
-        upload_dir = os.path.join("uploads", "avatars")
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, unique_filename)
-        with open(file_path, "wb") as buffer:
-            content = await avatar.read()
-            buffer.write(content)
-        
-        # Update user's avatar URL
-        current_user.avatar_url = f"/uploads/avatars/{unique_filename}"
-        db.commit()
-        
-        return {
-            "message": "Avatar uploaded successfully",
-            "avatar_url": current_user.avatar_url
-        }
-    except Exception as e:
+        stored = await save_image(avatar)
+    except InvalidImage as e:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
 
+    # Update user's avatar URL
+    previous = current_user.profile_image
+    current_user.profile_image = stored.thumbnails[max(stored.thumbnails)] if stored.thumbnails else stored.url
+    db.commit()
+    await ensure_image(avatar, stored)
+    if previous and previous != current_user.profile_image:
+        delete_image(db, previous)
+
+    return {
+        "message": "Avatar uploaded successfully",
+        "avatar_url": current_user.profile_image
+    }
+
 @router.get("/business", response_model=BusinessSettingsResponse)
 async def get_business_settings(
     db: Session = Depends(get_db),
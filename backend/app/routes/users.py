@@ -5,10 +5,10 @@ from sqlalchemy import or_
 from typing import List, Optional
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 
 from ..models import User, UserProfile, Role, Permission
 from ..extensions import get_db
+from ..core.passwords import password_hasher
 from ..utils.decorators import admin_required
 from ..utils.validation import validate_user_data
 from ..utils.notifications import create_notification
@@ -132,7 +132,7 @@ async def create_user(
     db_user = User(
         username=user.username,
         email=user.email,
-        password=generate_password_hash(user.password),
+        password_hash=await password_hasher.hash(user.password),
         first_name=user.first_name,
         last_name=user.last_name,
         is_active=user.is_active,
@@ -392,13 +392,13 @@ async def change_password(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    if not current_user.check_password(current_password):
+    if not await password_hasher.verify(current_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Current password is incorrect"
         )
     
-    current_user.set_password(new_password)
+    current_user.password_hash = await password_hasher.hash(new_password)
     db.commit()
     
     return {"message": "Password changed successfully"} 
\ No newline at end of file
@@ -94,7 +94,7 @@ class SessionCreate(BaseModel):
     ip_address: Optional[str] = None
 
 class SessionResponse(BaseModel):
-    id: int
+    id: str
     user_id: int
     created_at: datetime
     expires_at: datetime
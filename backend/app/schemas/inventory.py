@@ -95,6 +95,8 @@ class Inventory(InventoryBase):
     needs_restock: bool
     is_expired: bool
     days_until_expiry: Optional[int]
+    abc_class: Optional[str] = None
+    xyz_class: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -151,6 +153,36 @@ class InventoryTransfer(InventoryTransferBase):
     class Config:
         from_attributes = True
 
+class InventoryTransferBatchCreate(BaseModel):
+    lines: List[InventoryTransferCreate]
+    allow_partial: bool = False
+
+class InventoryTransferLineResult(InventoryTransferBase):
+    line: int
+    status: str  # completed, failed, not_attempted
+    transfer_id: Optional[int] = None
+    error: Optional[str] = None
+
+class InventoryTransferBatchResult(BaseModel):
+    transferred: int
+    failed: int
+    lines: List[InventoryTransferLineResult]
+
+class InventoryBatchCreate(BaseModel):
+    product_id: int
+    quantity: conint(gt=0)
+    batch_number: Optional[str] = None
+    expiry_date: Optional[datetime] = None
+
+class InventoryBatch(InventoryBatchCreate):
+    id: int
+    inventory_id: int
+    branch_id: int
+    received_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Product with relationships
 class ProductWithInventory(Product):
     inventory_items: List[Inventory] = []
@@ -190,7 +222,9 @@ class InventoryTransactionBase(BaseModel):
     notes: Optional[str] = None
 
 class InventoryTransactionCreate(InventoryTransactionBase):
-    pass
+    # Purchases with either field are received as a tracked batch
+    batch_number: Optional[str] = None
+    expiry_date: Optional[datetime] = None
 
 class InventoryTransactionUpdate(BaseModel):
     quantity: Optional[conint(ge=1)] = None
@@ -114,10 +114,12 @@ class Product(ProductBase):
         id (int): Product ID
         created_at (datetime): Creation timestamp
         updated_at (datetime): Last update timestamp
+        total_stock (int): Stock across all branches
     """
     id: int
     created_at: datetime
     updated_at: datetime
+    total_stock: int = 0
 
     class Config:
         orm_mode = True
@@ -159,7 +161,7 @@ class ProductVariantResponse(BaseModel):
     price_adjustment: float
     stock: int
     attributes: Optional[dict] = None
-    created_at: datetime
+    created_at: Optional[datetime] = None  # Variants carry no timestamp
 
     class Config:
         from_attributes = True
@@ -1,6 +1,7 @@
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field, validator
 from datetime import datetime
+from decimal import Decimal
 from enum import Enum
 
 class PaymentMethod(str, Enum):
@@ -23,12 +24,12 @@ class SaleItemBase(BaseModel):
     product_id: int
     quantity: int = Field(..., gt=0)
     unit_price: float = Field(..., gt=0)
-    discount: float = Field(0, ge=0)
-    tax_rate: Optional[float] = Field(0, ge=0)
+    discount: float = Field(0, ge=0, le=100)  # Percent off the line
+    tax_rate: Optional[float] = Field(None, ge=0)  # Percent; None applies the tax rules
     
     @property
     def total_price(self) -> float:
-        return (self.unit_price * self.quantity) * (1 - self.discount / 100) * (1 + self.tax_rate / 100)
+        return (self.unit_price * self.quantity) * (1 - self.discount / 100) * (1 + (self.tax_rate or 0) / 100)
 
 class SaleItemCreate(SaleItemBase):
     """Schema for creating a sale item"""
@@ -105,4 +106,93 @@ class SaleFilter(BaseModel):
     def validate_date_range(cls, v, values):
         if v and 'start_date' in values and values['start_date'] and v < values['start_date']:
             raise ValueError('end_date must be after start_date')
-        return v 
\ No newline at end of file
+        return v
+
+class OfflineSaleItem(BaseModel):
+    """Schema for an item of a sale recorded offline"""
+    product_id: int
+    variant_id: Optional[int] = None
+    quantity: int = Field(..., gt=0)
+    price: Optional[float] = Field(None, ge=0)  # Price charged at the till; current price if omitted
+    discount: float = Field(0, ge=0)  # Amount off the line
+    notes: Optional[str] = None
+
+class OfflineSale(BaseModel):
+    """Schema for one line of an offline sale sync upload"""
+    client_sale_id: str = Field(..., min_length=1, max_length=64)
+    branch_id: int
+    created_at: datetime
+    customer_id: Optional[int] = None
+    payment_method: PaymentMethod = PaymentMethod.CASH
+    notes: Optional[str] = None
+    items: List[OfflineSaleItem] = Field(..., min_items=1)
+
+class SaleSyncResult(BaseModel):
+    """Schema for the outcome of one synced sale"""
+    line: int
+    client_sale_id: Optional[str] = None
+    status: str  # created, duplicate, invalid, rejected or failed
+    sale_id: Optional[int] = None
+    error: Optional[str] = None
+
+class SaleSyncResponse(BaseModel):
+    """Schema for an offline sale sync response"""
+    created: int
+    duplicates: int
+    failed: int
+    results: List[SaleSyncResult]
+
+class QuoteItem(BaseModel):
+    """Schema for a line of a basket to price"""
+    product_id: int
+    variant_id: Optional[int] = None
+    quantity: int = Field(..., gt=0)
+    unit_price: Optional[Decimal] = Field(None, ge=0)  # Current price if omitted
+    discount: Decimal = Field(0, ge=0, le=100)  # Percent off the line
+    discount_amount: Decimal = Field(0, ge=0)
+    tax_rate: Optional[Decimal] = Field(None, ge=0)  # Percent; None applies the tax rules
+
+class SaleQuote(BaseModel):
+    """Schema for a basket to price without recording a sale"""
+    branch_id: Optional[int] = None
+    discount: Decimal = Field(0, ge=0, le=100)  # Percent off the subtotal
+    discount_amount: Decimal = Field(0, ge=0)
+    tax: Decimal = Field(0, ge=0)  # Percent, for items no tax rule covers
+    items: List[QuoteItem] = Field(..., min_items=1)
+
+class QuoteLine(BaseModel):
+    """Schema for a priced basket line"""
+    product_id: int
+    variant_id: Optional[int] = None
+    quantity: int
+    unit_price: Decimal
+    gross: Decimal
+    promotion_id: Optional[int] = None
+    promotion_discount: Decimal
+    discount: Decimal  # Promotion and line discount
+    subtotal: Decimal
+    sale_discount: Decimal  # Share of the sale-level discount
+    tax_rate: Decimal
+    tax: Decimal
+    total: Decimal
+
+class SaleQuoteResponse(BaseModel):
+    """Schema for a priced basket"""
+    branch_id: Optional[int] = None
+    items: List[QuoteLine]
+    subtotal: Decimal
+    discount: Decimal
+    tax: Decimal
+    total: Decimal
+
+class SaleReprice(BaseModel):
+    """Schema for repricing stored sales"""
+    branch_id: Optional[int] = None
+    sale_ids: Optional[List[int]] = None
+    status: SaleStatus = SaleStatus.PENDING
+
+class SaleRepriceResponse(BaseModel):
+    """Schema for the outcome of a repricing"""
+    sales: int
+    items: int
+    changed: int
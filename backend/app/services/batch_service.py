@@ -0,0 +1,354 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, bindparam, case, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..core.exceptions import ConflictException
+from ..models.inventory import Inventory, InventoryBatch
+from .stock_service import StockService
+
+BranchProduct = Tuple[int, int]
+
+class BatchService:
+    """
+    Batch (lot) tracking with expiry dates and first-expiry-first-out picking.
+
+    ``Inventory.quantity`` stays the on-hand total; ``InventoryBatch`` rows split
+    it into lots. Stock received before batch tracking, or removed outside
+    FEFO picking, is reported as unbatched rather than rejected. None of the
+    methods commit.
+    """
+
+    @staticmethod
+    def receive(
+        db: Session,
+        lines: Sequence[Mapping[str, Any]],
+        *,
+        created_by: Optional[int] = None,
+        ledger: Optional[Mapping[str, Any]] = None
+    ) -> List[int]:
+        """
+        Add received stock as new batches.
+
+        Args:
+            db: Database session
+            lines: Dicts with ``branch_id``, ``product_id``, ``quantity`` and
+                optional ``batch_number`` and ``expiry_date``
+            created_by: User receiving the stock
+            ledger: Ledger entry fields for the stock increase
+
+        Returns:
+            list: IDs of the created batches, in line order
+        """
+        if not lines:
+            return []
+        StockService.apply_changes(
+            db,
+            [((line['branch_id'], line['product_id']), line['quantity']) for line in lines],
+            create_missing=True,
+            ledger=dict({'entry_type': 'purchase', 'created_by': created_by}, **(ledger or {}))
+        )
+
+        inventory = Inventory.__table__
+        keys = sorted({(line['branch_id'], line['product_id']) for line in lines})
+        inventory_ids = {
+            tuple(row[:2]): row[2]
+            for row in db.execute(
+                select(inventory.c.branch_id, inventory.c.product_id, inventory.c.id)
+                .where(tuple_(inventory.c.branch_id, inventory.c.product_id).in_(keys))
+            )
+        }
+
+        batches = InventoryBatch.__table__
+        ids = db.execute(
+            batches.insert().returning(batches.c.id, sort_by_parameter_order=True),
+            [
+                {
+                    'inventory_id': inventory_ids[(line['branch_id'], line['product_id'])],
+                    'branch_id': line['branch_id'],
+                    'product_id': line['product_id'],
+                    'batch_number': line.get('batch_number'),
+                    'quantity': line['quantity'],
+                    'expiry_date': line.get('expiry_date'),
+                    'created_by': created_by,
+                }
+                for line in lines
+            ]
+        ).scalars().all()
+
+        db.execute(
+            inventory.update()
+            .where(inventory.c.id.in_(set(inventory_ids.values())))
+            .values(last_restock_date=func.now())
+        )
+        BatchService.refresh_expiry(db, inventory_ids.values())
+        return ids
+
+    @staticmethod
+    def fulfil(
+        db: Session,
+        demands: Mapping[BranchProduct, int],
+        *,
+        ledger: Optional[Mapping[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Remove stock and pick it from batches first-expiry-first-out.
+
+        Args:
+            db: Database session
+            demands: Units to remove per (branch_id, product_id)
+            ledger: Ledger entry fields for the stock decrease
+
+        Returns:
+            dict: New ``levels``, the batch ``allocations`` and ``unbatched`` units per key
+
+        Raises:
+            InsufficientStockException: A key does not have enough stock on hand
+        """
+        levels = StockService.apply_changes(db, {key: -qty for key, qty in demands.items()}, ledger=ledger)
+        allocations, unbatched = BatchService.allocate_fefo(db, demands)
+        return {'levels': levels, 'allocations': allocations, 'unbatched': unbatched}
+
+    @staticmethod
+    def allocate_fefo(
+        db: Session,
+        demands: Mapping[BranchProduct, int]
+    ) -> Tuple[Dict[BranchProduct, List[dict]], Dict[BranchProduct, int]]:
+        """
+        Consume batch quantities for many (branch, product) demands at once.
+
+        One windowed query picks, per key, the earliest-expiring batches whose
+        running total covers the demand (batches without expiry last), and one
+        executemany applies the picks.
+
+        Args:
+            db: Database session
+            demands: Units to pick per (branch_id, product_id)
+
+        Returns:
+            tuple: Picks per key (``batch_id``, ``batch_number``, ``expiry_date``,
+            ``quantity``) and the units per key no batch could cover
+        """
+        demands = {key: qty for key, qty in demands.items() if qty > 0}
+        if not demands:
+            return {}, {}
+        batches = InventoryBatch.__table__
+        keys = sorted(demands)
+        key_filter = tuple_(batches.c.branch_id, batches.c.product_id).in_(keys)
+
+        # Lock candidate batches in id order before computing the picks.
+        db.execute(
+            select(batches.c.id)
+            .where(key_filter, batches.c.quantity > 0)
+            .order_by(batches.c.id)
+            .with_for_update()
+        )
+
+        need = case(
+            *[
+                (and_(batches.c.branch_id == branch_id, batches.c.product_id == product_id), qty)
+                for (branch_id, product_id), qty in demands.items()
+            ]
+        )
+        ranked = (
+            select(
+                batches.c.id,
+                batches.c.branch_id,
+                batches.c.product_id,
+                batches.c.batch_number,
+                batches.c.expiry_date,
+                batches.c.quantity,
+                need.label('need'),
+                func.sum(batches.c.quantity).over(
+                    partition_by=(batches.c.branch_id, batches.c.product_id),
+                    order_by=(batches.c.expiry_date.asc().nulls_last(), batches.c.id)
+                ).label('running')
+            )
+            .where(key_filter, batches.c.quantity > 0)
+            .subquery()
+        )
+        picked = db.execute(
+            select(ranked)
+            .where(ranked.c.running - ranked.c.quantity < ranked.c.need)
+            .order_by(ranked.c.branch_id, ranked.c.product_id, ranked.c.running)
+        ).all()
+
+        allocations = defaultdict(list)
+        remaining = dict(demands)
+        params = []
+        for row in picked:
+            key = (row.branch_id, row.product_id)
+            take = min(row.quantity, row.need - (row.running - row.quantity))
+            remaining[key] -= take
+            params.append({'bid': row.id, 'take': take})
+            allocations[key].append({
+                'batch_id': row.id,
+                'batch_number': row.batch_number,
+                'expiry_date': row.expiry_date,
+                'quantity': take,
+            })
+
+        if params:
+            result = db.execute(
+                batches.update()
+                .where(batches.c.id == bindparam('bid'))
+                .where(batches.c.quantity >= bindparam('take'))
+                .values(quantity=batches.c.quantity - bindparam('take')),
+                params
+            )
+            if db.get_bind().dialect.supports_sane_multi_rowcount and result.rowcount != len(params):
+                raise ConflictException("Batch quantities changed during allocation")
+            BatchService.refresh_expiry(
+                db,
+                select(Inventory.__table__.c.id).where(
+                    tuple_(Inventory.__table__.c.branch_id, Inventory.__table__.c.product_id).in_(list(allocations))
+                ).scalar_subquery()
+            )
+
+        unbatched = {key: qty for key, qty in remaining.items() if qty > 0}
+        return dict(allocations), unbatched
+
+    @staticmethod
+    def move(db: Session, lines: Sequence[Mapping[str, int]], *, created_by: Optional[int] = None) -> None:
+        """
+        Move batches along with transferred stock.
+
+        Picks each line's units from the source branch's batches
+        first-expiry-first-out and adds them to the target branch as batches
+        with the same number and expiry date. Units no source batch covers
+        arrive unbatched. The stock itself must already have been moved.
+
+        Args:
+            db: Database session
+            lines: Dicts with ``source_branch_id``, ``target_branch_id``,
+                ``product_id`` and ``quantity``, in transfer order
+            created_by: User performing the transfer
+        """
+        demands = defaultdict(int)
+        for line in lines:
+            demands[(line['source_branch_id'], line['product_id'])] += line['quantity']
+        allocations, _ = BatchService.allocate_fefo(db, demands)
+        if not allocations:
+            return
+
+        # Hand the picks of each source to its lines in order
+        picks = {key: [dict(pick) for pick in batch_picks] for key, batch_picks in allocations.items()}
+        arrivals = []
+        for line in lines:
+            target = (line['target_branch_id'], line['product_id'])
+            left = line['quantity']
+            queue = picks.get((line['source_branch_id'], line['product_id']), [])
+            while left and queue:
+                take = min(left, queue[0]['quantity'])
+                arrivals.append((target, queue[0]['batch_number'], queue[0]['expiry_date'], take))
+                left -= take
+                queue[0]['quantity'] -= take
+                if not queue[0]['quantity']:
+                    queue.pop(0)
+        if not arrivals:
+            return
+
+        inventory = Inventory.__table__
+        inventory_ids = {
+            tuple(row[:2]): row[2]
+            for row in db.execute(
+                select(inventory.c.branch_id, inventory.c.product_id, inventory.c.id)
+                .where(tuple_(inventory.c.branch_id, inventory.c.product_id).in_(
+                    sorted({target for target, *_ in arrivals})
+                ))
+            )
+        }
+        db.execute(
+            InventoryBatch.__table__.insert(),
+            [
+                {
+                    'inventory_id': inventory_ids[target],
+                    'branch_id': target[0],
+                    'product_id': target[1],
+                    'batch_number': batch_number,
+                    'quantity': quantity,
+                    'expiry_date': expiry_date,
+                    'created_by': created_by,
+                }
+                for target, batch_number, expiry_date, quantity in arrivals
+            ]
+        )
+        BatchService.refresh_expiry(db, set(inventory_ids.values()))
+
+    @staticmethod
+    def expiring(
+        db: Session,
+        *,
+        branch_id: int,
+        within_days: int = 30,
+        include_expired: bool = False,
+        product_id: Optional[int] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[InventoryBatch]:
+        """
+        Batches with stock that expire within ``within_days``, soonest first.
+
+        Served by a range scan on ``(branch_id, expiry_date)``.
+
+        Args:
+            db: Database session
+            branch_id: Branch to scan
+            within_days: Look-ahead window in days
+            include_expired: Also return batches that have already expired
+            product_id: Limit to one product
+            skip: Rows to skip
+            limit: Maximum rows to return
+
+        Returns:
+            list: Matching ``InventoryBatch`` rows ordered by expiry date
+        """
+        now = datetime.now(timezone.utc)
+        query = db.query(InventoryBatch).filter(
+            InventoryBatch.branch_id == branch_id,
+            InventoryBatch.expiry_date <= now + timedelta(days=within_days),
+            InventoryBatch.quantity > 0
+        )
+        if not include_expired:
+            query = query.filter(InventoryBatch.expiry_date >= now)
+        if product_id is not None:
+            query = query.filter(InventoryBatch.product_id == product_id)
+        return query.order_by(InventoryBatch.expiry_date, InventoryBatch.id).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def refresh_expiry(db: Session, inventory_ids) -> None:
+        """
+        Set ``Inventory.expiry_date`` and ``batch_number`` to the earliest-expiring
+        batch with stock left, for many inventory rows in one UPDATE.
+
+        Args:
+            db: Database session
+            inventory_ids: Iterable of IDs or a scalar subquery selecting them
+        """
+        inventory = Inventory.__table__
+        batches = InventoryBatch.__table__
+        if not hasattr(inventory_ids, 'compile'):
+            inventory_ids = list(inventory_ids)
+            if not inventory_ids:
+                return
+        candidates = batches.alias('candidates')
+        first_batch = (
+            select(candidates.c.id)
+            .where(candidates.c.inventory_id == inventory.c.id, candidates.c.quantity > 0)
+            .order_by(candidates.c.expiry_date.asc().nulls_last(), candidates.c.id)
+            .limit(1)
+            .correlate(inventory)
+            .scalar_subquery()
+        )
+        db.execute(
+            inventory.update()
+            .where(inventory.c.id.in_(inventory_ids))
+            .values(
+                expiry_date=select(batches.c.expiry_date).where(batches.c.id == first_batch)
+                .correlate(inventory).scalar_subquery(),
+                batch_number=select(batches.c.batch_number).where(batches.c.id == first_batch)
+                .correlate(inventory).scalar_subquery()
+            )
+        )
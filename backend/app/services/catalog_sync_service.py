@@ -0,0 +1,223 @@
+from typing import Any, Dict, List, Optional
+
+import orjson
+from sqlalchemy import false, func, literal, select, text
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.catalog import CatalogChange
+from ..models.product import Category, Product, ProductVariant
+from .listing_service import json_default
+
+_changes = CatalogChange.__table__
+_categories = Category.__table__
+_products = Product.__table__
+_variants = ProductVariant.__table__
+
+# Entity name -> (payload key, table, fields sent to clients, columns whose changes bump the version).
+# Stock is not part of the catalog: it changes with every sale and has its own endpoints.
+TRACKED = {
+    'category': (
+        'categories',
+        _categories,
+        {name: _categories.c[name] for name in ('id', 'name', 'slug', 'description', 'parent_id')},
+        ('name', 'slug', 'description', 'parent_id'),
+    ),
+    'product': (
+        'products',
+        _products,
+        {
+            'id': _products.c.id,
+            'name': _products.c.name,
+            'description': _products.c.description,
+            'price': _products.c.price,
+            'category_id': _products.c.category_id,
+            'sku': _products.c.sku,
+            'barcode': _products.c.barcode,
+            'weight': _products.c.weight,
+            'dimensions': _products.c.dimensions,
+            'unit': _products.c.unit,
+            'status': _products.c.status,
+            'min_stock_level': func.coalesce(_products.c.min_quantity, 0),
+            'supplier_id': _products.c.supplier_id,
+            'branch_id': _products.c.branch_id,
+        },
+        ('name', 'description', 'price', 'category_id', 'sku', 'barcode', 'weight', 'dimensions', 'unit',
+         'status', 'min_quantity', 'supplier_id', 'branch_id'),
+    ),
+    'variant': (
+        'variants',
+        _variants,
+        {name: _variants.c[name] for name in ('id', 'product_id', 'name', 'sku', 'price_adjustment', 'attributes')},
+        ('product_id', 'name', 'sku', 'price_adjustment', 'attributes'),
+    ),
+}
+
+def _sqlite_ddl() -> List[str]:
+    statements = []
+    for entity, (_, table, _, columns) in TRACKED.items():
+        record = """
+            DELETE FROM catalog_changes WHERE entity = '{entity}' AND entity_id = {row}.id;
+            INSERT INTO catalog_changes(entity, entity_id, deleted) VALUES ('{entity}', {row}.id, {deleted});
+        """
+        changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in columns)
+        statements += [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table.name}_changes_ai AFTER INSERT ON {table.name} BEGIN
+                {record.format(entity=entity, row='new', deleted=0)}
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table.name}_changes_au AFTER UPDATE OF {', '.join(columns)} ON {table.name}
+            WHEN {changed} BEGIN
+                {record.format(entity=entity, row='new', deleted=0)}
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table.name}_changes_ad AFTER DELETE ON {table.name} BEGIN
+                {record.format(entity=entity, row='old', deleted=1)}
+            END
+            """,
+        ]
+    return statements
+
+def _postgresql_ddl() -> List[str]:
+    statements = [
+        """
+        CREATE OR REPLACE FUNCTION catalog_record_change() RETURNS trigger AS $$
+        DECLARE
+            row_id integer;
+        BEGIN
+            -- Hold a lock until commit so versions become visible in the order
+            -- they were taken; otherwise a client could sync past a version
+            -- whose transaction has not committed yet.
+            PERFORM pg_advisory_xact_lock(hashtext('catalog_changes'));
+            IF TG_OP = 'DELETE' THEN
+                row_id := OLD.id;
+            ELSE
+                row_id := NEW.id;
+            END IF;
+            DELETE FROM catalog_changes WHERE entity = TG_ARGV[0] AND entity_id = row_id;
+            INSERT INTO catalog_changes(entity, entity_id, deleted) VALUES (TG_ARGV[0], row_id, TG_OP = 'DELETE');
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+    ]
+    for entity, (_, table, _, columns) in TRACKED.items():
+        # json has no equality operator; compare its text
+        old = ', '.join(f'OLD.{c}::text' if c == 'attributes' else f'OLD.{c}' for c in columns)
+        new = ', '.join(f'NEW.{c}::text' if c == 'attributes' else f'NEW.{c}' for c in columns)
+        statements += [
+            f"DROP TRIGGER IF EXISTS {table.name}_changes_insert_delete ON {table.name}",
+            f"DROP TRIGGER IF EXISTS {table.name}_changes_update ON {table.name}",
+            f"""
+            CREATE TRIGGER {table.name}_changes_insert_delete AFTER INSERT OR DELETE ON {table.name}
+            FOR EACH ROW EXECUTE FUNCTION catalog_record_change('{entity}')
+            """,
+            f"""
+            CREATE TRIGGER {table.name}_changes_update AFTER UPDATE ON {table.name}
+            FOR EACH ROW WHEN (ROW({old}) IS DISTINCT FROM ROW({new}))
+            EXECUTE FUNCTION catalog_record_change('{entity}')
+            """,
+        ]
+    return statements
+
+class CatalogSyncService:
+    """
+    Incremental catalog sync for clients keeping a local mirror.
+
+    Every created, updated or deleted category, product and variant gets a
+    new catalog version (``CatalogChange``), recorded by triggers so bulk
+    Core writes such as the importer are covered too. A client stores the
+    ``version`` of its last sync and asks for the changes since it; a first
+    sync asks from version 0 and receives the whole catalog. Pages are
+    capped at ``CATALOG_SYNC_PAGE_SIZE`` rows; ``more`` says whether to ask
+    again from the returned version.
+    """
+
+    @staticmethod
+    def install(db: Session) -> int:
+        """
+        Create the change triggers if they are missing and record rows that have no entry yet. Commits.
+
+        Args:
+            db: Database session
+
+        Returns:
+            int: Number of rows recorded
+        """
+        dialect = db.get_bind().dialect.name
+        if dialect == 'postgresql':
+            statements = _postgresql_ddl()
+        elif dialect == 'sqlite':
+            statements = _sqlite_ddl()
+        else:
+            raise NotImplementedError(f"Catalog sync is not supported on {dialect}")
+        for statement in statements:
+            db.execute(text(statement))
+
+        recorded = 0
+        for entity, (_, table, _, _) in TRACKED.items():
+            known = select(_changes.c.entity_id).where(_changes.c.entity == entity)
+            recorded += db.execute(
+                _changes.insert().from_select(
+                    ['entity', 'entity_id', 'deleted'],
+                    select(literal(entity), table.c.id, false())
+                    .where(table.c.id.not_in(known))
+                    .order_by(table.c.id)
+                )
+            ).rowcount
+        db.commit()
+        return recorded
+
+    @staticmethod
+    def changes(db: Session, since: int = 0, *, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Catalog rows created, updated or deleted after a version.
+
+        Args:
+            db: Database session
+            since: Version of the client's last sync (0 for everything)
+            limit: Maximum number of changed rows (defaults to ``CATALOG_SYNC_PAGE_SIZE``)
+
+        Returns:
+            dict: ``version`` to sync from next time, ``more`` if there are
+            further changes, current rows of changed ``categories``,
+            ``products`` and ``variants``, and the IDs of ``deleted`` rows
+            per entity
+        """
+        limit = limit or settings.CATALOG_SYNC_PAGE_SIZE
+        entries = db.execute(
+            select(_changes.c.version, _changes.c.entity, _changes.c.entity_id, _changes.c.deleted)
+            .where(_changes.c.version > since)
+            .order_by(_changes.c.version)
+            .limit(limit + 1)
+        ).all()
+        more = len(entries) > limit
+        entries = entries[:limit]
+
+        changed = {entity: [] for entity in TRACKED}
+        deleted = {entity: [] for entity in TRACKED}
+        for entry in entries:
+            (deleted if entry.deleted else changed)[entry.entity].append(entry.entity_id)
+
+        result = {'version': entries[-1].version if entries else since, 'more': more, 'deleted': {}}
+        for entity, (key, table, fields, _) in TRACKED.items():
+            rows = []
+            if changed[entity]:
+                names = list(fields)
+                rows = [
+                    dict(zip(names, row)) for row in db.execute(
+                        select(*fields.values()).where(table.c.id.in_(changed[entity])).order_by(table.c.id)
+                    ).all()
+                ]
+            # A row deleted after its entry was read is missing here; its deletion has a later version
+            result[key] = rows
+            result['deleted'][key] = deleted[entity]
+        return result
+
+    @staticmethod
+    def render(db: Session, since: int = 0, *, limit: Optional[int] = None) -> bytes:
+        """``changes`` encoded as JSON bytes."""
+        return orjson.dumps(CatalogSyncService.changes(db, since, limit=limit), default=json_default)
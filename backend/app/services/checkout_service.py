@@ -0,0 +1,101 @@
+from typing import Any, Dict, Iterable, Mapping, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from ..core.exceptions import NotFoundException
+from ..models.product import Product, ProductVariant
+from ..models.sale import SaleItem
+
+class CheckoutService:
+    """
+    Set-based helpers for writing a sale.
+
+    A basket costs a fixed number of statements whatever its size: every
+    referenced product and variant is loaded with one ``IN`` query each (row
+    locked in id order, matching the stock engine), lines are priced with
+    ``PricingService``, and all sale items are written with a single executemany.
+    None of the methods commit.
+    """
+
+    @staticmethod
+    def load_products(
+        db: Session,
+        product_ids: Iterable[int],
+        variant_ids: Iterable[int] = (),
+        *,
+        lock: bool = True
+    ) -> Dict[str, Dict[int, Row]]:
+        """
+        Load the products and variants of a basket.
+
+        Args:
+            db: Database session
+            product_ids: Referenced product IDs
+            variant_ids: Referenced variant IDs
+            lock: Lock the rows (``FOR UPDATE``) for the rest of the transaction
+
+        Returns:
+            dict: ``products`` and ``variants`` rows keyed by ID
+
+        Raises:
+            NotFoundException: A product or variant does not exist
+        """
+        product_ids, variant_ids = set(product_ids), set(variant_ids)
+        products = CheckoutService._load(
+            db, Product.__table__, ('id', 'name', 'price', 'quantity', 'category_id'), product_ids, lock
+        )
+        for product_id in sorted(product_ids):
+            if product_id not in products:
+                raise NotFoundException("Product", product_id)
+
+        variants = CheckoutService._load(
+            db, ProductVariant.__table__, ('id', 'product_id', 'price_adjustment', 'stock'), variant_ids, lock
+        )
+        for variant_id in sorted(variant_ids):
+            if variant_id not in variants:
+                raise NotFoundException("ProductVariant", variant_id)
+        return {'products': products, 'variants': variants}
+
+    @staticmethod
+    def insert_items(db: Session, sale_id: int, items: Sequence[Mapping[str, Any]]) -> None:
+        """
+        Insert the priced items of a sale with one executemany.
+
+        Args:
+            db: Database session
+            sale_id: ID of the (flushed) sale
+            items: ``PricingService.item_rows`` of the priced basket
+        """
+        if not items:
+            return
+        db.execute(
+            SaleItem.__table__.insert(),
+            [
+                {
+                    'sale_id': sale_id,
+                    'product_id': item['product_id'],
+                    'variant_id': item.get('variant_id'),
+                    'quantity': item['quantity'],
+                    'price': item['price'],
+                    'discount': item.get('discount') or 0.0,
+                    'promotion_id': item.get('promotion_id'),
+                    'promotion_discount': item.get('promotion_discount') or 0.0,
+                    'tax_rate': item.get('tax_rate'),
+                    'tax_amount': item.get('tax_amount') or 0.0,
+                    'notes': item.get('notes'),
+                }
+                for item in items
+            ]
+        )
+
+    @staticmethod
+    def _load(db: Session, table, columns: Sequence[str], ids: Iterable[int], lock: bool) -> Dict[int, Row]:
+        ids = sorted(set(ids))
+        if not ids:
+            return {}
+        query = select(*[table.c[name] for name in columns]).where(table.c.id.in_(ids)).order_by(table.c.id)
+        if lock:
+            query = query.with_for_update()
+        return {row.id: row for row in db.execute(query)}
@@ -0,0 +1,279 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.inventory import Inventory
+from ..models.job import JobWatermark
+from ..models.product import Product
+from ..models.sale import Sale, SaleItem
+
+WATERMARK_NAME = 'inventory_classification'
+
+ABC_CLASSES = ('A', 'B', 'C')
+XYZ_CLASSES = ('X', 'Y', 'Z')
+
+# Maximum number of IDs per ``UPDATE ... WHERE id IN (...)`` statement.
+UPDATE_CHUNK_SIZE = 5000
+
+class ClassificationService:
+    """
+    ABC/XYZ classification of inventory per branch.
+
+    ABC ranks the products of a branch by revenue over the history window: the
+    items making up the first ``ABC_A_SHARE`` of revenue are A, those up to
+    ``ABC_B_SHARE`` are B and the rest (including items without sales) are C.
+    XYZ grades demand variability by the coefficient of variation of daily
+    units sold: X is steady, Y fluctuating and Z erratic or without demand.
+
+    Both classes are computed for every inventory row of the affected branches
+    in one NumPy pass over two grouped queries, and stored on ``Inventory`` so
+    listings can filter on them through an index.
+    """
+
+    @staticmethod
+    def classify(
+        db: Session,
+        *,
+        branch_ids: Optional[Iterable[int]] = None,
+        history_days: Optional[int] = None,
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Classify the inventory of the given branches and write changed classes.
+        Does not commit.
+
+        Args:
+            db: Database session
+            branch_ids: Branches to classify; all branches if omitted
+            history_days: Days of sales history (``CLASSIFICATION_HISTORY_DAYS``)
+            now: End of the history window (defaults to the current time)
+
+        Returns:
+            dict: Rows classified and rows whose class changed
+        """
+        history_days = history_days or settings.CLASSIFICATION_HISTORY_DAYS
+        end = now or datetime.utcnow()
+        start = end - timedelta(days=history_days)
+        if branch_ids is not None:
+            branch_ids = sorted(set(branch_ids))
+            if not branch_ids:
+                return {'classified': 0, 'changed': 0}
+
+        inventory = Inventory.__table__
+        query = select(
+            inventory.c.id,
+            inventory.c.branch_id,
+            inventory.c.product_id,
+            func.coalesce(inventory.c.abc_class, ''),
+            func.coalesce(inventory.c.xyz_class, '')
+        ).order_by(inventory.c.branch_id, inventory.c.product_id)
+        if branch_ids is not None:
+            query = query.where(inventory.c.branch_id.in_(branch_ids))
+        rows = db.execute(query).all()
+        if not rows:
+            return {'classified': 0, 'changed': 0}
+
+        keys = np.array([tuple(row[:3]) for row in rows], dtype=np.int64)
+        ids, branches, products = keys[:, 0], keys[:, 1], keys[:, 2]
+        current = np.array([row[3] + row[4] for row in rows])
+
+        # Revenue, units and sum of squared daily units per (branch, product)
+        sales = Sale.__table__
+        items = SaleItem.__table__
+        daily = (
+            select(
+                sales.c.branch_id,
+                items.c.product_id,
+                func.sum(items.c.quantity).label('quantity'),
+                func.sum(items.c.quantity * items.c.price - func.coalesce(items.c.discount, 0)).label('revenue')
+            )
+            .select_from(items.join(sales, sales.c.id == items.c.sale_id))
+            .where(
+                sales.c.created_at >= start,
+                sales.c.created_at < end,
+                sales.c.status != 'cancelled'
+            )
+            .group_by(sales.c.branch_id, items.c.product_id, func.date(sales.c.created_at))
+        )
+        if branch_ids is not None:
+            daily = daily.where(sales.c.branch_id.in_(branch_ids))
+        else:
+            daily = daily.where(sales.c.branch_id.isnot(None))
+        daily = daily.subquery()
+        demand = db.execute(
+            select(
+                daily.c.branch_id,
+                daily.c.product_id,
+                func.sum(daily.c.revenue),
+                func.sum(daily.c.quantity),
+                func.sum(daily.c.quantity * daily.c.quantity)
+            ).group_by(daily.c.branch_id, daily.c.product_id)
+        ).all()
+
+        revenue = np.zeros(len(ids))
+        units = np.zeros(len(ids))
+        squares = np.zeros(len(ids))
+        if demand:
+            stats = np.array([tuple(row) for row in demand], dtype=np.float64)
+            slots = branches * (1 << 32) + products
+            wanted = stats[:, 0].astype(np.int64) * (1 << 32) + stats[:, 1].astype(np.int64)
+            position = np.minimum(np.searchsorted(slots, wanted), len(slots) - 1)
+            known = slots[position] == wanted
+            revenue[position[known]] = stats[known, 2]
+            units[position[known]] = stats[known, 3]
+            squares[position[known]] = stats[known, 4]
+
+        abc = ClassificationService._abc(branches, revenue)
+        xyz = ClassificationService._xyz(units, squares, history_days)
+        proposed = np.char.add(abc, xyz)
+
+        changed = proposed != current
+        groups = defaultdict(list)
+        for inventory_id, label in zip(ids[changed].tolist(), proposed[changed].tolist()):
+            groups[label].append(inventory_id)
+        for label, group in groups.items():
+            for offset in range(0, len(group), UPDATE_CHUNK_SIZE):
+                db.execute(
+                    inventory.update()
+                    .where(inventory.c.id.in_(group[offset:offset + UPDATE_CHUNK_SIZE]))
+                    .values(abc_class=label[0], xyz_class=label[1])
+                )
+        return {'classified': len(ids), 'changed': int(changed.sum())}
+
+    @staticmethod
+    def refresh(db: Session, *, full: bool = False, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Reclassify the branches that changed since the previous run. Commits.
+
+        A branch is affected when it had sales or gained inventory rows since
+        the watermark; ``full`` reclassifies every branch, so classes also
+        follow sales dropping out of the history window.
+
+        Args:
+            db: Database session
+            full: Reclassify all branches
+            now: End of the history window (defaults to the database time)
+
+        Returns:
+            dict: Branches, rows classified and rows changed
+        """
+        run_at = now or db.execute(select(func.now())).scalar()
+        watermark = db.get(JobWatermark, WATERMARK_NAME)
+
+        branch_ids = None
+        if watermark and not full:
+            sales = Sale.__table__
+            inventory = Inventory.__table__
+            branch_ids = db.execute(union(
+                select(sales.c.branch_id).where(
+                    sales.c.created_at >= watermark.value, sales.c.branch_id.isnot(None)
+                ),
+                select(inventory.c.branch_id).where(inventory.c.created_at >= watermark.value)
+            )).scalars().all()
+
+        result = ClassificationService.classify(db, branch_ids=branch_ids, now=run_at)
+        if watermark:
+            watermark.value = run_at
+        else:
+            db.add(JobWatermark(name=WATERMARK_NAME, value=run_at))
+        db.commit()
+        return dict(result, branches=len(branch_ids) if branch_ids is not None else 'all')
+
+    @staticmethod
+    def summary(
+        db: Session,
+        *,
+        branch_id: Optional[int] = None,
+        abc_class: Optional[str] = None,
+        xyz_class: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Item count, units on hand and stock value per ABC/XYZ cell.
+
+        Args:
+            db: Database session
+            branch_id: Limit to one branch
+            abc_class: Limit to one ABC class
+            xyz_class: Limit to one XYZ class
+
+        Returns:
+            dict: ``classes`` with one entry per populated cell, and ``unclassified`` rows
+        """
+        inventory = Inventory.__table__
+        products = Product.__table__
+        query = (
+            select(
+                inventory.c.abc_class,
+                inventory.c.xyz_class,
+                func.count().label('items'),
+                func.coalesce(func.sum(inventory.c.quantity), 0).label('units'),
+                func.coalesce(func.sum(inventory.c.quantity * func.coalesce(products.c.cost, 0)), 0).label('value')
+            )
+            .select_from(inventory.join(products, products.c.id == inventory.c.product_id))
+            .group_by(inventory.c.abc_class, inventory.c.xyz_class)
+        )
+        if branch_id is not None:
+            query = query.where(inventory.c.branch_id == branch_id)
+        if abc_class:
+            query = query.where(inventory.c.abc_class == abc_class)
+        if xyz_class:
+            query = query.where(inventory.c.xyz_class == xyz_class)
+
+        classes, unclassified = [], 0
+        for row in db.execute(query):
+            if row.abc_class is None:
+                unclassified += row.items
+                continue
+            classes.append({
+                'abc_class': row.abc_class,
+                'xyz_class': row.xyz_class,
+                'items': row.items,
+                'units': int(row.units),
+                'value': round(float(row.value), 2),
+            })
+        classes.sort(key=lambda entry: (entry['abc_class'], entry['xyz_class']))
+        return {'branch_id': branch_id, 'classes': classes, 'unclassified': unclassified}
+
+    @staticmethod
+    def _abc(branches: np.ndarray, revenue: np.ndarray) -> np.ndarray:
+        """ABC class per row; ``branches`` must be sorted."""
+        order = np.lexsort((-revenue, branches))
+        ranked_branches = branches[order]
+        ranked_revenue = revenue[order]
+
+        starts = np.flatnonzero(np.r_[True, ranked_branches[1:] != ranked_branches[:-1]])
+        counts = np.diff(np.r_[starts, len(order)])
+        cumulative = np.cumsum(ranked_revenue)
+        offsets = np.repeat(np.r_[0.0, cumulative[starts[1:] - 1]], counts)
+        totals = np.repeat(np.add.reduceat(ranked_revenue, starts), counts)
+
+        # Share of branch revenue from items ranked strictly above this one, so
+        # the item that crosses a threshold still falls in the higher class.
+        before = np.divide(
+            cumulative - ranked_revenue - offsets, totals,
+            out=np.ones(len(order)), where=totals > 0
+        )
+        ranked = np.where(
+            ranked_revenue <= 0, 'C',
+            np.where(before < settings.ABC_A_SHARE, 'A',
+                     np.where(before < settings.ABC_B_SHARE, 'B', 'C'))
+        )
+        classes = np.empty(len(order), dtype='<U1')
+        classes[order] = ranked
+        return classes
+
+    @staticmethod
+    def _xyz(units: np.ndarray, squares: np.ndarray, history_days: int) -> np.ndarray:
+        """XYZ class per row from daily demand sums over ``history_days``."""
+        mean = units / history_days
+        variance = np.maximum(squares / history_days - mean ** 2, 0.0) * history_days / max(history_days - 1, 1)
+        cv = np.divide(np.sqrt(variance), mean, out=np.full(len(units), np.inf), where=mean > 0)
+        return np.where(
+            cv <= settings.XYZ_X_MAX_CV, 'X',
+            np.where(cv <= settings.XYZ_Y_MAX_CV, 'Y', 'Z')
+        ).astype('<U1')
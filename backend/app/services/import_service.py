@@ -0,0 +1,373 @@
+from collections import namedtuple
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+import pandas as pd
+from sqlalchemy import bindparam, func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.scan_index import ScanIndex
+from ..models.inventory import Inventory
+from ..models.product import Product, ProductStatus
+from .stock_ledger_service import StockLedgerService
+from .stock_service import StockService
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+# kind, required, minimum value / maximum length, default for blank cells
+ImportColumn = namedtuple('ImportColumn', ['kind', 'required', 'limit', 'default'])
+
+PRODUCT_COLUMNS = {
+    'sku': ImportColumn('str', True, 50, None),
+    'name': ImportColumn('str', True, 255, None),
+    'price': ImportColumn('float', True, 0, None),
+    'cost': ImportColumn('float', True, 0, None),
+    'description': ImportColumn('str', False, None, None),
+    'status': ImportColumn('status', False, None, ProductStatus.ACTIVE),
+    'quantity': ImportColumn('int', False, 0, 0),
+    'min_quantity': ImportColumn('int', False, 0, 0),
+    'max_quantity': ImportColumn('int', False, 0, 0),
+    'unit': ImportColumn('str', False, 20, None),
+    'barcode': ImportColumn('str', False, 50, None),
+    'weight': ImportColumn('float', False, 0, None),
+    'dimensions': ImportColumn('str', False, 50, None),
+    'category_id': ImportColumn('int', False, 1, None),
+    'supplier_id': ImportColumn('int', False, 1, None),
+    'branch_id': ImportColumn('int', False, 1, None),
+}
+
+INVENTORY_COLUMNS = {
+    'branch_id': ImportColumn('int', True, 1, None),
+    'product_id': ImportColumn('int', True, 1, None),
+    'quantity': ImportColumn('int', True, 0, None),
+    'minimum_stock': ImportColumn('int', False, 0, 10),
+    'maximum_stock': ImportColumn('int', False, 0, 100),
+    'reorder_point': ImportColumn('int', False, 0, 20),
+    'reorder_quantity': ImportColumn('int', False, 0, 50),
+    'location': ImportColumn('str', False, 100, None),
+    'batch_number': ImportColumn('str', False, 100, None),
+    'expiry_date': ImportColumn('date', False, None, None),
+}
+
+_STATUSES = {status.value: status for status in ProductStatus}
+
+class ImportService:
+    """
+    Streaming bulk import of products and inventory from CSV or XLSX files.
+
+    Files are read in chunks, each chunk is validated column-wise with pandas and
+    upserted with a single statement (multi-row ``INSERT ... ON CONFLICT`` on
+    PostgreSQL, an executemany of the same statement on SQLite). Invalid rows are
+    reported and skipped; they never abort the rest of the file. A blank cell
+    in a column with a default gets the default on new rows and leaves the
+    value of existing rows unchanged.
+    """
+
+    @staticmethod
+    def import_products(
+        db: Session,
+        fileobj: BinaryIO,
+        filename: str,
+        *,
+        business_id: int,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Create or update products keyed by SKU.
+
+        Args:
+            db: Database session
+            fileobj: Binary file object positioned at the start of the upload
+            filename: Original file name, used to detect CSV or XLSX
+            business_id: Business the products belong to
+            chunk_size: Rows validated and written per statement
+
+        Returns:
+            dict: Import report with row counts and per-row errors
+        """
+        return ImportService._run(
+            db, fileobj, filename, chunk_size,
+            table=Product.__table__, columns=PRODUCT_COLUMNS,
+            conflict_columns=['sku'], constants={'business_id': business_id}
+        )
+
+    @staticmethod
+    def import_inventory(
+        db: Session,
+        fileobj: BinaryIO,
+        filename: str,
+        *,
+        branch_id: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Create or update inventory levels keyed by (branch, product).
+
+        Rows may reference products by ``product_id`` or by ``sku``.
+
+        Args:
+            db: Database session
+            fileobj: Binary file object positioned at the start of the upload
+            filename: Original file name, used to detect CSV or XLSX
+            branch_id: Branch for every row; overrides a ``branch_id`` column
+            chunk_size: Rows validated and written per statement
+
+        Returns:
+            dict: Import report with row counts and per-row errors
+        """
+        def prepare(chunk: pd.DataFrame, report: Dict[str, Any]) -> pd.DataFrame:
+            if branch_id is not None:
+                chunk['branch_id'] = str(branch_id)
+            if 'product_id' not in chunk.columns and 'sku' in chunk.columns:
+                skus = chunk['sku'].str.strip()
+                known = dict(db.execute(
+                    select(Product.__table__.c.sku, Product.__table__.c.id)
+                    .where(Product.__table__.c.sku.in_(skus[skus != ''].unique().tolist()))
+                ).all())
+                ids = skus.map(known)
+                unknown = ids.isna() & (skus != '')
+                chunk['product_id'] = ids.map('{:.0f}'.format, na_action='ignore').fillna('')
+                ImportService._add_errors(report, chunk.index[unknown], 'sku', 'unknown SKU')
+                report['failed'] += int(unknown.sum())
+                chunk = chunk[~unknown]
+            return chunk
+
+        return ImportService._run(
+            db, fileobj, filename, chunk_size,
+            table=Inventory.__table__, columns=INVENTORY_COLUMNS,
+            conflict_columns=['branch_id', 'product_id'], prepare=prepare,
+            after_write=ImportService._sync_inventory_totals
+        )
+
+    @staticmethod
+    def _sync_inventory_totals(db: Session, rows: List[Dict[str, Any]]) -> None:
+        """Post imported quantities to the stock ledger and product totals."""
+        keys = [(row['branch_id'], row['product_id']) for row in rows]
+        StockLedgerService.true_up(db, keys, entry_type='import')
+        StockService.refresh_total_stock(db, [product_id for _, product_id in keys])
+
+    @staticmethod
+    def _run(db: Session, fileobj, filename, chunk_size, *, table, columns, conflict_columns,
+             prepare=None, constants=None, after_write=None):
+        report = {'rows': 0, 'imported': 0, 'duplicates': 0, 'failed': 0, 'errors': []}
+        defaults = {name: spec.default for name, spec in columns.items() if spec.default is not None}
+        for chunk in ImportService._read_chunks(fileobj, filename, chunk_size):
+            report['rows'] += len(chunk)
+            if prepare:
+                chunk = prepare(chunk, report)
+            missing = [name for name, spec in columns.items() if spec.required and name not in chunk.columns]
+            if missing:
+                report['errors'].append({'row': None, 'column': ', '.join(missing), 'error': 'missing required column'})
+                report['failed'] = report['rows']
+                return report
+
+            records = ImportService._validate(chunk, columns, conflict_columns, report)
+            for record in records:
+                record.update(constants or {})
+            if records:
+                report['imported'] += ImportService._write(
+                    db, table, records, conflict_columns, report, after_write, defaults
+                )
+        return report
+
+    @staticmethod
+    def _read_chunks(fileobj: BinaryIO, filename: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Yield string-typed DataFrames indexed by spreadsheet row number."""
+        start = 2  # row 1 is the header
+        if filename.lower().endswith(('.xlsx', '.xlsm')):
+            from openpyxl import load_workbook
+
+            sheet = load_workbook(fileobj, read_only=True, data_only=True).active
+            rows = sheet.iter_rows(values_only=True)
+            header = [str(name or '') for name in next(rows, ())]
+            batch = []
+            for row in rows:
+                batch.append(['' if value is None else str(value) for value in row])
+                if len(batch) == chunk_size:
+                    yield ImportService._frame(batch, header, start)
+                    start += len(batch)
+                    batch = []
+            if batch:
+                yield ImportService._frame(batch, header, start)
+            return
+
+        for chunk in pd.read_csv(fileobj, chunksize=chunk_size, dtype=str, keep_default_na=False):
+            chunk.columns = [str(name).strip().lower() for name in chunk.columns]
+            chunk.index = range(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+
+    @staticmethod
+    def _frame(rows: List[list], header: List[str], start: int) -> pd.DataFrame:
+        frame = pd.DataFrame(rows, columns=[name.strip().lower() for name in header], dtype=str)
+        frame.index = range(start, start + len(frame))
+        return frame
+
+    @staticmethod
+    def _validate(chunk: pd.DataFrame, columns, conflict_columns, report) -> List[Dict[str, Any]]:
+        """Validate a chunk column by column and return the clean rows as records."""
+        bad = pd.Series(False, index=chunk.index)
+        clean = {}
+        for name, spec in columns.items():
+            if name not in chunk.columns:
+                continue
+            raw = chunk[name].fillna('').astype(str).str.strip()
+            blank = raw == ''
+            if spec.required:
+                ImportService._add_errors(report, chunk.index[blank], name, 'is required')
+                bad |= blank
+
+            if spec.kind == 'str':
+                values = raw.where(~blank, None)
+                if spec.limit:
+                    too_long = raw.str.len() > spec.limit
+                    ImportService._add_errors(report, chunk.index[too_long], name, f'longer than {spec.limit} characters')
+                    bad |= too_long
+            elif spec.kind in ('int', 'float'):
+                values = pd.to_numeric(raw.where(~blank), errors='coerce')
+                invalid = values.isna() & ~blank
+                if spec.kind == 'int':
+                    invalid |= values.notna() & (values % 1 != 0)
+                if spec.limit is not None:
+                    invalid |= values < spec.limit
+                message = f"must be a {'whole ' if spec.kind == 'int' else ''}number"
+                if spec.limit is not None:
+                    message += f' >= {spec.limit}'
+                ImportService._add_errors(report, chunk.index[invalid], name, message)
+                bad |= invalid
+                if spec.kind == 'int':
+                    values = values.where(~invalid).astype('Int64')
+            elif spec.kind == 'date':
+                values = pd.to_datetime(raw.where(~blank), errors='coerce')
+                invalid = values.isna() & ~blank
+                ImportService._add_errors(report, chunk.index[invalid], name, 'is not a valid date')
+                bad |= invalid
+            elif spec.kind == 'status':
+                values = raw.str.lower().map(_STATUSES)
+                invalid = values.isna() & ~blank
+                ImportService._add_errors(
+                    report, chunk.index[invalid], name, f"must be one of {', '.join(_STATUSES)}"
+                )
+                bad |= invalid
+            clean[name] = values
+
+        report['failed'] += int(bad.sum())
+        frame = pd.DataFrame(clean, index=chunk.index)[~bad]
+        # Within one statement a key may only appear once; the last row wins.
+        duplicated = frame.duplicated(subset=conflict_columns, keep='last')
+        report['duplicates'] += int(duplicated.sum())
+        frame = frame[~duplicated]
+        frame = frame.astype(object).where(frame.notna(), None)
+        records = frame.to_dict('records')
+        for row, record in zip(frame.index, records):
+            record['_row'] = row
+        return records
+
+    @staticmethod
+    def _write(db: Session, table, records, conflict_columns, report, after_write=None, defaults=None) -> int:
+        """
+        Upsert one chunk; on failure retry row by row to isolate bad rows.
+
+        ``after_write(db, rows)`` runs in the same transaction as each upsert.
+        """
+        rows = [{k: v for k, v in record.items() if k != '_row'} for record in records]
+        try:
+            ImportService._upsert(db, table, rows, conflict_columns, defaults)
+            if after_write:
+                after_write(db, rows)
+            db.commit()
+            return len(rows)
+        except (IntegrityError, DBAPIError):
+            db.rollback()
+
+        written = 0
+        for record, row in zip(records, rows):
+            try:
+                ImportService._upsert(db, table, [row], conflict_columns, defaults)
+                if after_write:
+                    after_write(db, [row])
+                db.commit()
+                written += 1
+            except (IntegrityError, DBAPIError) as e:
+                db.rollback()
+                report['failed'] += 1
+                ImportService._add_errors(report, [record['_row']], None, str(e.orig).splitlines()[0])
+        return written
+
+    @staticmethod
+    def _upsert(
+        db: Session,
+        table,
+        rows: List[Dict[str, Any]],
+        conflict_columns: List[str],
+        defaults: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Insert or update rows by their conflict columns. ``None`` in a
+        ``defaults`` column means a blank cell: new rows get the default,
+        existing rows keep their value.
+        """
+        update_columns = [name for name in rows[0] if name not in conflict_columns]
+        defaults = {name: value for name, value in (defaults or {}).items() if name in rows[0]}
+        if table is Product.__table__:
+            ScanIndex.mark_changed(db, skus=[row['sku'] for row in rows])
+        dialect = db.get_bind().dialect.name
+        key_cols = [table.c[name] for name in conflict_columns]
+        keys = [tuple(row[name] for name in conflict_columns) for row in rows]
+        existing = None
+        if dialect not in ('postgresql', 'sqlite') or any(
+            row[name] is None for row in rows for name in defaults
+        ):
+            existing = {
+                tuple(found[:-1]): found[-1]
+                for found in db.execute(
+                    select(*key_cols, table.c.id).where(tuple_(*key_cols).in_(keys))
+                ).all()
+            }
+            rows = [
+                row if key in existing else dict(row, **{
+                    name: value for name, value in defaults.items() if row[name] is None
+                })
+                for key, row in zip(keys, rows)
+            ]
+
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = insert(table)
+            set_ = {
+                name: func.coalesce(stmt.excluded[name], table.c[name]) if name in defaults else stmt.excluded[name]
+                for name in update_columns
+            }
+            if 'updated_at' in table.c:
+                set_['updated_at'] = func.now()
+            # SQLAlchemy renders this as multi-row VALUES on PostgreSQL and as an
+            # executemany on SQLite.
+            db.execute(stmt.on_conflict_do_update(index_elements=conflict_columns, set_=set_), rows)
+            return
+
+        # Other backends: split into existing and new rows with the lookup above.
+        updates = [dict(row, _id=existing[key]) for key, row in zip(keys, rows) if key in existing]
+        inserts = [row for key, row in zip(keys, rows) if key not in existing]
+        if updates:
+            db.execute(
+                table.update().where(table.c.id == bindparam('_id')).values({
+                    name: func.coalesce(bindparam(f'_new_{name}'), table.c[name]) for name in defaults
+                }),
+                [
+                    {f'_new_{k}' if k in defaults else k: v for k, v in row.items() if k not in conflict_columns}
+                    for row in updates
+                ]
+            )
+        if inserts:
+            db.execute(table.insert(), inserts)
+
+    @staticmethod
+    def _add_errors(report: Dict[str, Any], rows, column: Optional[str], message: str) -> None:
+        errors = report['errors']
+        for row in rows:
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                report['errors_truncated'] = True
+                return
+            errors.append({'row': int(row), 'column': column, 'error': message})
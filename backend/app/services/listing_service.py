@@ -0,0 +1,160 @@
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import orjson
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from ..models.product import Product, ProductImage, ProductVariant
+
+_products = Product.__table__
+_images = ProductImage.__table__
+_variants = ProductVariant.__table__
+
+# Listing fields (as in ProductResponse) and the columns they are read from
+PRODUCT_FIELDS = {
+    'id': _products.c.id,
+    'name': _products.c.name,
+    'description': _products.c.description,
+    'price': _products.c.price,
+    'stock': _products.c.total_stock,
+    'category_id': _products.c.category_id,
+    'sku': _products.c.sku,
+    'barcode': _products.c.barcode,
+    'weight': _products.c.weight,
+    'dimensions': _products.c.dimensions,
+    'min_stock_level': func.coalesce(_products.c.min_quantity, 0),
+    'supplier_id': _products.c.supplier_id,
+    'created_at': _products.c.created_at,
+}
+IMAGE_FIELDS = {name: _images.c[name] for name in ('id', 'product_id', 'filename', 'url', 'is_primary', 'created_at')}
+VARIANT_FIELDS = {
+    name: _variants.c[name] for name in ('id', 'product_id', 'name', 'sku', 'price_adjustment', 'stock', 'attributes')
+}
+
+class ListingFields(NamedTuple):
+    """Fields requested from a listing; ``images``/``variants`` are None when not requested."""
+    product: Tuple[str, ...]
+    images: Optional[Tuple[str, ...]]
+    variants: Optional[Tuple[str, ...]]
+
+class ProductListingService:
+    """
+    Product listings serialized straight to JSON bytes.
+
+    A page is read with three statements whatever its size: the products,
+    then their images and their variants each with one ``IN`` query on the
+    page's product IDs (what ``selectinload`` emits), all over plain column
+    tuples. Rows are turned into dicts and encoded once with orjson, with no
+    ORM instances or response-model validation in between.
+
+    ``fields`` selects a sparse subset: ``id,name,price,images.url``.
+    A bare ``images`` or ``variants`` includes all of their fields; images
+    and variants that are not requested are not queried.
+    """
+
+    @staticmethod
+    def parse_fields(fields: Optional[str]) -> ListingFields:
+        """
+        Parse a comma-separated field list.
+
+        Args:
+            fields: Field names, child fields as ``images.url``; None for all fields
+
+        Returns:
+            ListingFields: The requested fields in listing order
+
+        Raises:
+            ValueError: If a field is unknown
+        """
+        if fields is None or not fields.strip():
+            return ListingFields(tuple(PRODUCT_FIELDS), tuple(IMAGE_FIELDS), tuple(VARIANT_FIELDS))
+        requested = {'product': set(), 'images': None, 'variants': None}
+        children = {'images': IMAGE_FIELDS, 'variants': VARIANT_FIELDS}
+        for name in (part.strip() for part in fields.split(',')):
+            if not name:
+                continue
+            parent, _, child = name.partition('.')
+            if parent in children:
+                if child and child not in children[parent]:
+                    raise ValueError(f"Unknown field: {name}")
+                selected = requested[parent] if requested[parent] is not None else set()
+                selected.update([child] if child else children[parent])
+                requested[parent] = selected
+            elif name in PRODUCT_FIELDS:
+                requested['product'].add(name)
+            else:
+                raise ValueError(f"Unknown field: {name}")
+        return ListingFields(
+            tuple(name for name in PRODUCT_FIELDS if name in requested['product']),
+            *(
+                tuple(name for name in available if name in requested[key]) if requested[key] is not None else None
+                for key, available in children.items()
+            )
+        )
+
+    @staticmethod
+    def render(db: Session, query: Select, fields: Optional[ListingFields] = None) -> bytes:
+        """
+        Run a product listing query and encode the page as a JSON array.
+
+        Args:
+            db: Database session
+            query: Filtered, ordered and paged ``select(Product)``; its columns are replaced
+            fields: Fields to include (all if None)
+
+        Returns:
+            bytes: JSON array with one object per product
+        """
+        return orjson.dumps(ProductListingService.rows(db, query, fields), default=json_default)
+
+    @staticmethod
+    def rows(db: Session, query: Select, fields: Optional[ListingFields] = None) -> List[dict]:
+        """
+        Run a product listing query into plain dicts.
+
+        Args:
+            db: Database session
+            query: Filtered, ordered and paged ``select(Product)``; its columns are replaced
+            fields: Fields to include (all if None)
+
+        Returns:
+            list: One dict per product, with ``images`` and ``variants`` lists when requested
+        """
+        fields = fields or ProductListingService.parse_fields(None)
+        columns = [PRODUCT_FIELDS[name] for name in fields.product]
+        page = db.execute(query.with_only_columns(_products.c.id, *columns)).all()
+        ids = [row[0] for row in page]
+        items = [dict(zip(fields.product, row[1:])) for row in page]
+
+        for key, table, available in (('images', _images, IMAGE_FIELDS), ('variants', _variants, VARIANT_FIELDS)):
+            names = getattr(fields, key)
+            if names is None:
+                continue
+            children = ProductListingService._children(db, table, available, names, ids)
+            for product_id, item in zip(ids, items):
+                item[key] = children.get(product_id, [])
+        return items
+
+    @staticmethod
+    def _children(db: Session, table, available, names: Tuple[str, ...], ids: List[int]) -> Dict[int, List[dict]]:
+        """Rows of ``table`` for the given products, grouped by product ID."""
+        grouped = defaultdict(list)
+        if not ids:
+            return grouped
+        query = (
+            select(table.c.product_id, *[available[name] for name in names])
+            .where(table.c.product_id.in_(ids))
+            .order_by(table.c.product_id, table.c.id)
+        )
+        for row in db.execute(query).all():
+            grouped[row[0]].append(dict(zip(names, row[1:])))
+        return grouped
+
+def json_default(value):
+    """Encode what orjson does not: Decimal as float."""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
@@ -0,0 +1,555 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from redis import Redis
+from redis.backoff import NoBackoff
+from redis.exceptions import RedisError
+from redis.retry import Retry
+from sqlalchemy import bindparam, event, inspect, or_, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.exceptions import ValidationException
+from ..core.logging import logger
+from ..models.pricing import Promotion, TaxRate
+from ..models.sale import Sale, SaleItem
+from ..utils.money import PPM, apply_rate, from_cents, ppm_percent, rate_ppm, to_cents
+from .checkout_service import CheckoutService
+
+# Redis counters bumped whenever the rules of a branch (or of all branches) change
+RULES_VERSION_KEY = 'pricing_rules:version:{}'
+ALL_BRANCHES = 'all'
+
+# Session.info key collecting the branches whose rules a transaction changed
+_CHANGED_BRANCHES = 'pricing_rules_changed'
+
+# branch_id -> (rule versions, loaded at, PricingRules)
+_rules_cache: Dict[Optional[int], Tuple[Any, float, 'PricingRules']] = {}
+
+# Client for the version counters, and when to try it again after it failed
+_redis: Optional[Redis] = None
+_redis_retry_at = 0.0
+
+def _with_redis(call):
+    """
+    ``call(client)``, or None if Redis fails or failed less than
+    ``PRICING_REDIS_RETRY`` seconds ago, so an outage costs a basket at most
+    ``PRICING_REDIS_TIMEOUT`` seconds once per window.
+    """
+    global _redis, _redis_retry_at
+    if time.monotonic() < _redis_retry_at:
+        return None
+    if _redis is None:
+        _redis = Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            socket_timeout=settings.PRICING_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.PRICING_REDIS_TIMEOUT,
+            retry=Retry(NoBackoff(), 0)
+        )
+    try:
+        result = call(_redis)
+    except (RedisError, OSError) as e:
+        if not _redis_retry_at:  # Once per outage
+            logger.warning("Pricing cannot reach Redis (%s); cached rules refresh within the cache TTL", e)
+        _redis_retry_at = time.monotonic() + settings.PRICING_REDIS_RETRY
+        return None
+    if _redis_retry_at:
+        logger.info("Pricing reached Redis again")
+        _redis_retry_at = 0.0
+    return result
+
+def _target(row: Row) -> tuple:
+    if row.product_id is not None:
+        return ('product', row.product_id)
+    if row.category_id is not None:
+        return ('category', row.category_id)
+    return ('default', None)
+
+class PricingRules:
+    """Active tax rates and promotions of one branch, keyed by target."""
+
+    def __init__(self, taxes: Dict[tuple, int], promotions: Dict[tuple, List[tuple]]):
+        self.taxes = taxes  # target -> rate in ppm
+        self.promotions = promotions  # target -> [(id, type, ppm or cents, min_quantity, starts_at, ends_at)]
+
+    def _targets(self, product_id: int, category_id: Optional[int]) -> List[tuple]:
+        targets = [('product', product_id)]
+        if category_id is not None:
+            targets.append(('category', category_id))
+        targets.append(('default', None))
+        return targets
+
+    def tax_ppm(self, product_id: int, category_id: Optional[int]) -> Optional[int]:
+        """Rate of the most specific tax rule for a product, or None if none applies."""
+        for target in self._targets(product_id, category_id):
+            if target in self.taxes:
+                return self.taxes[target]
+        return None
+
+    def promotions_for(self, product_id: int, category_id: Optional[int], quantity: int, at: datetime) -> List[tuple]:
+        """Promotions a line of ``quantity`` units qualifies for at ``at``."""
+        return [
+            promotion
+            for target in self._targets(product_id, category_id)
+            for promotion in self.promotions.get(target, ())
+            if quantity >= promotion[3]
+            and (promotion[4] is None or promotion[4] <= at)
+            and (promotion[5] is None or at < promotion[5])
+        ]
+
+class PricingService:
+    """
+    Basket pricing with exact integer-cents arithmetic.
+
+    All lines of one or many baskets are priced together on NumPy int64
+    arrays of cents; rates are integer parts per million (see
+    ``app.utils.money``), so every rounding is an explicit half-up step and
+    line amounts always add up to the basket totals.
+
+    Per line: gross = unit price x quantity, less the best promotion the
+    line qualifies for, less the manual line discount, gives the line
+    subtotal. The sale-level discount is then spread over the lines pro rata
+    (largest remainder, so the shares add up to the cent) and each line is
+    taxed on what is left at its rate: explicit, else the most specific tax
+    rule (product, category, default), else the basket's default rate.
+
+    Tax and promotion rules are cached per branch in process and checked
+    against a version counter in Redis on use, so a change made by any
+    worker is seen by all of them on their next basket. Committed ORM
+    changes to ``TaxRate`` and ``Promotion`` bump the counter automatically;
+    call ``invalidate`` after bulk statements that bypass the ORM. While
+    Redis is unreachable, cached rules are used as they are and expire after
+    ``PRICING_RULES_CACHE_TTL`` seconds.
+    """
+
+    @staticmethod
+    def rules(db: Session, branch_id: Optional[int]) -> PricingRules:
+        """
+        Active pricing rules of a branch, from the cache when still current.
+
+        Args:
+            db: Database session
+            branch_id: Branch ID; None for the rules that apply to all branches
+
+        Returns:
+            PricingRules: Tax rates and promotions of the branch
+        """
+        versions = PricingService._versions(branch_id)
+        now = time.monotonic()
+        cached = _rules_cache.get(branch_id)
+        if (cached and (versions is None or cached[0] == versions)
+                and now - cached[1] < settings.PRICING_RULES_CACHE_TTL):
+            return cached[2]
+        rules = PricingService._load_rules(db, branch_id)
+        _rules_cache[branch_id] = (versions, now, rules)
+        return rules
+
+    @staticmethod
+    def invalidate(branch_ids: Iterable[Optional[int]] = (None,)) -> None:
+        """
+        Drop the cached rules of some branches in every worker.
+
+        Args:
+            branch_ids: Branches whose rules changed; None stands for rules
+                that apply to all branches
+        """
+        keys = set()
+        for branch_id in branch_ids:
+            if branch_id is None:
+                _rules_cache.clear()
+            else:
+                _rules_cache.pop(branch_id, None)
+            keys.add(RULES_VERSION_KEY.format(ALL_BRANCHES if branch_id is None else branch_id))
+
+        def bump(client):
+            pipe = client.pipeline(transaction=False)
+            for key in sorted(keys):
+                pipe.incr(key)
+            return pipe.execute()
+
+        _with_redis(bump)
+
+    @staticmethod
+    def price_baskets(
+        db: Session,
+        baskets: Sequence[Mapping[str, Any]],
+        *,
+        loaded: Optional[Mapping[str, Mapping[int, Row]]] = None,
+        at: Optional[datetime] = None
+    ) -> List[dict]:
+        """
+        Price any number of baskets in one pass.
+
+        Args:
+            db: Database session
+            baskets: Dicts with ``items`` and optional ``branch_id``,
+                ``discount`` (percent off the subtotal), ``discount_amount``
+                and ``tax`` (default tax rate, percent). Each item has
+                ``product_id``, ``quantity`` and optional ``variant_id``,
+                ``unit_price`` (defaults to the current price), ``discount``
+                (percent off the line), ``discount_amount``, ``tax_rate``
+                (overrides the tax rules) and ``notes``
+            loaded: Result of ``CheckoutService.load_products`` for the
+                baskets, if the caller has already loaded (or locked) them
+            at: Time the promotions are evaluated at; defaults to now (UTC)
+
+        Returns:
+            list: Per basket, ``items`` (one dict per line with Decimal
+            ``unit_price``, ``gross``, ``promotion_discount``, ``discount``,
+            ``subtotal``, ``sale_discount``, ``tax_rate``, ``tax`` and
+            ``total``) and Decimal ``subtotal``, ``discount``, ``tax`` and ``total``
+
+        Raises:
+            NotFoundException: A product or variant does not exist
+            ValidationException: A line or basket is invalid
+        """
+        at = at or datetime.utcnow()
+        lines = [(index, item) for index, basket in enumerate(baskets) for item in basket['items']]
+        if loaded is None:
+            loaded = CheckoutService.load_products(
+                db,
+                [item['product_id'] for _, item in lines],
+                [item['variant_id'] for _, item in lines if item.get('variant_id') is not None],
+                lock=False
+            )
+
+        count = len(lines)
+        basket_of = np.fromiter((index for index, _ in lines), np.int64, count)
+        quantity = np.zeros(count, np.int64)
+        unit = np.zeros(count, np.int64)
+        line_ppm = np.zeros(count, np.int64)
+        line_amount = np.zeros(count, np.int64)
+        tax_ppm = np.zeros(count, np.int64)
+        promo_ppm = np.zeros(count, np.int64)
+        promo_unit = np.zeros(count, np.int64)
+        promo_ppm_id = [None] * count
+        promo_unit_id = [None] * count
+
+        rules = {}
+        for i, (index, item) in enumerate(lines):
+            basket = baskets[index]
+            branch_id = basket.get('branch_id')
+            if branch_id not in rules:
+                rules[branch_id] = PricingService.rules(db, branch_id)
+            product = loaded['products'][item['product_id']]
+            variant_id = item.get('variant_id')
+            if item['quantity'] <= 0:
+                raise ValidationException(f"Basket {index}: quantity of product {product.id} must be positive")
+            quantity[i] = item['quantity']
+
+            variant = loaded['variants'][variant_id] if variant_id is not None else None
+            if variant is not None and variant.product_id != product.id:
+                raise ValidationException(
+                    f"Basket {index}: variant {variant_id} is not a variant of product {product.id}"
+                )
+            if item.get('unit_price') is not None:
+                unit[i] = to_cents(item['unit_price'])
+            else:
+                unit[i] = to_cents(product.price or 0)
+                if variant is not None:
+                    unit[i] += to_cents(variant.price_adjustment or 0)
+
+            line_ppm[i] = PricingService._percent(item.get('discount'), f"Basket {index}: line discount")
+            line_amount[i] = to_cents(item.get('discount_amount') or 0)
+
+            category_id = getattr(product, 'category_id', None)
+            if item.get('tax_rate') is not None:
+                tax_ppm[i] = rate_ppm(item['tax_rate'])
+            else:
+                rate = rules[branch_id].tax_ppm(product.id, category_id)
+                tax_ppm[i] = rate if rate is not None else rate_ppm(basket.get('tax') or 0)
+
+            for promotion_id, kind, value, *_ in rules[branch_id].promotions_for(
+                product.id, category_id, item['quantity'], at
+            ):
+                if kind == Promotion.PERCENT and value > promo_ppm[i]:
+                    promo_ppm[i], promo_ppm_id[i] = value, promotion_id
+                elif kind == Promotion.AMOUNT and value > promo_unit[i]:
+                    promo_unit[i], promo_unit_id[i] = value, promotion_id
+
+        if (unit < 0).any() or (line_amount < 0).any() or (tax_ppm < 0).any():
+            raise ValidationException("Prices, discounts and tax rates cannot be negative")
+
+        # Line amounts
+        gross = unit * quantity
+        by_percent = apply_rate(gross, promo_ppm)
+        by_amount = np.minimum(promo_unit * quantity, gross)
+        promotion = np.maximum(by_percent, by_amount)
+        use_percent = by_percent >= by_amount
+        remaining = gross - promotion
+        manual = np.minimum(apply_rate(remaining, line_ppm) + line_amount, remaining)
+        net = remaining - manual
+
+        # Sale-level discounts, capped at the basket subtotal
+        basket_count = len(baskets)
+        basket_net = np.zeros(basket_count, np.int64)
+        np.add.at(basket_net, basket_of, net)
+        sale_ppm = np.fromiter(
+            (PricingService._percent(basket.get('discount'), f"Basket {index}: discount")
+             for index, basket in enumerate(baskets)),
+            np.int64, basket_count
+        )
+        sale_amount = np.fromiter(
+            (to_cents(basket.get('discount_amount') or 0) for basket in baskets), np.int64, basket_count
+        )
+        if (sale_amount < 0).any():
+            raise ValidationException("Discounts cannot be negative")
+        sale_discount = np.minimum(apply_rate(basket_net, sale_ppm) + sale_amount, basket_net)
+
+        share = PricingService._allocate(sale_discount, basket_net, basket_of, net)
+        tax = apply_rate(net - share, tax_ppm)
+        basket_tax = np.zeros(basket_count, np.int64)
+        np.add.at(basket_tax, basket_of, tax)
+
+        results = [
+            {
+                'branch_id': basket.get('branch_id'),
+                'items': [],
+                'subtotal': from_cents(basket_net[index]),
+                'discount': from_cents(sale_discount[index]),
+                'tax': from_cents(basket_tax[index]),
+                'total': from_cents(basket_net[index] - sale_discount[index] + basket_tax[index]),
+            }
+            for index, basket in enumerate(baskets)
+        ]
+        for i, (index, item) in enumerate(lines):
+            promotion_id = None
+            if promotion[i]:
+                promotion_id = promo_ppm_id[i] if use_percent[i] else promo_unit_id[i]
+            results[index]['items'].append({
+                'product_id': item['product_id'],
+                'variant_id': item.get('variant_id'),
+                'quantity': int(quantity[i]),
+                'unit_price': from_cents(unit[i]),
+                'gross': from_cents(gross[i]),
+                'promotion_id': promotion_id,
+                'promotion_discount': from_cents(promotion[i]),
+                'discount': from_cents(promotion[i] + manual[i]),
+                'subtotal': from_cents(net[i]),
+                'sale_discount': from_cents(share[i]),
+                'tax_rate': ppm_percent(tax_ppm[i]),
+                'tax': from_cents(tax[i]),
+                'total': from_cents(net[i] - share[i] + tax[i]),
+                'notes': item.get('notes'),
+            })
+        return results
+
+    @staticmethod
+    def price_basket(db: Session, basket: Mapping[str, Any], **kwargs) -> dict:
+        """Price a single basket; see ``price_baskets``."""
+        return PricingService.price_baskets(db, [basket], **kwargs)[0]
+
+    @staticmethod
+    def item_rows(priced: Mapping[str, Any]) -> List[dict]:
+        """``SaleItem`` column values for the lines of a priced basket."""
+        return [
+            {
+                'product_id': line['product_id'],
+                'variant_id': line['variant_id'],
+                'quantity': line['quantity'],
+                'price': float(line['unit_price']),
+                'discount': float(line['discount']),
+                'promotion_id': line['promotion_id'],
+                'promotion_discount': float(line['promotion_discount']),
+                'tax_rate': line['tax_rate'],
+                'tax_amount': float(line['tax']),
+                'notes': line.get('notes'),
+            }
+            for line in priced['items']
+        ]
+
+    @staticmethod
+    def sale_totals(priced: Mapping[str, Any]) -> Dict[str, float]:
+        """``Sale`` total columns for a priced basket."""
+        return {
+            'subtotal': float(priced['subtotal']),
+            'discount_amount': float(priced['discount']),
+            'tax_amount': float(priced['tax']),
+            'total_amount': float(priced['total']),
+        }
+
+    @staticmethod
+    def reprice_sales(
+        db: Session,
+        *,
+        branch_id: Optional[int] = None,
+        sale_ids: Optional[Sequence[int]] = None,
+        status: str = 'pending',
+        chunk_size: int = 1000
+    ) -> Dict[str, int]:
+        """
+        Reprice stored sales from the current prices and rules. Commits.
+
+        Lines keep their quantities and manual discounts; unit prices,
+        promotions and taxes are recomputed. The sale-level discount is kept
+        as the amount stored on the sale. Sales are repriced ``chunk_size``
+        at a time, with one executemany per table and chunk.
+
+        Args:
+            db: Database session
+            branch_id: Only sales of this branch
+            sale_ids: Only these sales
+            status: Only sales in this status (``pending`` by default, as
+                completed sales are paid for)
+            chunk_size: Sales per transaction
+
+        Returns:
+            dict: ``sales`` and ``items`` repriced, and ``changed``, the
+            number of sales whose total moved
+        """
+        sales, items = Sale.__table__, SaleItem.__table__
+        query = select(sales.c.id, sales.c.branch_id, sales.c.discount_amount, sales.c.total_amount) \
+            .where(sales.c.status == status)
+        if branch_id is not None:
+            query = query.where(sales.c.branch_id == branch_id)
+        if sale_ids is not None:
+            query = query.where(sales.c.id.in_(list(sale_ids)))
+        sale_rows = db.execute(query.order_by(sales.c.id)).all()
+
+        counts = {'sales': 0, 'items': 0, 'changed': 0}
+        for offset in range(0, len(sale_rows), chunk_size):
+            chunk = sale_rows[offset:offset + chunk_size]
+            lines = defaultdict(list)
+            for row in db.execute(
+                select(items.c.id, items.c.sale_id, items.c.product_id, items.c.variant_id,
+                       items.c.quantity, items.c.discount, items.c.promotion_discount)
+                .where(items.c.sale_id.in_([sale.id for sale in chunk]))
+                .order_by(items.c.sale_id, items.c.id)
+            ):
+                lines[row.sale_id].append(row)
+
+            priced = PricingService.price_baskets(db, [
+                {
+                    'branch_id': sale.branch_id,
+                    'discount_amount': sale.discount_amount or 0,
+                    'items': [
+                        {
+                            'product_id': line.product_id,
+                            'variant_id': line.variant_id,
+                            'quantity': line.quantity,
+                            'discount_amount': max(
+                                to_cents(line.discount or 0) - to_cents(line.promotion_discount or 0), 0
+                            ) / 100,
+                        }
+                        for line in lines[sale.id]
+                    ],
+                }
+                for sale in chunk
+            ])
+
+            item_updates = []
+            sale_updates = []
+            for sale, result in zip(chunk, priced):
+                for line, row in zip(lines[sale.id], PricingService.item_rows(result)):
+                    row.pop('notes')
+                    item_updates.append(dict(row, item_id=line.id))
+                sale_updates.append(dict(PricingService.sale_totals(result), sale_id=sale.id))
+                if to_cents(sale.total_amount or 0) != to_cents(result['total']):
+                    counts['changed'] += 1
+            if item_updates:
+                db.execute(
+                    items.update().where(items.c.id == bindparam('item_id')).values(
+                        price=bindparam('price'), discount=bindparam('discount'),
+                        promotion_id=bindparam('promotion_id'),
+                        promotion_discount=bindparam('promotion_discount'),
+                        tax_rate=bindparam('tax_rate'), tax_amount=bindparam('tax_amount')
+                    ),
+                    [{key: value for key, value in row.items() if key not in ('product_id', 'variant_id', 'quantity')}
+                     for row in item_updates]
+                )
+            db.execute(
+                sales.update().where(sales.c.id == bindparam('sale_id')).values(
+                    subtotal=bindparam('subtotal'), discount_amount=bindparam('discount_amount'),
+                    tax_amount=bindparam('tax_amount'), total_amount=bindparam('total_amount')
+                ),
+                sale_updates
+            )
+            db.commit()
+            counts['sales'] += len(chunk)
+            counts['items'] += len(item_updates)
+        return counts
+
+    @staticmethod
+    def _percent(value: Any, label: str) -> int:
+        ppm = rate_ppm(value or 0)
+        if not 0 <= ppm <= PPM:
+            raise ValidationException(f"{label} must be between 0 and 100 percent")
+        return ppm
+
+    @staticmethod
+    def _allocate(amounts: np.ndarray, weights: np.ndarray, group: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Split ``amounts[g]`` over the lines of each group ``g`` in proportion to ``values``.
+
+        Each line gets the floor of its exact share and the cents left over
+        go, one each, to the lines with the largest remainders (ties to the
+        earlier line), so the shares of a group add up to its amount exactly.
+        """
+        if amounts.size and int(amounts.max()) * int(values.max(initial=0)) > np.iinfo(np.int64).max:
+            amounts, values = amounts.astype(object), values.astype(object)  # Exact beyond int64
+        share = np.zeros(len(values), np.int64)
+        total = weights[group]
+        positive = total > 0
+        scaled = amounts[group] * values
+        share[positive] = scaled[positive] // total[positive]
+        remainder = np.zeros(len(values), np.int64)
+        remainder[positive] = scaled[positive] % total[positive]
+
+        leftover = amounts.copy()
+        np.subtract.at(leftover, group, share)
+        # Rank the lines of each group by remainder, largest first
+        order = np.lexsort((np.arange(len(values)), -remainder, group))
+        first = np.searchsorted(group[order], group[order], side='left')
+        rank = np.arange(len(values)) - first
+        share[order] += rank < leftover[group[order]]
+        return share
+
+    @staticmethod
+    def _versions(branch_id: Optional[int]) -> Optional[tuple]:
+        keys = [RULES_VERSION_KEY.format(ALL_BRANCHES)]
+        if branch_id is not None:
+            keys.append(RULES_VERSION_KEY.format(branch_id))
+        versions = _with_redis(lambda client: client.mget(keys))
+        return tuple(versions) if versions is not None else None
+
+    @staticmethod
+    def _load_rules(db: Session, branch_id: Optional[int]) -> PricingRules:
+        taxes = {}
+        promotions = defaultdict(list)
+        for model in (TaxRate, Promotion):
+            table = model.__table__
+            scope = table.c.branch_id.is_(None)
+            if branch_id is not None:
+                scope = or_(scope, table.c.branch_id == branch_id)
+            rows = db.execute(select(table).where(table.c.is_active.is_(True), scope)).all()
+            # Rules without a branch first, so the branch's own rules override them
+            for row in sorted(rows, key=lambda row: (row.branch_id is not None, row.id)):
+                if model is TaxRate:
+                    taxes[_target(row)] = rate_ppm(row.rate)
+                else:
+                    value = rate_ppm(row.value) if row.discount_type == Promotion.PERCENT else to_cents(row.value)
+                    promotions[_target(row)].append(
+                        (row.id, row.discount_type, value, row.min_quantity or 1, row.starts_at, row.ends_at)
+                    )
+        return PricingRules(taxes, dict(promotions))
+
+@event.listens_for(Session, 'before_flush')
+def _collect_rule_changes(session, flush_context, instances):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (TaxRate, Promotion)):
+            changed = session.info.setdefault(_CHANGED_BRANCHES, set())
+            changed.add(obj.branch_id)
+            changed.update(inspect(obj).attrs.branch_id.history.deleted)  # A rule moved off a branch
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_rules(session):
+    changed = session.info.pop(_CHANGED_BRANCHES, None)
+    if changed:
+        PricingService.invalidate(changed)
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta
+from statistics import NormalDist
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sqlalchemy import Integer, bindparam, column, func, select, values
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.inventory import Inventory
+from ..models.sale import Sale, SaleItem
+
+# Rows per UPDATE ... FROM (VALUES ...) statement on PostgreSQL.
+UPDATE_CHUNK_SIZE = 10000
+
+PARAMETER_COLUMNS = ('minimum_stock', 'reorder_point', 'reorder_quantity')
+
+class ReplenishmentService:
+    """
+    Recompute reorder points and safety stock from sales history.
+
+    For every inventory row with sales in the history window, daily demand
+    mean and standard deviation are computed with NumPy over the whole catalog
+    at once (days without sales count as zero demand), then:
+
+        safety stock   = z * std * sqrt(lead time)
+        reorder point  = mean * lead time + safety stock
+        reorder qty    = mean * review period
+
+    where z is the normal quantile of the target service level. Rows without
+    sales in the window keep their current values.
+    """
+
+    @staticmethod
+    def recalculate(
+        db: Session,
+        *,
+        history_days: Optional[int] = None,
+        service_level: Optional[float] = None,
+        default_lead_time: Optional[int] = None,
+        review_days: Optional[int] = None,
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Recompute ``minimum_stock``, ``reorder_point`` and ``reorder_quantity``
+        for every (branch, product) and write changes back in bulk. Commits.
+
+        Args:
+            db: Database session
+            history_days: Days of sales history (``REORDER_HISTORY_DAYS``)
+            service_level: Target cycle service level (``REORDER_SERVICE_LEVEL``)
+            default_lead_time: Lead time for rows without one (``REORDER_LEAD_TIME_DAYS``)
+            review_days: Days of demand per reorder (``REORDER_REVIEW_DAYS``)
+            now: End of the history window (defaults to the current time)
+
+        Returns:
+            dict: Rows scanned, rows with demand history and rows changed
+        """
+        history_days = history_days or settings.REORDER_HISTORY_DAYS
+        service_level = service_level or settings.REORDER_SERVICE_LEVEL
+        default_lead_time = default_lead_time or settings.REORDER_LEAD_TIME_DAYS
+        review_days = review_days or settings.REORDER_REVIEW_DAYS
+        end = now or datetime.utcnow()
+        start = end - timedelta(days=history_days)
+
+        inventory = Inventory.__table__
+        rows = db.execute(
+            select(
+                inventory.c.id,
+                inventory.c.branch_id,
+                inventory.c.product_id,
+                func.coalesce(inventory.c.lead_time_days, default_lead_time),
+                func.coalesce(inventory.c.minimum_stock, 0),
+                func.coalesce(inventory.c.reorder_point, 0),
+                func.coalesce(inventory.c.reorder_quantity, 0)
+            ).order_by(inventory.c.branch_id, inventory.c.product_id)
+        ).all()
+        if not rows:
+            return {'scanned': 0, 'with_history': 0, 'changed': 0}
+
+        table = np.array([tuple(row) for row in rows], dtype=np.int64)
+        ids, lead_time, current = table[:, 0], table[:, 3].astype(np.float64), table[:, 4:7]
+        slot = ReplenishmentService._slot_index(table[:, 1], table[:, 2])
+
+        # Daily demand per (branch, product), reduced in SQL to the sum and sum
+        # of squares per key; days without sales contribute zero to both.
+        sales = Sale.__table__
+        items = SaleItem.__table__
+        day = func.date(sales.c.created_at)
+        daily = (
+            select(
+                sales.c.branch_id,
+                items.c.product_id,
+                func.sum(items.c.quantity).label('quantity')
+            )
+            .select_from(items.join(sales, sales.c.id == items.c.sale_id))
+            .where(
+                sales.c.branch_id.isnot(None),
+                sales.c.created_at >= start,
+                sales.c.created_at < end,
+                sales.c.status != 'cancelled'
+            )
+            .group_by(sales.c.branch_id, items.c.product_id, day)
+            .subquery()
+        )
+        demand = db.execute(
+            select(
+                daily.c.branch_id,
+                daily.c.product_id,
+                func.sum(daily.c.quantity),
+                func.sum(daily.c.quantity * daily.c.quantity)
+            ).group_by(daily.c.branch_id, daily.c.product_id)
+        ).all()
+
+        totals = np.zeros(len(ids))
+        squares = np.zeros(len(ids))
+        if demand:
+            stats = np.array([tuple(row) for row in demand], dtype=np.float64)
+            position = slot(stats[:, 0].astype(np.int64), stats[:, 1].astype(np.int64))
+            known = position >= 0
+            totals[position[known]] = stats[known, 2]
+            squares[position[known]] = stats[known, 3]
+
+        mean = totals / history_days
+        variance = np.maximum(squares / history_days - mean ** 2, 0.0) * history_days / max(history_days - 1, 1)
+        std = np.sqrt(variance)
+
+        z = NormalDist().inv_cdf(service_level)
+        safety = z * std * np.sqrt(lead_time)
+        proposed = np.column_stack((
+            np.ceil(safety),
+            np.ceil(mean * lead_time + safety),
+            np.maximum(np.ceil(mean * review_days), 1)
+        )).astype(np.int64)
+
+        active = totals > 0
+        changed = active & np.any(proposed != current, axis=1)
+        updates = np.column_stack((ids[changed], proposed[changed])).tolist()
+        ReplenishmentService._write(db, updates)
+        db.commit()
+
+        return {
+            'scanned': len(ids),
+            'with_history': int(active.sum()),
+            'changed': len(updates),
+            'service_level': service_level,
+            'history_days': history_days,
+        }
+
+    @staticmethod
+    def _slot_index(branch_ids: np.ndarray, product_ids: np.ndarray):
+        """
+        Build a vectorized lookup from (branch, product) to inventory row position.
+
+        ``branch_ids``/``product_ids`` must be sorted by (branch, product).
+        """
+        keys = branch_ids * (1 << 32) + product_ids
+
+        def lookup(branches: np.ndarray, products: np.ndarray) -> np.ndarray:
+            wanted = branches * (1 << 32) + products
+            position = np.searchsorted(keys, wanted)
+            position = np.minimum(position, len(keys) - 1)
+            return np.where(keys[position] == wanted, position, -1)
+
+        return lookup
+
+    @staticmethod
+    def _write(db: Session, updates: list) -> None:
+        """Write ``[id, minimum_stock, reorder_point, reorder_quantity]`` rows."""
+        if not updates:
+            return
+        inventory = Inventory.__table__
+        if db.get_bind().dialect.name == 'postgresql':
+            # One UPDATE ... FROM (VALUES ...) per chunk
+            for offset in range(0, len(updates), UPDATE_CHUNK_SIZE):
+                data = values(
+                    column('id', Integer), *[column(name, Integer) for name in PARAMETER_COLUMNS],
+                    name='proposed'
+                ).data([tuple(row) for row in updates[offset:offset + UPDATE_CHUNK_SIZE]])
+                db.execute(
+                    inventory.update()
+                    .where(inventory.c.id == data.c.id)
+                    .values({name: data.c[name] for name in PARAMETER_COLUMNS})
+                )
+            return
+
+        db.execute(
+            inventory.update()
+            .where(inventory.c.id == bindparam('_id'))
+            .values({name: bindparam('_' + name) for name in PARAMETER_COLUMNS}),
+            [dict(zip(('_id',) + tuple('_' + name for name in PARAMETER_COLUMNS), row)) for row in updates]
+        )
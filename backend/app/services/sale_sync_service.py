@@ -0,0 +1,305 @@
+import hashlib
+import json
+import zlib
+from collections import defaultdict
+from datetime import timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.exceptions import InsufficientStockException, ValidationException
+from ..core.logging import logger
+from ..models.product import Product, ProductVariant
+from ..models.sale import Sale, SaleItem
+from ..schemas.sale import OfflineSale
+from .batch_service import BatchService
+from .pricing_service import PricingService
+from .sales_velocity_service import SalesVelocityService
+
+# zlib window sizes for gzip and zlib-wrapped deflate streams
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+class SaleSyncService:
+    """
+    Bulk upload of sales recorded offline by POS terminals.
+
+    An upload is newline-delimited JSON, one ``OfflineSale`` per line,
+    optionally gzip- or deflate-compressed. Sales are deduplicated by their
+    client-generated ``client_sale_id`` (within the upload and against sales
+    already stored) and written in transactions of ``SALE_SYNC_CHUNK_SIZE``:
+    per chunk, one stock update for all (branch, product) keys, picked from
+    batches first-expiry-first-out, one multi-row insert for the sales and
+    one for their items. Sales are priced by ``PricingService`` as of the
+    time they were rung up, exactly as an online sale would have been. A
+    sale whose stock is short is rejected and reported rather than failing
+    its chunk.
+    """
+
+    @staticmethod
+    def parse(payload: bytes, *, content_encoding: Optional[str] = None) -> List[dict]:
+        """
+        Decode an upload into one entry per non-blank line.
+
+        Args:
+            payload: Request body
+            content_encoding: ``gzip`` or ``deflate``; detected from the gzip
+                magic number if omitted
+
+        Returns:
+            list: ``{'line', 'sale', 'error'}`` per line; ``sale`` is an
+            ``OfflineSale`` or None when the line is invalid
+
+        Raises:
+            ValidationException: The upload cannot be decompressed or is too large
+        """
+        encoding = (content_encoding or '').strip().lower()
+        if not encoding and payload[:2] == b'\x1f\x8b':
+            encoding = 'gzip'
+        if encoding in _WBITS:
+            decompressor = zlib.decompressobj(_WBITS[encoding])
+            try:
+                payload = decompressor.decompress(payload, settings.SALE_SYNC_MAX_BYTES + 1)
+            except zlib.error as e:
+                raise ValidationException(f"Could not decompress upload: {e}")
+            if decompressor.unconsumed_tail:
+                payload += b'x'  # Force the size check below
+        elif encoding not in ('', 'identity'):
+            raise ValidationException(f"Unsupported content encoding: {content_encoding}")
+        if len(payload) > settings.SALE_SYNC_MAX_BYTES:
+            raise ValidationException(f"Upload exceeds {settings.SALE_SYNC_MAX_BYTES} bytes")
+
+        entries = []
+        for number, raw in enumerate(payload.splitlines(), start=1):
+            if not raw.strip():
+                continue
+            if len(entries) >= settings.SALE_SYNC_MAX_SALES:
+                raise ValidationException(f"Upload exceeds {settings.SALE_SYNC_MAX_SALES} sales")
+            try:
+                entries.append({'line': number, 'sale': OfflineSale(**json.loads(raw)), 'error': None})
+            except (ValueError, TypeError, ValidationError) as e:
+                entries.append({'line': number, 'sale': None, 'error': f"Invalid sale: {e}"})
+        return entries
+
+    @staticmethod
+    def sync(
+        db: Session,
+        entries: Sequence[dict],
+        *,
+        created_by: int,
+        can_access_branch: Optional[Callable[[int], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        Store parsed offline sales, committing every ``SALE_SYNC_CHUNK_SIZE``.
+
+        Args:
+            db: Database session
+            entries: Output of ``parse``
+            created_by: User uploading the sales
+            can_access_branch: Predicate rejecting sales for other branches
+
+        Returns:
+            dict: ``created``, ``duplicates`` and ``failed`` counts and a result per line
+        """
+        results = []
+        pending = []
+        seen = set()
+        for entry in entries:
+            sale = entry['sale']
+            result = {
+                'line': entry['line'],
+                'client_sale_id': sale.client_sale_id if sale else None,
+                'status': 'created',
+                'sale_id': None,
+                'error': None,
+            }
+            results.append(result)
+            if sale is None:
+                result.update(status='invalid', error=entry['error'])
+            elif sale.client_sale_id in seen:
+                result.update(status='duplicate', error="Repeated in this upload")
+            elif can_access_branch is not None and not can_access_branch(sale.branch_id):
+                result.update(status='invalid', error=f"No access to branch {sale.branch_id}")
+            else:
+                seen.add(sale.client_sale_id)
+                pending.append((sale, result))
+
+        chunk_size = settings.SALE_SYNC_CHUNK_SIZE
+        for offset in range(0, len(pending), chunk_size):
+            chunk = pending[offset:offset + chunk_size]
+            try:
+                SaleSyncService._store_chunk(db, chunk, created_by)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.exception("Offline sale sync chunk failed")
+                for _, result in chunk:
+                    if result['status'] == 'created':
+                        result.update(status='failed', sale_id=None, error=str(e))
+
+        created = sum(1 for result in results if result['status'] == 'created')
+        duplicates = sum(1 for result in results if result['status'] == 'duplicate')
+        return {
+            'created': created,
+            'duplicates': duplicates,
+            'failed': len(results) - created - duplicates,
+            'results': results,
+        }
+
+    @staticmethod
+    def _store_chunk(db: Session, chunk: List[tuple], created_by: int) -> None:
+        """Write one chunk of sales; marks duplicates, invalid and rejected sales."""
+        sales = Sale.__table__
+
+        existing = dict(db.execute(
+            select(sales.c.client_sale_id, sales.c.id)
+            .where(sales.c.client_sale_id.in_([sale.client_sale_id for sale, _ in chunk]))
+        ).all())
+        for sale, result in chunk:
+            if sale.client_sale_id in existing:
+                result.update(status='duplicate', sale_id=existing[sale.client_sale_id])
+
+        live = [(sale, result) for sale, result in chunk if result['status'] == 'created']
+        prices = SaleSyncService._price(db, live)
+        live = [(sale, result) for sale, result in live if result['status'] == 'created']
+
+        # Decrement stock for the whole chunk; on a shortage drop the sales
+        # that do not fit and retry with the rest.
+        while live:
+            deltas = defaultdict(int)
+            for sale, _ in live:
+                for item in sale.items:
+                    deltas[(sale.branch_id, item.product_id)] -= item.quantity
+            try:
+                with db.begin_nested():
+                    BatchService.fulfil(
+                        db, {key: -delta for key, delta in deltas.items()},
+                        ledger={'entry_type': 'sale', 'reference_type': 'sale_sync', 'created_by': created_by}
+                    )
+                break
+            except InsufficientStockException as e:
+                # Short stock goes to the earliest sales in the upload
+                short = {shortage['key']: shortage for shortage in e.shortages}
+                budget = {key: shortage['available'] for key, shortage in short.items()}
+                remaining = []
+                for sale, result in live:
+                    needs = defaultdict(int)
+                    for item in sale.items:
+                        key = (sale.branch_id, item.product_id)
+                        if key in short:
+                            needs[key] += item.quantity
+                    lacking = next((key for key, need in needs.items() if budget[key] < need), None)
+                    if lacking:
+                        result.update(
+                            status='rejected',
+                            error=f"Insufficient stock for product {lacking[1]} (available {budget[lacking]})"
+                        )
+                        continue
+                    for key, need in needs.items():
+                        budget[key] -= need
+                    remaining.append((sale, result))
+                live = remaining
+        if not live:
+            return
+
+        rows = []
+        for sale, _ in live:
+            created_at = sale.created_at
+            if created_at.tzinfo is not None:
+                created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+            rows.append({
+                'sale_number': 'OFF-' + hashlib.sha256(sale.client_sale_id.encode()).hexdigest()[:28],
+                'client_sale_id': sale.client_sale_id,
+                'branch_id': sale.branch_id,
+                'customer_id': sale.customer_id,
+                **PricingService.sale_totals(prices[sale.client_sale_id]),
+                'payment_method': sale.payment_method.value,
+                'payment_status': 'completed',
+                'status': 'completed',
+                'notes': sale.notes,
+                'created_by': created_by,
+                'created_at': created_at,
+                'updated_at': created_at,
+            })
+        ids = db.execute(
+            sales.insert().returning(sales.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        items = []
+        units = defaultdict(int)
+        sold_at = {}
+        for (sale, result), sale_id, row in zip(live, ids, rows):
+            result['sale_id'] = sale_id
+            for line in PricingService.item_rows(prices[sale.client_sale_id]):
+                items.append(dict(line, sale_id=sale_id))
+            for item in sale.items:
+                key = (sale.branch_id, item.product_id)
+                units[key] += item.quantity
+                sold_at[key] = max(sold_at.get(key, row['created_at']), row['created_at'])
+        db.execute(SaleItem.__table__.insert(), items)
+        SalesVelocityService.record(db, units, sold_at=sold_at)
+
+    @staticmethod
+    def _price(db: Session, live: List[tuple]) -> Dict[str, dict]:
+        """
+        Price each sale with ``PricingService`` as of its ``created_at``;
+        marks sales with unknown products or invalid lines invalid.
+        """
+        product_ids = {item.product_id for sale, _ in live for item in sale.items}
+        variant_ids = {item.variant_id for sale, _ in live for item in sale.items if item.variant_id is not None}
+        products, variants = Product.__table__, ProductVariant.__table__
+        loaded = {
+            'products': {
+                row.id: row
+                for row in db.execute(
+                    select(products.c.id, products.c.name, products.c.price, products.c.category_id)
+                    .where(products.c.id.in_(product_ids))
+                )
+            } if product_ids else {},
+            'variants': {
+                row.id: row
+                for row in db.execute(
+                    select(variants.c.id, variants.c.product_id, variants.c.price_adjustment)
+                    .where(variants.c.id.in_(variant_ids))
+                )
+            } if variant_ids else {},
+        }
+
+        prices = {}
+        for sale, result in live:
+            missing = next((item for item in sale.items if item.product_id not in loaded['products']), None)
+            if missing is not None:
+                result.update(status='invalid', error=f"Product {missing.product_id} not found")
+                continue
+            missing = next((
+                item for item in sale.items
+                if item.variant_id is not None and item.variant_id not in loaded['variants']
+            ), None)
+            if missing is not None:
+                result.update(
+                    status='invalid', error=f"Variant {missing.variant_id} not found for product {missing.product_id}"
+                )
+                continue
+            at = sale.created_at
+            if at.tzinfo is not None:
+                at = at.astimezone(timezone.utc).replace(tzinfo=None)
+            try:
+                prices[sale.client_sale_id] = PricingService.price_basket(db, {
+                    'branch_id': sale.branch_id,
+                    'items': [
+                        {
+                            'product_id': item.product_id,
+                            'variant_id': item.variant_id,
+                            'quantity': item.quantity,
+                            'unit_price': item.price,
+                            'discount_amount': item.discount,
+                            'notes': item.notes,
+                        }
+                        for item in sale.items
+                    ],
+                }, loaded=loaded, at=at)
+            except ValidationException as e:
+                result.update(status='invalid', error=e.detail)
+        return prices
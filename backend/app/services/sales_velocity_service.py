@@ -0,0 +1,250 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Mapping, Optional, Tuple, Union
+
+from sqlalchemy import and_, bindparam, case, func, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.branch import Branch
+from ..models.inventory import Inventory
+from ..models.product import Product
+from ..models.sale import Sale, SaleItem
+
+BranchProduct = Tuple[int, int]
+
+VELOCITY_WINDOW = timedelta(days=30)
+
+class SalesVelocityService:
+    """
+    Per-(branch, product) sales velocity kept on ``Inventory``.
+
+    ``last_sold_at`` and ``units_sold_30d`` are bumped in the same transaction
+    as each sale, and ``refresh`` trues ``units_sold_30d`` up nightly as sales
+    age out of the window. Dead-stock and slow-mover reports are then range
+    scans on ``(branch_id, last_sold_at)`` instead of an anti-join of inventory
+    against the whole sales history.
+    """
+
+    @staticmethod
+    def record(
+        db: Session,
+        units: Mapping[BranchProduct, int],
+        *,
+        sold_at: Optional[Union[datetime, Mapping[BranchProduct, datetime]]] = None
+    ) -> None:
+        """
+        Record units sold per (branch, product). Does not commit.
+
+        Args:
+            db: Database session
+            units: Units sold per (branch_id, product_id)
+            sold_at: Time of sale, or latest time of sale per key (defaults
+                to the database time)
+        """
+        per_key = isinstance(sold_at, Mapping)
+        params = [
+            dict(
+                {'_branch_id': branch_id, '_product_id': product_id, '_units': quantity},
+                **({'_sold_at': sold_at[(branch_id, product_id)]} if per_key else {})
+            )
+            for (branch_id, product_id), quantity in sorted(units.items()) if quantity > 0
+        ]
+        if not params:
+            return
+        inventory = Inventory.__table__
+        if per_key:
+            sold_at = bindparam('_sold_at', type_=inventory.c.last_sold_at.type)
+        elif sold_at is None:
+            sold_at = func.now()
+        db.execute(
+            inventory.update()
+            .where(
+                inventory.c.branch_id == bindparam('_branch_id'),
+                inventory.c.product_id == bindparam('_product_id')
+            )
+            .values(
+                # Late (e.g. synced offline) sales must not move it backwards
+                last_sold_at=case(
+                    (inventory.c.last_sold_at > sold_at, inventory.c.last_sold_at),
+                    else_=sold_at
+                ),
+                units_sold_30d=inventory.c.units_sold_30d + bindparam('_units')
+            ),
+            params
+        )
+
+    @staticmethod
+    def refresh(db: Session, *, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Recompute ``units_sold_30d`` from the last 30 days of sales and write
+        the rows that differ. Commits.
+
+        Args:
+            db: Database session
+            now: End of the window (defaults to the current time)
+
+        Returns:
+            dict: Rows checked and rows corrected
+        """
+        end = now or datetime.utcnow()
+        inventory = Inventory.__table__
+        sales = Sale.__table__
+        items = SaleItem.__table__
+
+        actual = {
+            (row[0], row[1]): int(row[2])
+            for row in db.execute(
+                select(sales.c.branch_id, items.c.product_id, func.sum(items.c.quantity))
+                .select_from(items.join(sales, sales.c.id == items.c.sale_id))
+                .where(
+                    sales.c.branch_id.isnot(None),
+                    sales.c.created_at >= end - VELOCITY_WINDOW,
+                    sales.c.created_at < end,
+                    sales.c.status != 'cancelled'
+                )
+                .group_by(sales.c.branch_id, items.c.product_id)
+            )
+        }
+        stored = {
+            (row[0], row[1]): (row[2], row[3])
+            for row in db.execute(
+                select(inventory.c.branch_id, inventory.c.product_id, inventory.c.id, inventory.c.units_sold_30d)
+                .where(or_(
+                    inventory.c.units_sold_30d != 0,
+                    inventory.c.last_sold_at >= end - VELOCITY_WINDOW
+                ))
+            )
+        }
+        missing = set(actual) - set(stored)
+        if missing:
+            # Sales that were never recorded against their inventory row
+            for row in db.execute(
+                select(inventory.c.branch_id, inventory.c.product_id, inventory.c.id, inventory.c.units_sold_30d)
+                .where(tuple_(inventory.c.branch_id, inventory.c.product_id).in_(sorted(missing)))
+            ):
+                stored[(row[0], row[1])] = (row[2], row[3])
+
+        params = [
+            {'_id': inventory_id, '_units': actual.get(key, 0)}
+            for key, (inventory_id, units) in sorted(stored.items())
+            if units != actual.get(key, 0)
+        ]
+        if params:
+            db.execute(
+                inventory.update()
+                .where(inventory.c.id == bindparam('_id'))
+                .values(units_sold_30d=bindparam('_units')),
+                params
+            )
+        db.commit()
+        return {'checked': len(stored), 'corrected': len(params)}
+
+    @staticmethod
+    def dead_stock(
+        db: Session,
+        *,
+        branch_id: Optional[int] = None,
+        business_id: Optional[int] = None,
+        days: Optional[int] = None,
+        slow: bool = False,
+        max_units: Optional[int] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> Dict[str, Any]:
+        """
+        Stock on hand that has not sold in ``days`` days, with its value at cost.
+
+        With ``slow`` the report lists slow movers instead: items that did
+        sell within ``days`` but no more than ``max_units`` in the last 30.
+
+        Args:
+            db: Database session
+            branch_id: Limit to one branch
+            business_id: Limit to the branches of one business
+            days: Days without sales (``DEAD_STOCK_DAYS``)
+            slow: Report slow movers instead of dead stock
+            max_units: Slow-mover threshold (``SLOW_MOVER_UNITS_30D``)
+            skip: Items to skip
+            limit: Maximum items to return
+
+        Returns:
+            dict: Totals, a per-branch breakdown and the items by value, highest first
+        """
+        days = days or settings.DEAD_STOCK_DAYS
+        max_units = settings.SLOW_MOVER_UNITS_30D if max_units is None else max_units
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        inventory = Inventory.__table__
+        products = Product.__table__
+
+        if slow:
+            condition = and_(inventory.c.last_sold_at >= cutoff, inventory.c.units_sold_30d <= max_units)
+        else:
+            condition = or_(
+                inventory.c.last_sold_at < cutoff,
+                and_(inventory.c.last_sold_at.is_(None), inventory.c.created_at < cutoff)
+            )
+        filters = [condition, inventory.c.quantity > 0]
+        if branch_id is not None:
+            filters.append(inventory.c.branch_id == branch_id)
+        if business_id is not None:
+            filters.append(inventory.c.branch_id.in_(
+                select(Branch.__table__.c.id).where(Branch.__table__.c.business_id == business_id)
+            ))
+
+        value = (inventory.c.quantity * func.coalesce(products.c.cost, 0)).label('value')
+        source = inventory.join(products, products.c.id == inventory.c.product_id)
+
+        branches = [
+            {'branch_id': row.branch_id, 'items': row.item_count, 'units': int(row.units), 'value': round(float(row.value), 2)}
+            for row in db.execute(
+                select(
+                    inventory.c.branch_id,
+                    func.count().label('item_count'),
+                    func.sum(inventory.c.quantity).label('units'),
+                    func.sum(inventory.c.quantity * func.coalesce(products.c.cost, 0)).label('value')
+                )
+                .select_from(source)
+                .where(*filters)
+                .group_by(inventory.c.branch_id)
+                .order_by(inventory.c.branch_id)
+            )
+        ]
+        rows = db.execute(
+            select(
+                inventory.c.id,
+                inventory.c.branch_id,
+                inventory.c.product_id,
+                products.c.name,
+                inventory.c.quantity,
+                inventory.c.last_sold_at,
+                inventory.c.units_sold_30d,
+                value
+            )
+            .select_from(source)
+            .where(*filters)
+            .order_by(value.desc(), inventory.c.id)
+            .offset(skip)
+            .limit(limit)
+        ).all()
+
+        return {
+            'kind': 'slow' if slow else 'dead',
+            'days': days,
+            'items_total': sum(entry['items'] for entry in branches),
+            'units': sum(entry['units'] for entry in branches),
+            'value': round(sum(entry['value'] for entry in branches), 2),
+            'branches': branches,
+            'items': [
+                {
+                    'inventory_id': row.id,
+                    'branch_id': row.branch_id,
+                    'product_id': row.product_id,
+                    'product_name': row.name,
+                    'quantity': row.quantity,
+                    'last_sold_at': row.last_sold_at,
+                    'units_sold_30d': row.units_sold_30d,
+                    'value': round(float(row.value), 2),
+                }
+                for row in rows
+            ],
+        }
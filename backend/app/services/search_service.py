@@ -0,0 +1,329 @@
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import column, func, inspect, literal, literal_column, select, table, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Subquery
+
+from ..core.config import settings
+from ..core.exceptions import ServiceUnavailableException
+from ..models.product import Product
+
+# Words as both FTS5's unicode61 tokenizer and PostgreSQL's ``simple``
+# parser split them (underscores separate words)
+_WORD = re.compile(r'[^\W_]+')
+
+# bm25 column weights, in products_fts column order
+_BM25_WEIGHTS = (10.0, 8.0, 8.0, 1.0)  # name, sku, barcode, description
+
+_fts = table('products_fts', column('rowid'))
+_fts_vocab = table('products_fts_vocab', column('term'))
+
+# Databases (by URL) the search index was found in
+_indexed = set()
+
+# SQLite: an FTS5 index over the products table (external content, so the
+# text is not stored twice), kept in sync by triggers, and a vocabulary
+# view of its terms for typo correction.
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, sku, barcode, description,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts_vocab USING fts5vocab(products_fts, row)
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, sku, barcode, description)
+        VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku, barcode, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, sku, barcode, description ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku, barcode, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.description);
+        INSERT INTO products_fts(rowid, name, sku, barcode, description)
+        VALUES (new.id, new.name, new.sku, new.barcode, new.description);
+    END
+    """,
+]
+
+# PostgreSQL: a weighted tsvector generated from the product columns (so
+# the database keeps it current on every write), a GIN index over it and
+# a trigram index on the name for typo-tolerant matching.
+POSTGRESQL_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(sku, '') || ' ' || coalesce(barcode, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+]
+
+class ProductSearchService:
+    """
+    Ranked full-text product search and autocomplete.
+
+    On SQLite products are indexed by FTS5 and ranked by BM25; on
+    PostgreSQL by a generated ``tsvector`` column ranked with
+    ``ts_rank_cd``. Either way the index is maintained by the database on
+    every insert, update and delete (including the bulk Core writes of the
+    importer), and a query is a single index lookup instead of a scan of
+    every product. All words of a query must match; the last one matches as
+    a prefix, so results narrow as the user types.
+
+    Autocomplete also tolerates typos: when the prefix matches fewer
+    products than asked for, the last word is corrected against the index
+    vocabulary (SQLite, up to one edit, two from eight letters) or matched
+    by trigram word similarity (PostgreSQL).
+    """
+
+    @staticmethod
+    def terms(query: str) -> List[str]:
+        """Lower-cased words of a search query."""
+        return [term.lower() for term in _WORD.findall(query or '')]
+
+    @staticmethod
+    def ranked(db: Session, query: str, *, autocomplete: bool = False) -> Optional[Subquery]:
+        """
+        Products matching a query with their relevance.
+
+        Args:
+            db: Database session
+            query: Search text
+            autocomplete: Match names, SKUs and barcodes only
+
+        Returns:
+            Subquery: ``id`` and ``score`` (higher is better) of the matching
+            products, to join to ``Product``; None if the query has no words
+
+        Raises:
+            ServiceUnavailableException: The search index has not been created
+        """
+        terms = ProductSearchService.terms(query)
+        if not terms:
+            return None
+        ProductSearchService.require_index(db)
+        dialect = db.get_bind().dialect.name
+        if dialect == 'postgresql':
+            vector = literal_column('products.search_vector')
+            weights = 'AB' if autocomplete else ''  # Name and SKU/barcode lexemes only
+            tsquery = func.to_tsquery(
+                'simple', ' & '.join([f'{term}:{weights}' if weights else term for term in terms[:-1]]
+                                     + [f'{terms[-1]}:*{weights}'])
+            )
+            return (
+                select(Product.id.label('id'), func.ts_rank_cd(vector, tsquery).label('score'))
+                .where(vector.op('@@')(tsquery))
+                .subquery('ranked')
+            )
+        return ProductSearchService._fts_match(ProductSearchService._fts_query(terms, autocomplete))
+
+    @staticmethod
+    def search(db: Session, query: str, *, skip: int = 0, limit: int = 100) -> List[Product]:
+        """
+        Products matching a query, best match first.
+
+        Args:
+            db: Database session
+            query: Search text
+            skip: Number of products to skip
+            limit: Maximum number of products to return
+
+        Returns:
+            list: Matching products
+        """
+        ranked = ProductSearchService.ranked(db, query)
+        if ranked is None:
+            return []
+        return db.execute(
+            select(Product).join(ranked, ranked.c.id == Product.id)
+            .order_by(ranked.c.score.desc(), Product.id)
+            .offset(skip).limit(limit)
+        ).scalars().all()
+
+    @staticmethod
+    def autocomplete(db: Session, query: str, *, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Product suggestions for a partly typed name or SKU.
+
+        Args:
+            db: Database session
+            query: Text typed so far
+            limit: Maximum number of suggestions
+
+        Returns:
+            list: ``id``, ``name``, ``sku``, ``price`` and ``score`` per
+            product; prefix matches first, then typo corrections
+        """
+        dialect = db.get_bind().dialect.name
+        ranked = ProductSearchService.ranked(db, query, autocomplete=True)
+        if ranked is None:
+            return []
+        suggestions = ProductSearchService._suggest(db, ranked, limit)
+
+        terms = ProductSearchService.terms(query)
+        if len(suggestions) < limit and len(terms[-1]) >= settings.SEARCH_FUZZY_MIN_LENGTH:
+            if dialect == 'postgresql':
+                db.execute(
+                    text("SELECT set_config('pg_trgm.word_similarity_threshold', :value, true)"),
+                    {'value': str(settings.SEARCH_FUZZY_SIMILARITY)}
+                )
+                typed = literal(' '.join(terms))
+                fuzzy = (
+                    select(Product.id.label('id'), func.word_similarity(typed, Product.name).label('score'))
+                    .where(typed.op('<%')(Product.name))
+                    .subquery('fuzzy')
+                )
+            else:
+                corrections = ProductSearchService._corrections(db, terms[-1])
+                fuzzy = ProductSearchService._fts_match(
+                    ProductSearchService._fts_query(terms[:-1], True, last=corrections)
+                ) if corrections else None
+            if fuzzy is not None:
+                seen = {suggestion['id'] for suggestion in suggestions}
+                suggestions += ProductSearchService._suggest(db, fuzzy, limit - len(suggestions), exclude=seen)
+        return suggestions
+
+    @staticmethod
+    def require_index(db: Session) -> None:
+        """
+        Check once per database that the search index exists.
+
+        Args:
+            db: Database session
+
+        Raises:
+            ServiceUnavailableException: The index is missing; create it with
+                ``rebuild_search_index.py``
+        """
+        bind = db.get_bind()
+        if str(bind.url) in _indexed:
+            return
+        inspector = inspect(db.connection())
+        if bind.dialect.name == 'postgresql':
+            found = any(c['name'] == 'search_vector' for c in inspector.get_columns('products'))
+        elif bind.dialect.name == 'sqlite':
+            found = inspector.has_table('products_fts')
+        else:
+            raise NotImplementedError(f"Product search is not supported on {bind.dialect.name}")
+        if not found:
+            raise ServiceUnavailableException(
+                "Product search index is missing; create it with rebuild_search_index.py", retry_after=300
+            )
+        _indexed.add(str(bind.url))
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """
+        Create the search index if it is missing and rebuild it from the products table. Commits.
+
+        Args:
+            db: Database session
+
+        Returns:
+            int: Number of products indexed
+        """
+        dialect = db.get_bind().dialect.name
+        if dialect == 'postgresql':
+            for statement in POSTGRESQL_DDL:
+                db.execute(text(statement))
+            db.execute(text("REINDEX INDEX ix_products_search_vector"))
+            db.execute(text("REINDEX INDEX ix_products_name_trgm"))
+        elif dialect == 'sqlite':
+            for statement in SQLITE_DDL:
+                db.execute(text(statement))
+            db.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+            db.execute(text("INSERT INTO products_fts(products_fts) VALUES ('optimize')"))
+        else:
+            raise NotImplementedError(f"Product search is not supported on {dialect}")
+        db.commit()
+        return db.execute(select(func.count()).select_from(Product.__table__)).scalar()
+
+    @staticmethod
+    def _fts_query(terms: Sequence[str], autocomplete: bool, *, last: Optional[Sequence[str]] = None) -> str:
+        """FTS5 query: every term quoted, the last as a prefix or one of the ``last`` corrections."""
+        parts = [f'"{term}"' for term in (terms if last is not None else terms[:-1])]
+        if last is not None:
+            parts.append('(' + ' OR '.join(f'"{term}"' for term in last) + ')')
+        else:
+            parts.append(f'"{terms[-1]}"*')
+        match = ' AND '.join(parts)
+        return '{name sku barcode} : (' + match + ')' if autocomplete else match
+
+    @staticmethod
+    def _fts_match(match: str) -> Subquery:
+        fts = literal_column('products_fts')
+        return (
+            select(_fts.c.rowid.label('id'), (-func.bm25(fts, *_BM25_WEIGHTS)).label('score'))
+            .where(fts.op('MATCH')(match))
+            .subquery('ranked')
+        )
+
+    @staticmethod
+    def _suggest(db: Session, ranked: Subquery, limit: int, *, exclude=()) -> List[Dict[str, Any]]:
+        products = Product.__table__
+        query = (
+            select(products.c.id, products.c.name, products.c.sku, products.c.price, ranked.c.score)
+            .join(ranked, ranked.c.id == products.c.id)
+            .order_by(ranked.c.score.desc(), products.c.id)
+            .limit(limit + len(exclude))
+        )
+        return [dict(row._mapping) for row in db.execute(query) if row.id not in exclude][:limit]
+
+    @staticmethod
+    def _corrections(db: Session, term: str) -> List[str]:
+        """
+        Indexed terms within the edit budget of ``term`` read as a prefix.
+
+        Typos are assumed to spare the first two letters, which keeps the
+        candidates to one range of the vocabulary.
+        """
+        max_edits = 2 if len(term) >= 8 else 1
+        head = term[:2]
+        candidates = db.execute(
+            select(_fts_vocab.c.term)
+            .where(_fts_vocab.c.term >= head, _fts_vocab.c.term < head + '\U0010ffff')
+        ).scalars()
+        scored = []
+        for candidate in candidates:
+            distance = min(
+                _edit_distance(term, candidate[:length], max_edits)
+                for length in range(len(term) - max_edits, len(term) + max_edits + 1)
+            )
+            if distance <= max_edits:
+                scored.append((distance, candidate))
+        scored.sort()
+        return [candidate for _, candidate in scored[:settings.SEARCH_FUZZY_MAX_CANDIDATES]]
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or ``limit + 1`` once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
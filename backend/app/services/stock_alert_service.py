@@ -0,0 +1,164 @@
+from datetime import timedelta
+from typing import Dict
+
+from sqlalchemy import String, case, cast, false, func, literal, or_, select, union
+from sqlalchemy.orm import Session
+
+from ..models.branch import Branch
+from ..models.business import Business
+from ..models.inventory import Inventory, InventoryAlertState
+from ..models.job import JobWatermark
+from ..models.notification import Notification
+
+WATERMARK_NAME = 'stock_alerts'
+
+# Rows committed by transactions that started before the previous run may carry
+# a timestamp slightly older than its watermark; re-scan this window to catch them.
+# The state table makes re-scanning idempotent.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+LOW_STOCK = 'low_stock'
+OUT_OF_STOCK = 'out_of_stock'
+_SEVERITY = {None: 0, LOW_STOCK: 1, OUT_OF_STOCK: 2}
+
+class StockAlertService:
+    """
+    Incremental low-stock / out-of-stock alerting.
+
+    Each run only inspects inventory rows changed since the previous run's
+    watermark, compares their live state with ``InventoryAlertState`` and
+    notifies branch managers and business owners about rows that crossed into a
+    worse state. Notifications are coalesced per branch and written with a single
+    ``INSERT ... SELECT``, so a run costs time proportional to what changed.
+    """
+
+    @staticmethod
+    def run(db: Session) -> Dict[str, int]:
+        """
+        Detect stock threshold crossings and create coalesced notifications.
+
+        Args:
+            db: Database session; the run is committed on success
+
+        Returns:
+            dict: Counts of escalated, de-escalated and recovered items, and notifications created
+        """
+        run_at = db.execute(select(func.now())).scalar()
+        watermark = db.get(JobWatermark, WATERMARK_NAME)
+        since = watermark.value - WATERMARK_OVERLAP if watermark else None
+
+        transitions = StockAlertService._find_transitions(db, since)
+        escalated = [t for t in transitions if _SEVERITY[t.state] > _SEVERITY[t.previous]]
+        deescalated = [t for t in transitions if t.state and _SEVERITY[t.state] < _SEVERITY[t.previous]]
+        recovered = [t for t in transitions if t.state is None]
+
+        states = InventoryAlertState.__table__
+        cleared = [t.id for t in recovered + escalated if t.previous]
+        if cleared:
+            db.execute(states.delete().where(states.c.inventory_id.in_(cleared)))
+        if escalated:
+            db.execute(states.insert(), [
+                {'inventory_id': t.id, 'branch_id': t.branch_id, 'state': t.state, 'alerted_at': run_at}
+                for t in escalated
+            ])
+        for t in deescalated:
+            db.execute(states.update().where(states.c.inventory_id == t.id).values(state=t.state))
+
+        notifications = StockAlertService._notify(db, [t.id for t in escalated], run_at) if escalated else 0
+
+        if watermark:
+            watermark.value = run_at
+        else:
+            db.add(JobWatermark(name=WATERMARK_NAME, value=run_at))
+        db.commit()
+
+        return {
+            'escalated': len(escalated),
+            'deescalated': len(deescalated),
+            'recovered': len(recovered),
+            'notifications': notifications,
+        }
+
+    @staticmethod
+    def _find_transitions(db: Session, since):
+        """Return changed rows whose live alert state differs from the stored one."""
+        inventory = Inventory.__table__
+        states = InventoryAlertState.__table__
+        quantity = func.coalesce(inventory.c.quantity, 0)
+        live_state = case(
+            (quantity <= 0, OUT_OF_STOCK),
+            (quantity <= inventory.c.reorder_point, LOW_STOCK),
+            else_=None
+        )
+        query = (
+            select(
+                inventory.c.id,
+                inventory.c.branch_id,
+                live_state.label('state'),
+                states.c.state.label('previous')
+            )
+            .select_from(inventory.outerjoin(states, states.c.inventory_id == inventory.c.id))
+            .where(live_state.is_distinct_from(states.c.state))
+        )
+        if since is not None:
+            query = query.where(or_(inventory.c.updated_at >= since, inventory.c.created_at >= since))
+        return db.execute(query).all()
+
+    @staticmethod
+    def _notify(db: Session, inventory_ids, run_at) -> int:
+        """Insert one notification per (branch, state, recipient) for this run's crossings."""
+        states = InventoryAlertState.__table__
+        branches = Branch.__table__
+        businesses = Business.__table__
+        notifications = Notification.__table__
+
+        crossings = (
+            select(states.c.branch_id, states.c.state, func.count().label('item_count'))
+            .where(states.c.inventory_id.in_(inventory_ids))
+            .group_by(states.c.branch_id, states.c.state)
+            .subquery()
+        )
+        recipients = union(
+            select(branches.c.id.label('branch_id'), branches.c.manager_id.label('user_id'))
+            .where(branches.c.manager_id.isnot(None)),
+            select(branches.c.id, businesses.c.owner_id)
+            .select_from(branches.join(businesses, businesses.c.id == branches.c.business_id))
+        ).subquery()
+
+        is_out = crossings.c.state == OUT_OF_STOCK
+        title = case(
+            (is_out, literal('Out of Stock Alert: ', String)),
+            else_=literal('Low Stock Alert: ', String)
+        ) + branches.c.name
+        message = (
+            cast(crossings.c.item_count, String)
+            + case(
+                (is_out, literal(' product(s) ran out of stock at ', String)),
+                else_=literal(' product(s) reached their reorder point at ', String)
+            )
+            + branches.c.name
+        )
+
+        source = (
+            select(
+                recipients.c.user_id,
+                title,
+                message,
+                crossings.c.state,
+                false(),
+                literal(run_at),
+                literal(run_at)
+            )
+            .select_from(
+                crossings
+                .join(recipients, recipients.c.branch_id == crossings.c.branch_id)
+                .join(branches, branches.c.id == crossings.c.branch_id)
+            )
+        )
+        result = db.execute(
+            notifications.insert().from_select(
+                ['user_id', 'title', 'message', 'type', 'read', 'created_at', 'updated_at'],
+                source
+            )
+        )
+        return result.rowcount
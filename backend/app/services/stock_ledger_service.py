@@ -0,0 +1,360 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+from sqlalchemy import and_, false, func, literal, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..models.branch import Branch
+from ..models.inventory import Inventory, StockLedgerEntry, StockSnapshot
+from ..models.product import Product
+
+logger = logging.getLogger(__name__)
+
+BranchProduct = Tuple[int, int]
+
+# Maximum number of drifted rows listed in a reconciliation report.
+MAX_REPORTED_DRIFTS = 1000
+
+class StockLedgerService:
+    """
+    Append-only stock ledger with periodic snapshots.
+
+    Every change to ``Inventory.quantity`` is also written to ``stock_ledger``
+    in the same transaction. ``stock_snapshots`` checkpoint the running total
+    per (branch, product), so the level at any point in time is one snapshot
+    plus a short replay of the entries after it, for all keys in two grouped
+    queries. ``Inventory.quantity`` remains the fast path for current stock;
+    ``reconcile`` verifies it against the ledger in bulk.
+    """
+
+    @staticmethod
+    def record(
+        db: Session,
+        deltas: Mapping[BranchProduct, int],
+        *,
+        entry_type: str = 'adjustment',
+        reference_type: Optional[str] = None,
+        reference_id: Optional[int] = None,
+        created_by: Optional[int] = None
+    ) -> None:
+        """
+        Append one ledger entry per (branch, product) delta. Does not commit.
+
+        Args:
+            db: Database session
+            deltas: Signed quantity change per (branch_id, product_id)
+            entry_type: Kind of movement (sale, purchase, transfer, ...)
+            reference_type: Type of the originating document
+            reference_id: ID of the originating document
+            created_by: User that made the change
+        """
+        rows = [
+            {
+                'branch_id': branch_id,
+                'product_id': product_id,
+                'delta': delta,
+                'entry_type': entry_type,
+                'reference_type': reference_type,
+                'reference_id': reference_id,
+                'created_by': created_by,
+            }
+            for (branch_id, product_id), delta in deltas.items() if delta
+        ]
+        if rows:
+            db.execute(StockLedgerEntry.__table__.insert(), rows)
+
+    @staticmethod
+    def true_up(
+        db: Session,
+        keys: Optional[Iterable[BranchProduct]] = None,
+        *,
+        entry_type: str = 'correction',
+        created_by: Optional[int] = None
+    ) -> int:
+        """
+        Post entries that bring the ledger in line with ``Inventory.quantity``.
+
+        Used after writes that set absolute quantities (stock counts, imports)
+        rather than applying deltas. Does not commit.
+
+        Args:
+            db: Database session
+            keys: Limit to these (branch_id, product_id) pairs; all rows if omitted
+            entry_type: Entry type for the posted differences
+            created_by: User that made the change
+
+        Returns:
+            int: Number of entries posted
+        """
+        drift = StockLedgerService._drift_query(keys).subquery()
+        result = db.execute(
+            StockLedgerEntry.__table__.insert().from_select(
+                ['branch_id', 'product_id', 'delta', 'entry_type', 'created_by'],
+                select(
+                    drift.c.branch_id,
+                    drift.c.product_id,
+                    drift.c.difference,
+                    literal(entry_type),
+                    literal(created_by)
+                )
+            )
+        )
+        return result.rowcount
+
+    @staticmethod
+    def balances(
+        db: Session,
+        *,
+        at: Optional[datetime] = None,
+        branch_id: Optional[int] = None,
+        business_id: Optional[int] = None,
+        product_ids: Optional[Iterable[int]] = None
+    ) -> Dict[BranchProduct, int]:
+        """
+        Stock level per (branch, product) according to the ledger.
+
+        Args:
+            db: Database session
+            at: Point in time; current balance if omitted
+            branch_id: Limit to one branch
+            business_id: Limit to the branches of one business
+            product_ids: Limit to these products
+
+        Returns:
+            dict: Quantity per (branch_id, product_id) with any ledger history
+        """
+        filters = StockLedgerService._filters(branch_id, business_id, product_ids)
+        base, tail = StockLedgerService._balance_parts(at, filters)
+
+        levels: Dict[BranchProduct, int] = {}
+        for row in db.execute(select(base.c.branch_id, base.c.product_id, base.c.quantity)):
+            levels[(row.branch_id, row.product_id)] = row.quantity
+        for row in db.execute(select(tail.c.branch_id, tail.c.product_id, tail.c.delta)):
+            key = (row.branch_id, row.product_id)
+            levels[key] = levels.get(key, 0) + row.delta
+        return levels
+
+    @staticmethod
+    def valuation(
+        db: Session,
+        *,
+        at: Optional[datetime] = None,
+        branch_id: Optional[int] = None,
+        business_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Inventory value at cost at a point in time.
+
+        Args:
+            db: Database session
+            at: Point in time; now if omitted
+            branch_id: Limit to one branch
+            business_id: Limit to the branches of one business
+
+        Returns:
+            dict: Total units and value, and a per-branch breakdown
+        """
+        levels = StockLedgerService.balances(db, at=at, branch_id=branch_id, business_id=business_id)
+        product_ids = {product_id for _, product_id in levels}
+        costs = dict(db.execute(
+            select(Product.__table__.c.id, Product.__table__.c.cost)
+            .where(Product.__table__.c.id.in_(product_ids))
+        ).all()) if product_ids else {}
+
+        branches: Dict[int, Dict[str, Any]] = {}
+        for (branch, product_id), quantity in levels.items():
+            if not quantity:
+                continue
+            entry = branches.setdefault(branch, {'branch_id': branch, 'units': 0, 'value': 0.0, 'products': 0})
+            entry['units'] += quantity
+            entry['value'] += quantity * (costs.get(product_id) or 0.0)
+            entry['products'] += 1
+
+        return {
+            'as_of': at.isoformat() if at else datetime.utcnow().isoformat(),
+            'units': sum(entry['units'] for entry in branches.values()),
+            'value': round(sum(entry['value'] for entry in branches.values()), 2),
+            'branches': [
+                dict(entry, value=round(entry['value'], 2))
+                for _, entry in sorted(branches.items())
+            ],
+        }
+
+    @staticmethod
+    def take_snapshots(db: Session, *, min_entries: int = 1) -> int:
+        """
+        Checkpoint every (branch, product) with new ledger entries since its
+        last snapshot, in a single ``INSERT ... SELECT``. Commits.
+
+        Args:
+            db: Database session
+            min_entries: Skip keys with fewer new entries than this
+
+        Returns:
+            int: Number of snapshots written
+        """
+        ledger = StockLedgerEntry.__table__
+        base, _ = StockLedgerService._balance_parts(None, [])
+        source = (
+            select(
+                ledger.c.branch_id,
+                ledger.c.product_id,
+                func.max(ledger.c.id),
+                func.coalesce(func.max(base.c.quantity), 0) + func.sum(ledger.c.delta),
+                func.max(ledger.c.created_at)
+            )
+            .select_from(ledger.outerjoin(base, and_(
+                base.c.branch_id == ledger.c.branch_id,
+                base.c.product_id == ledger.c.product_id
+            )))
+            .where(ledger.c.id > func.coalesce(base.c.ledger_id, 0))
+            .group_by(ledger.c.branch_id, ledger.c.product_id)
+            .having(func.count() >= min_entries)
+        )
+        result = db.execute(
+            StockSnapshot.__table__.insert().from_select(
+                ['branch_id', 'product_id', 'ledger_id', 'quantity', 'as_of'], source
+            )
+        )
+        db.commit()
+        return result.rowcount
+
+    @staticmethod
+    def reconcile(db: Session, *, repair: bool = False) -> Dict[str, Any]:
+        """
+        Compare ``Inventory.quantity`` with the ledger balance for every row.
+
+        Args:
+            db: Database session
+            repair: Post correction entries so the ledger matches inventory
+
+        Returns:
+            dict: Rows checked, rows drifted (with details) and entries posted
+        """
+        drift = StockLedgerService._drift_query(None).subquery()
+        rows = db.execute(
+            select(drift).order_by(drift.c.branch_id, drift.c.product_id)
+        ).all()
+        checked = db.execute(select(func.count()).select_from(Inventory.__table__)).scalar()
+
+        report = {
+            'checked': checked,
+            'drifted': len(rows),
+            'drifts': [
+                {
+                    'branch_id': row.branch_id,
+                    'product_id': row.product_id,
+                    'inventory': row.quantity,
+                    'ledger': row.quantity - row.difference,
+                }
+                for row in rows[:MAX_REPORTED_DRIFTS]
+            ],
+            'repaired': 0,
+        }
+        if rows:
+            logger.warning("Stock ledger reconciliation found %d drifted inventory rows", len(rows))
+        if rows and repair:
+            report['repaired'] = StockLedgerService.true_up(db)
+            db.commit()
+        return report
+
+    @staticmethod
+    def _filters(branch_id, business_id, product_ids) -> list:
+        """Filters on ``branch_id`` / ``product_id`` applied to ledger and snapshots."""
+        filters = []
+        if branch_id is not None:
+            filters.append(('branch_id', [branch_id]))
+        if business_id is not None:
+            filters.append(('branch_id', select(Branch.__table__.c.id).where(
+                Branch.__table__.c.business_id == business_id
+            ).scalar_subquery()))
+        if product_ids is not None:
+            filters.append(('product_id', list(product_ids)))
+        return filters
+
+    @staticmethod
+    def _apply(table, filters):
+        return [table.c[column].in_(values) for column, values in filters]
+
+    @staticmethod
+    def _balance_parts(at: Optional[datetime], filters):
+        """
+        Build the two halves of a ledger balance as subqueries:
+
+        ``base``: the latest snapshot per key (as of ``at``)
+        ``tail``: the sum of entries after that snapshot (up to ``at``)
+        """
+        snapshots = StockSnapshot.__table__
+        ledger = StockLedgerEntry.__table__
+
+        latest = select(
+            snapshots.c.branch_id,
+            snapshots.c.product_id,
+            func.max(snapshots.c.ledger_id).label('ledger_id')
+        ).where(*StockLedgerService._apply(snapshots, filters))
+        if at is not None:
+            latest = latest.where(snapshots.c.as_of <= at)
+        latest = latest.group_by(snapshots.c.branch_id, snapshots.c.product_id).subquery()
+
+        base = (
+            select(snapshots.c.branch_id, snapshots.c.product_id, snapshots.c.ledger_id, snapshots.c.quantity)
+            .join(latest, and_(
+                latest.c.branch_id == snapshots.c.branch_id,
+                latest.c.product_id == snapshots.c.product_id,
+                latest.c.ledger_id == snapshots.c.ledger_id
+            ))
+            .subquery()
+        )
+
+        tail = (
+            select(ledger.c.branch_id, ledger.c.product_id, func.sum(ledger.c.delta).label('delta'))
+            .select_from(ledger.outerjoin(base, and_(
+                base.c.branch_id == ledger.c.branch_id,
+                base.c.product_id == ledger.c.product_id
+            )))
+            .where(ledger.c.id > func.coalesce(base.c.ledger_id, 0))
+            .where(*StockLedgerService._apply(ledger, filters))
+        )
+        if at is not None:
+            tail = tail.where(ledger.c.created_at <= at)
+        tail = tail.group_by(ledger.c.branch_id, ledger.c.product_id).subquery()
+        return base, tail
+
+    @staticmethod
+    def _drift_query(keys: Optional[Iterable[BranchProduct]]):
+        """Inventory rows whose quantity differs from their current ledger balance."""
+        inventory = Inventory.__table__
+        filters = []
+        if keys is not None:
+            keys = list(keys)
+            filters = [('product_id', sorted({product_id for _, product_id in keys}))]
+        base, tail = StockLedgerService._balance_parts(None, filters)
+
+        quantity = func.coalesce(inventory.c.quantity, 0)
+        balance = func.coalesce(base.c.quantity, 0) + func.coalesce(tail.c.delta, 0)
+        query = (
+            select(
+                inventory.c.branch_id,
+                inventory.c.product_id,
+                quantity.label('quantity'),
+                (quantity - balance).label('difference')
+            )
+            .select_from(
+                inventory
+                .outerjoin(base, and_(
+                    base.c.branch_id == inventory.c.branch_id,
+                    base.c.product_id == inventory.c.product_id
+                ))
+                .outerjoin(tail, and_(
+                    tail.c.branch_id == inventory.c.branch_id,
+                    tail.c.product_id == inventory.c.product_id
+                ))
+            )
+            .where(quantity != balance)
+        )
+        if keys is not None:
+            if not keys:
+                return query.where(false())
+            query = query.where(tuple_(inventory.c.branch_id, inventory.c.product_id).in_(keys))
+        return query
@@ -0,0 +1,390 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import and_, bindparam, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from ..core.exceptions import InsufficientStockException, NotFoundException
+from ..core.scan_index import ScanIndex
+from ..models.inventory import Inventory, BranchInventory
+from ..models.product import Product, ProductVariant
+from .stock_ledger_service import StockLedgerService
+
+StockKey = Tuple[int, ...]
+StockChanges = Union[Mapping[Union[StockKey, int], int], Iterable[Tuple[Union[StockKey, int], int]]]
+
+# Tables that hold on-hand quantities: default key columns and quantity column.
+# When one unit of work touches several of them, apply changes in this order so
+# that concurrent requests always acquire row locks in the same sequence.
+# Inventory changes also update ``products.total_stock``, so inventory comes first.
+STOCK_TARGETS = {
+    Inventory: (('branch_id', 'product_id'), 'quantity'),
+    BranchInventory: (('branch_id', 'product_id'), 'quantity'),
+    Product: (('id',), 'quantity'),
+    ProductVariant: (('id',), 'stock'),
+}
+
+class StockService:
+    """
+    Atomic stock engine.
+
+    Quantities are never read into Python, modified and written back. Every
+    change is applied as a conditional set-based statement
+    (``UPDATE ... SET quantity = quantity - :n WHERE quantity >= :n``), rows are
+    locked in sorted key order, and a whole basket is applied with a fixed
+    number of statements regardless of its size.
+
+    The engine does not commit. If it raises, the caller must roll back the
+    session, since part of a batch may already have been applied.
+    """
+
+    @staticmethod
+    def aggregate(changes: StockChanges) -> Dict[StockKey, int]:
+        """
+        Merge stock changes into one signed delta per key.
+
+        Args:
+            changes: Mapping or iterable of ``(key, delta)`` pairs. Keys may be
+                tuples or, for single-column keys, plain ints.
+
+        Returns:
+            dict: Non-zero deltas keyed by tuple
+        """
+        items = changes.items() if isinstance(changes, Mapping) else changes
+        deltas = defaultdict(int)
+        for key, delta in items:
+            deltas[key if isinstance(key, tuple) else (key,)] += int(delta)
+        return {key: delta for key, delta in deltas.items() if delta}
+
+    @staticmethod
+    def apply_changes(
+        db: Session,
+        changes: StockChanges,
+        *,
+        model=Inventory,
+        key_columns: Optional[Sequence[str]] = None,
+        create_missing: bool = False,
+        row_defaults: Optional[Mapping[StockKey, dict]] = None,
+        ledger: Optional[Mapping[str, Any]] = None
+    ) -> Dict[StockKey, int]:
+        """
+        Apply a batch of stock changes atomically.
+
+        Changes to ``Inventory`` are also appended to the stock ledger in the
+        same transaction, and their per-product sum is added to
+        ``Product.total_stock``.
+
+        Args:
+            db: Database session
+            changes: Signed quantity deltas keyed by stock key
+            model: Stock table to update (one of ``STOCK_TARGETS``)
+            key_columns: Override the default key columns, e.g. ``('id',)``
+            create_missing: Insert rows for positive deltas on unknown keys
+            row_defaults: Extra column values for rows created by ``create_missing``
+            ledger: Ledger entry fields (``entry_type``, ``reference_type``,
+                ``reference_id``, ``created_by``) for ``Inventory`` changes
+
+        Returns:
+            dict: New on-hand quantity per key
+
+        Raises:
+            InsufficientStockException: A decrement would take a row below zero
+            NotFoundException: A key does not exist and cannot be created
+        """
+        deltas = StockService.aggregate(changes)
+        if not deltas:
+            return {}
+
+        default_keys, quantity_column = STOCK_TARGETS[model]
+        key_columns = tuple(key_columns or default_keys)
+        table = model.__table__
+        key_cols = [table.c[name] for name in key_columns]
+        quantity = func.coalesce(table.c[quantity_column], 0)
+        keys = sorted(deltas)
+
+        # Lock every affected row up front, in key order, so crossing baskets
+        # and transfers cannot deadlock each other.
+        locked = StockService._lock_rows(db, table, key_cols, quantity, keys)
+
+        shortages = []
+        missing = []
+        for key in keys:
+            delta = deltas[key]
+            if key not in locked:
+                if delta < 0:
+                    shortages.append({'key': key, 'requested': -delta, 'available': 0})
+                elif not create_missing:
+                    raise NotFoundException(model.__name__, key if len(key) > 1 else key[0])
+                else:
+                    missing.append(key)
+            elif delta < 0 and locked[key] < -delta:
+                shortages.append({'key': key, 'requested': -delta, 'available': locked[key]})
+        if shortages:
+            raise InsufficientStockException(shortages)
+
+        # Increments only need the row to exist; ``min(0, level)`` keeps rows
+        # that are already negative (legacy data) updatable.
+        params = [
+            dict(
+                zip(['k_' + name for name in key_columns], key),
+                delta=deltas[key],
+                need=-deltas[key] if deltas[key] < 0 else min(0, locked[key])
+            )
+            for key in keys if key in locked
+        ]
+        if params:
+            stmt = (
+                table.update()
+                .where(and_(*[col == bindparam('k_' + col.name) for col in key_cols]))
+                .where(quantity >= bindparam('need'))
+                .values({quantity_column: quantity + bindparam('delta')})
+            )
+            StockService._execute_guarded(db, stmt, params, model=model, key_columns=key_columns)
+
+        if missing:
+            row_defaults = row_defaults or {}
+            # executemany needs the same columns in every row
+            inserts = defaultdict(list)
+            for key in missing:
+                row = dict(row_defaults.get(key, {}), **dict(zip(key_columns, key)), **{quantity_column: deltas[key]})
+                inserts[tuple(sorted(row))].append(row)
+            for rows in inserts.values():
+                db.execute(table.insert(), rows)
+
+        if model is Inventory:
+            by_branch_product = StockService._by_branch_product(db, deltas, key_columns)
+            StockLedgerService.record(db, by_branch_product, **(ledger or {}))
+            StockService._bump_total_stock(db, by_branch_product)
+            ScanIndex.mark_changed(db, product_ids={product_id for _, product_id in by_branch_product})
+        elif model is Product:
+            ScanIndex.mark_changed(db, product_ids=[key[0] for key in keys] if key_columns == ('id',) else (),
+                                   everything=key_columns != ('id',))
+        elif model is ProductVariant:
+            ScanIndex.mark_changed(db, variant_ids=[key[0] for key in keys] if key_columns == ('id',) else (),
+                                   everything=key_columns != ('id',))
+
+        return StockService.get_levels(db, keys, model=model, key_columns=key_columns)
+
+    @staticmethod
+    def get_levels(
+        db: Session,
+        keys: Iterable[Union[StockKey, int]],
+        *,
+        model=Inventory,
+        key_columns: Optional[Sequence[str]] = None
+    ) -> Dict[StockKey, int]:
+        """
+        Read current quantities for many keys in one query.
+
+        Args:
+            db: Database session
+            keys: Stock keys to read
+            model: Stock table (one of ``STOCK_TARGETS``)
+            key_columns: Override the default key columns
+
+        Returns:
+            dict: On-hand quantity per existing key
+        """
+        default_keys, quantity_column = STOCK_TARGETS[model]
+        table = model.__table__
+        key_cols = [table.c[name] for name in (key_columns or default_keys)]
+        keys = [key if isinstance(key, tuple) else (key,) for key in keys]
+        if not keys:
+            return {}
+        rows = db.execute(
+            select(*key_cols, func.coalesce(table.c[quantity_column], 0))
+            .where(StockService._key_filter(key_cols, keys))
+        ).all()
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    @staticmethod
+    def _key_filter(key_cols, keys):
+        if len(key_cols) == 1:
+            return key_cols[0].in_([key[0] for key in keys])
+        return tuple_(*key_cols).in_(keys)
+
+    @staticmethod
+    def _lock_rows(db: Session, table, key_cols, quantity, keys) -> Dict[StockKey, int]:
+        """SELECT ... FOR UPDATE the affected rows in key order."""
+        rows = db.execute(
+            select(*key_cols, quantity)
+            .where(StockService._key_filter(key_cols, keys))
+            .order_by(*key_cols, *table.primary_key.columns)
+            .with_for_update()
+        ).all()
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    @staticmethod
+    def lock_levels(
+        db: Session,
+        keys: Iterable[Union[StockKey, int]],
+        *,
+        model=Inventory,
+        key_columns: Optional[Sequence[str]] = None
+    ) -> Dict[StockKey, int]:
+        """
+        Lock rows (``SELECT ... FOR UPDATE`` in key order) and read their quantities.
+
+        Lets a caller decide which changes are feasible before applying them;
+        ``apply_changes`` on the same keys in the same transaction re-uses the locks.
+
+        Returns:
+            dict: On-hand quantity per existing key
+        """
+        default_keys, quantity_column = STOCK_TARGETS[model]
+        table = model.__table__
+        key_cols = [table.c[name] for name in (key_columns or default_keys)]
+        keys = sorted({key if isinstance(key, tuple) else (key,) for key in keys})
+        if not keys:
+            return {}
+        quantity = func.coalesce(table.c[quantity_column], 0)
+        return StockService._lock_rows(db, table, key_cols, quantity, keys)
+
+    @staticmethod
+    def get_product_stock(
+        db: Session,
+        product_ids: Iterable[int],
+        *,
+        branch_id: Optional[int] = None
+    ) -> Dict[int, int]:
+        """
+        Branch inventory summed per product, for many products in one grouped query.
+
+        Args:
+            db: Database session
+            product_ids: Products to look up
+            branch_id: Only count stock held at this branch
+
+        Returns:
+            dict: Quantity per product ID (0 for products without inventory)
+        """
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        table = Inventory.__table__
+        query = (
+            select(table.c.product_id, func.coalesce(func.sum(table.c.quantity), 0))
+            .where(table.c.product_id.in_(product_ids))
+            .group_by(table.c.product_id)
+        )
+        if branch_id is not None:
+            query = query.where(table.c.branch_id == branch_id)
+        levels = dict.fromkeys(product_ids, 0)
+        levels.update(db.execute(query).all())
+        return levels
+
+    @staticmethod
+    def get_branch_stock(db: Session, product_ids: Iterable[int]) -> Dict[int, Dict[int, int]]:
+        """
+        Per-branch inventory for many products in one query.
+
+        Returns:
+            dict: ``{product_id: {branch_id: quantity}}``
+        """
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        table = Inventory.__table__
+        levels = {product_id: {} for product_id in product_ids}
+        for product_id, branch_id, quantity in db.execute(
+            select(table.c.product_id, table.c.branch_id, func.coalesce(table.c.quantity, 0))
+            .where(table.c.product_id.in_(product_ids))
+        ):
+            levels[product_id][branch_id] = quantity
+        return levels
+
+    @staticmethod
+    def refresh_total_stock(db: Session, product_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Recompute ``Product.total_stock`` from inventory with one UPDATE.
+
+        Needed after writes that set inventory quantities directly instead of
+        going through ``apply_changes``. Does not commit.
+
+        Args:
+            db: Database session
+            product_ids: Products to refresh; all products if omitted
+
+        Returns:
+            int: Number of products updated
+        """
+        products = Product.__table__
+        inventory = Inventory.__table__
+        total = (
+            select(func.coalesce(func.sum(inventory.c.quantity), 0))
+            .where(inventory.c.product_id == products.c.id)
+            .scalar_subquery()
+        )
+        stmt = products.update().values(total_stock=total)
+        if product_ids is not None:
+            product_ids = sorted(set(product_ids))
+            if not product_ids:
+                return 0
+            stmt = stmt.where(products.c.id.in_(product_ids))
+        ScanIndex.mark_changed(db, product_ids=product_ids or (), everything=product_ids is None)
+        return db.execute(stmt).rowcount
+
+    @staticmethod
+    def _by_branch_product(db: Session, deltas: Dict[StockKey, int], key_columns) -> Dict[Tuple[int, int], int]:
+        """Re-key inventory deltas by (branch_id, product_id)."""
+        if key_columns == ('branch_id', 'product_id'):
+            return deltas
+        table = Inventory.__table__
+        key_cols = [table.c[name] for name in key_columns]
+        rows = db.execute(
+            select(*key_cols, table.c.branch_id, table.c.product_id)
+            .where(StockService._key_filter(key_cols, list(deltas)))
+        ).all()
+        by_branch_product = defaultdict(int)
+        for row in rows:
+            by_branch_product[tuple(row[-2:])] += deltas[tuple(row[:-2])]
+        return by_branch_product
+
+    @staticmethod
+    def _bump_total_stock(db: Session, by_branch_product: Mapping[Tuple[int, int], int]) -> None:
+        """Apply inventory deltas to ``Product.total_stock`` (in product order)."""
+        per_product = defaultdict(int)
+        for (_, product_id), delta in by_branch_product.items():
+            per_product[product_id] += delta
+        params = [{'pid': pid, 'delta': delta} for pid, delta in sorted(per_product.items()) if delta]
+        if params:
+            products = Product.__table__
+            db.execute(
+                products.update()
+                .where(products.c.id == bindparam('pid'))
+                .values(total_stock=func.coalesce(products.c.total_stock, 0) + bindparam('delta')),
+                params
+            )
+
+    @staticmethod
+    def _execute_guarded(db: Session, stmt, params: list, *, model, key_columns) -> None:
+        """
+        Run the conditional UPDATE for every line and verify each one matched.
+
+        Uses a single executemany when the driver reports reliable row counts
+        for it, otherwise falls back to one statement per line.
+        """
+        dialect = db.get_bind().dialect
+        if dialect.supports_sane_multi_rowcount:
+            result = db.execute(stmt, params)
+            if result.rowcount == len(params):
+                return
+            failed = params
+        else:
+            failed = [line for line in params if db.execute(stmt, line).rowcount != 1]
+            if not failed:
+                return
+
+        # Another writer got between the lock and the update (only possible on
+        # backends without row locks, e.g. SQLite); report the current levels.
+        needs = {
+            tuple(line['k_' + name] for name in key_columns): line['need'] for line in failed
+        }
+        levels = StockService.get_levels(db, needs, model=model, key_columns=key_columns)
+        raise InsufficientStockException([
+            {'key': key, 'requested': need, 'available': levels.get(key, 0)}
+            for key, need in needs.items() if levels.get(key, 0) < need
+        ] or [
+            {'key': key, 'requested': need, 'available': levels.get(key, 0)}
+            for key, need in needs.items()
+        ])
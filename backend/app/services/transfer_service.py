@@ -0,0 +1,236 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from ..core.exceptions import InsufficientStockException, ValidationException
+from ..models.inventory import Inventory, BranchInventory, InventoryTransfer, StockMovement
+from .batch_service import BatchService
+from .stock_service import StockService
+
+# Columns copied from the source row when a transfer creates the target row.
+TARGET_DEFAULT_COLUMNS = {
+    Inventory: ('minimum_stock', 'maximum_stock', 'reorder_point', 'reorder_quantity'),
+    BranchInventory: ('min_stock_level', 'max_stock_level'),
+}
+
+class TransferService:
+    """
+    Batch stock transfers between branches.
+
+    A batch moves any number of (source branch, target branch, product, quantity)
+    lines in one transaction: every source and target row is locked once in
+    sorted key order, the stock changes are applied with the stock engine, and
+    the ``InventoryTransfer`` and ``StockMovement`` records are written with
+    bulk inserts. ``Inventory`` transfers also move the picked batches, first
+    expiry first out, so batch totals follow the stock.
+    """
+
+    @staticmethod
+    def transfer_batch(
+        db: Session,
+        lines: Sequence[Mapping[str, int]],
+        *,
+        requested_by: int,
+        model=Inventory,
+        allow_partial: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Move stock for many products between branches and commit.
+
+        Args:
+            db: Database session
+            lines: Dicts with ``source_branch_id``, ``target_branch_id``,
+                ``product_id`` and ``quantity``
+            requested_by: User performing the transfer
+            model: Stock table, ``Inventory`` or ``BranchInventory``
+            allow_partial: Move the lines that have stock and report the rest
+                instead of rejecting the whole batch
+
+        Returns:
+            dict: ``transferred`` and ``failed`` counts and a result per line
+
+        Raises:
+            ValidationException: A line is malformed
+            InsufficientStockException: Some line lacks stock and ``allow_partial`` is off
+        """
+        for index, line in enumerate(lines):
+            if line['quantity'] <= 0:
+                raise ValidationException(f"Line {index}: quantity must be positive")
+            if line['source_branch_id'] == line['target_branch_id']:
+                raise ValidationException(f"Line {index}: source and target branch are the same")
+
+        results = [
+            {
+                'line': index,
+                'source_branch_id': line['source_branch_id'],
+                'target_branch_id': line['target_branch_id'],
+                'product_id': line['product_id'],
+                'quantity': line['quantity'],
+                'status': 'completed',
+                'transfer_id': None,
+                'error': None,
+            }
+            for index, line in enumerate(lines)
+        ]
+        if not results:
+            return {'transferred': 0, 'failed': 0, 'lines': []}
+
+        try:
+            accepted = TransferService._reserve(db, results, model=model, allow_partial=allow_partial)
+            if accepted:
+                TransferService._move(db, accepted, model=model, requested_by=requested_by)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        transferred = sum(1 for result in results if result['status'] == 'completed')
+        return {'transferred': transferred, 'failed': len(results) - transferred, 'lines': results}
+
+    @staticmethod
+    def _reserve(db: Session, results: List[dict], *, model, allow_partial: bool) -> List[dict]:
+        """Lock every affected row and decide which lines can be moved."""
+        keys = set()
+        for result in results:
+            keys.add((result['source_branch_id'], result['product_id']))
+            keys.add((result['target_branch_id'], result['product_id']))
+        levels = StockService.lock_levels(db, keys, model=model)
+
+        if not allow_partial:
+            return results
+
+        # Lines are considered in request order; stock received by an earlier
+        # line is available to later ones.
+        available = defaultdict(int, levels)
+        accepted = []
+        for result in results:
+            source = (result['source_branch_id'], result['product_id'])
+            target = (result['target_branch_id'], result['product_id'])
+            if available[source] < result['quantity']:
+                result['status'] = 'failed'
+                result['error'] = f"Insufficient stock (available {available[source]})"
+                continue
+            available[source] -= result['quantity']
+            available[target] += result['quantity']
+            accepted.append(result)
+        return accepted
+
+    @staticmethod
+    def _move(db: Session, lines: List[dict], *, model, requested_by: int) -> None:
+        """Apply the stock changes and write transfer and movement records."""
+        table = model.__table__
+        changes = []
+        for line in lines:
+            changes.append(((line['source_branch_id'], line['product_id']), -line['quantity']))
+            changes.append(((line['target_branch_id'], line['product_id']), line['quantity']))
+
+        sources = {(line['source_branch_id'], line['product_id']) for line in lines}
+        default_columns = TARGET_DEFAULT_COLUMNS[model]
+        settings = {
+            tuple(row[:2]): dict(zip(default_columns, row[2:]))
+            for row in db.execute(
+                select(table.c.branch_id, table.c.product_id, *[table.c[name] for name in default_columns])
+                .where(tuple_(table.c.branch_id, table.c.product_id).in_(sorted(sources)))
+            )
+        }
+        row_defaults = {
+            (line['target_branch_id'], line['product_id']):
+                settings.get((line['source_branch_id'], line['product_id']), {})
+            for line in lines
+        }
+
+        # Raises InsufficientStockException with every short line when the
+        # batch is all-or-nothing.
+        StockService.apply_changes(
+            db, changes, model=model, create_missing=True, row_defaults=row_defaults,
+            ledger={'entry_type': 'transfer', 'reference_type': 'transfer', 'created_by': requested_by}
+        )
+
+        transfers = InventoryTransfer.__table__
+        ids = db.execute(
+            transfers.insert().returning(transfers.c.id, sort_by_parameter_order=True),
+            [
+                {
+                    'source_branch_id': line['source_branch_id'],
+                    'target_branch_id': line['target_branch_id'],
+                    'product_id': line['product_id'],
+                    'quantity': line['quantity'],
+                    'status': 'completed',
+                    'requested_by': requested_by,
+                    'approved_by': requested_by,
+                }
+                for line in lines
+            ]
+        ).scalars().all()
+        for line, transfer_id in zip(lines, ids):
+            line['transfer_id'] = transfer_id
+
+        if model is Inventory:
+            BatchService.move(db, lines, created_by=requested_by)
+            TransferService._record_movements(db, lines, requested_by)
+
+    @staticmethod
+    def _record_movements(db: Session, lines: List[dict], requested_by: int) -> None:
+        """Write an outgoing and an incoming ``StockMovement`` per line."""
+        table = Inventory.__table__
+        keys = set()
+        for line in lines:
+            keys.add((line['source_branch_id'], line['product_id']))
+            keys.add((line['target_branch_id'], line['product_id']))
+        inventory_ids = {
+            tuple(row[:2]): row[2]
+            for row in db.execute(
+                select(table.c.branch_id, table.c.product_id, table.c.id)
+                .where(tuple_(table.c.branch_id, table.c.product_id).in_(sorted(keys)))
+            )
+        }
+
+        movements = []
+        for line in lines:
+            reference = f"TRF-{line['transfer_id']}"
+            movements.append({
+                'inventory_id': inventory_ids[(line['source_branch_id'], line['product_id'])],
+                'quantity': line['quantity'],
+                'movement_type': 'transfer',
+                'reference': reference,
+                'notes': f"Transfer to branch {line['target_branch_id']}",
+                'created_by': requested_by,
+            })
+            movements.append({
+                'inventory_id': inventory_ids[(line['target_branch_id'], line['product_id'])],
+                'quantity': line['quantity'],
+                'movement_type': 'transfer',
+                'reference': reference,
+                'notes': f"Transfer from branch {line['source_branch_id']}",
+                'created_by': requested_by,
+            })
+        db.execute(StockMovement.__table__.insert(), movements)
+
+    @staticmethod
+    def shortage_results(lines: Sequence[Mapping[str, int]], error: InsufficientStockException) -> List[dict]:
+        """
+        Map an all-or-nothing batch failure back to the request lines.
+
+        Returns:
+            list: One entry per line with ``status`` ``failed`` for short sources
+        """
+        short = {shortage['key']: shortage for shortage in error.shortages}
+        results = []
+        for index, line in enumerate(lines):
+            shortage = short.get((line['source_branch_id'], line['product_id']))
+            results.append({
+                'line': index,
+                'source_branch_id': line['source_branch_id'],
+                'target_branch_id': line['target_branch_id'],
+                'product_id': line['product_id'],
+                'quantity': line['quantity'],
+                'status': 'failed' if shortage else 'not_attempted',
+                'transfer_id': None,
+                'error': (
+                    f"Insufficient stock (requested {shortage['requested']}, available {shortage['available']})"
+                    if shortage else None
+                ),
+            })
+        return results
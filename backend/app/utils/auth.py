@@ -1,11 +1,13 @@
 from itsdangerous import URLSafeTimedSerializer
 from fastapi import Depends, HTTPException, status, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.config import get_settings
 from app.models import User
-from ..extensions import get_db
+from ..extensions import get_async_db, get_db
 from app.core.security import verify_token  # Import from security module instead of main
 
 # Initialize settings
@@ -45,6 +47,53 @@ def get_token_from_header(request: Request) -> str:
     
     return token
 
+def get_user_id_from_token(request: Request) -> str:
+    """Verify the bearer token of the request and return its subject."""
+    # Get the token from the authorization header
+    token = get_token_from_header(request)
+    
+    # Verify the token
+    payload = verify_token(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # Get the user ID from the token
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token payload",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_id
+
+def check_active_user(user: Optional[User]) -> User:
+    """Reject a missing or disabled user."""
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User account is disabled"
+        )
+    
+    return user
+
+def authentication_error(e: Exception) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=f"Authentication error: {str(e)}",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 async def get_current_user(
     request: Request,
     db: Session = Depends(get_db)
@@ -54,52 +103,35 @@ async def get_current_user(
     This function requires a valid JWT token.
     """
     try:
-        # Get the token from the authorization header
-        token = get_token_from_header(request)
-        
-        # Verify the token
-        payload = verify_token(token)
-        if payload is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # Get the user ID from the token
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token payload",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        user_id = get_user_id_from_token(request)
         
         # Query the user from the database
-        user = db.query(User).filter(User.id == user_id).first()
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        if not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="User account is disabled"
-            )
+        return check_active_user(db.query(User).filter(User.id == user_id).first())
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise authentication_error(e)
+
+async def get_current_user_async(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """
+    Get the current user from the JWT token through the AsyncSession.
+    Use it with get_async_db so the user belongs to the handler's session.
+    """
+    try:
+        user_id = get_user_id_from_token(request)
         
-        return user
+        # Query the user from the database without blocking the event loop
+        result = await db.execute(select(User).where(User.id == int(user_id)))
+        return check_active_user(result.scalars().first())
     
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Authentication error: {str(e)}",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise authentication_error(e)
 
 async def get_optional_user(
     request: Request,
@@ -1,7 +1,279 @@
-def save_image(file, destination):
-    """Stub for saving an image. Returns a dummy filename."""
-    return "dummy.jpg"
+"""
+Image uploads: streamed to disk, stored by content and resized off the event loop.
 
-def delete_image(filename, directory):
-    """Stub for deleting an image. Does nothing."""
-    pass 
\ No newline at end of file
+An upload is copied in chunks to a temporary file while it is hashed, then
+processed in a process pool (decoded once, rotated upright, saved as a
+full-size WebP and a WebP thumbnail per ``IMAGE_THUMBNAIL_SIZES``). Files
+are stored under ``UPLOAD_DIR/IMAGE_DIR/<aa>/<sha256>/``, so uploading the
+same bytes twice stores and processes them once, and a file's URL never
+changes content, which lets ``ImageFiles`` serve it as immutable.
+"""
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.staticfiles import StaticFiles
+
+from ..core.config import settings
+
+_CHUNK_SIZE = 1024 * 1024
+_DIGEST = re.compile(r'[0-9a-f]{64}')
+_executor: Optional[ProcessPoolExecutor] = None
+_pending: Dict[str, 'asyncio.Future[dict]'] = {}  # Digest -> processing in flight
+
+class InvalidImage(ValueError):
+    """The upload is too large or not an image that can be decoded."""
+
+class StoredImage(NamedTuple):
+    digest: str
+    filename: str  # Full-size WebP, relative to UPLOAD_DIR
+    url: str
+    thumbnails: Dict[int, str]  # Longest side -> URL
+    width: int
+    height: int
+
+def image_root() -> str:
+    """Directory holding the content-addressed images."""
+    return os.path.join(settings.UPLOAD_DIR, settings.IMAGE_DIR)
+
+async def save_image(file: UploadFile) -> StoredImage:
+    """
+    Store an uploaded image and its thumbnails.
+
+    Args:
+        file: Uploaded file
+
+    Returns:
+        StoredImage: Where the full-size image and thumbnails are served
+
+    Raises:
+        InvalidImage: If the file exceeds MAX_UPLOAD_SIZE or is not a readable image
+    """
+    root = image_root()
+    path, digest = await run_in_threadpool(_spool, file.file, root, settings.MAX_UPLOAD_SIZE)
+    try:
+        directory = os.path.join(root, digest[:2], digest)
+        meta = await run_in_threadpool(_read_meta, directory)
+        if meta is None:
+            # Concurrent uploads of the same content wait for one processing run
+            pending = _pending.get(digest)
+            if pending is None:
+                pending = asyncio.get_running_loop().run_in_executor(
+                    _get_executor(), process_image, path, directory, tuple(settings.IMAGE_THUMBNAIL_SIZES),
+                    settings.IMAGE_MAX_DIMENSION, settings.IMAGE_WEBP_QUALITY, settings.IMAGE_MAX_PIXELS
+                )
+                _pending[digest] = pending
+                pending.add_done_callback(lambda _: _pending.pop(digest, None))
+            meta = await asyncio.shield(pending)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return _stored(digest, meta)
+
+async def ensure_image(file: UploadFile, stored: StoredImage) -> None:
+    """
+    Store an image again if its files were removed before its row was committed.
+
+    Identical uploads share their files, so ``delete_image`` for another row
+    can remove them between ``save_image`` and the commit of the row that
+    refers to ``stored``. Call this after that commit.
+
+    Args:
+        file: Uploaded file ``stored`` was saved from
+        stored: Result of ``save_image``
+    """
+    directory = os.path.join(image_root(), stored.digest[:2], stored.digest)
+    if await run_in_threadpool(_read_meta, directory) is None:
+        await save_image(file)
+
+def delete_image(db: Session, filename: str) -> bool:
+    """
+    Remove an image's files once no product image or avatar refers to them.
+
+    Identical uploads share their files, so call this after the referring
+    row has been deleted and committed. The files are moved aside before the
+    references are checked again, so a row committed meanwhile keeps them;
+    a row committed afterwards is covered by ``ensure_image``.
+
+    Args:
+        db: Database session
+        filename: ``StoredImage.filename`` of the image
+
+    Returns:
+        bool: Whether the files were removed
+    """
+    # Imported here to keep the models out of the image worker processes
+    from ..models import ProductImage, User
+
+    digest = _digest_of(filename)
+    if digest is None:
+        return False
+
+    def in_use() -> bool:
+        return bool(
+            db.query(ProductImage.id).filter(ProductImage.filename.like(f'%{digest}%')).first() or
+            db.query(User.id).filter(User.profile_image.like(f'%{digest}%')).first()
+        )
+
+    if in_use():
+        return False
+    directory = os.path.join(image_root(), digest[:2], digest)
+    removed = f'{directory}.{uuid.uuid4().hex}.deleted'
+    try:
+        os.rename(directory, removed)
+    except OSError:
+        return False  # Already removed
+    if in_use():
+        # The same content was uploaded and committed meanwhile
+        try:
+            os.rename(removed, directory)
+            return False
+        except OSError:
+            pass  # Stored again concurrently
+    shutil.rmtree(removed, ignore_errors=True)
+    return True
+
+def shutdown_image_workers() -> None:
+    """Stop the image worker processes."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+class ImageFiles(StaticFiles):
+    """Static files for content-addressed images, cacheable for a year."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+def process_image(
+    source: str,
+    directory: str,
+    sizes: Tuple[int, ...],
+    max_dimension: int,
+    quality: int,
+    max_pixels: int
+) -> dict:
+    """
+    Decode an image and write its renditions to ``directory``. Runs in a worker process.
+
+    The renditions are written to a staging directory that is renamed into
+    place, so a half-written image is never served; if the same content was
+    stored concurrently, the first rename wins.
+
+    Returns:
+        dict: ``width``, ``height`` of the full-size image, ``format`` of the original and the thumbnail ``sizes``
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(source) as original:
+            if original.width * original.height > max_pixels:
+                raise InvalidImage(f"Image is larger than {max_pixels} pixels")
+            image_format = (original.format or 'unknown').lower()
+            original.draft('RGB', (max_dimension, max_dimension))  # JPEG: decode at a reduced scale
+            image = ImageOps.exif_transpose(original)
+            image = image.convert(
+                'RGBA' if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info else 'RGB'
+            )
+    except InvalidImage:
+        raise
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise InvalidImage("Not a readable image")
+
+    staging = f'{directory}.{uuid.uuid4().hex}'
+    os.makedirs(staging)
+    try:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        image.save(os.path.join(staging, 'full.webp'), 'WEBP', quality=quality, method=4)
+        # Each thumbnail is reduced from the next larger one
+        thumbnail = image
+        for size in sorted(sizes, reverse=True):
+            thumbnail = thumbnail.copy()
+            thumbnail.thumbnail((size, size), Image.LANCZOS)
+            thumbnail.save(os.path.join(staging, f'{size}.webp'), 'WEBP', quality=quality, method=4)
+        os.replace(source, os.path.join(staging, f'original.{image_format}'))
+        meta = {'width': image.width, 'height': image.height, 'format': image_format, 'sizes': sorted(sizes)}
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            if _read_meta(directory) is None:
+                raise
+            shutil.rmtree(staging, ignore_errors=True)  # Stored concurrently
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return meta
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: forking a server that runs threads can copy held locks into the child
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS or os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _executor
+
+def _spool(fileobj: BinaryIO, root: str, max_size: int) -> Tuple[str, str]:
+    """Copy an upload to a temporary file under ``root``; returns its path and SHA-256."""
+    temp_dir = os.path.join(root, 'tmp')
+    os.makedirs(temp_dir, exist_ok=True)
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    out = tempfile.NamedTemporaryFile(dir=temp_dir, delete=False)
+    try:
+        with out:
+            while True:
+                chunk = fileobj.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise InvalidImage(f"Image is larger than {max_size} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(out.name)
+        raise
+    return out.name, digest.hexdigest()
+
+def _read_meta(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _stored(digest: str, meta: dict) -> StoredImage:
+    relative = '/'.join([settings.IMAGE_DIR, digest[:2], digest])
+    return StoredImage(
+        digest=digest,
+        filename=f'{relative}/full.webp',
+        url=f'/uploads/{relative}/full.webp',
+        thumbnails={size: f'/uploads/{relative}/{size}.webp' for size in meta['sizes']},
+        width=meta['width'],
+        height=meta['height']
+    )
+
+def _digest_of(filename: str) -> Optional[str]:
+    parts = filename.replace('\\', '/').split('/')
+    return parts[-2] if len(parts) >= 2 and _DIGEST.fullmatch(parts[-2]) else None
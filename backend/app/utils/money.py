@@ -0,0 +1,42 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Union
+
+Number = Union[int, float, str, Decimal]
+
+CENT = Decimal('0.01')
+
+# Rates are carried as integer parts per million of the amount, so a rate
+# of 7.25% is 72500 and applying it is exact integer arithmetic.
+PPM = 1_000_000
+
+def to_decimal(value: Number) -> Decimal:
+    """Money value as a Decimal rounded half-up to the cent."""
+    if isinstance(value, float):
+        value = repr(value)  # Shortest repr, so 0.1 is 0.1 and not 0.1000000000000000055...
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def to_cents(value: Number) -> int:
+    """Money value as integer cents, rounded half-up."""
+    return int(to_decimal(value) * 100)
+
+def from_cents(cents: int) -> Decimal:
+    """Integer cents as a Decimal amount."""
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+def rate_ppm(percent: Number) -> int:
+    """A percentage (e.g. 7.25) as parts per million, rounded half-up."""
+    if isinstance(percent, float):
+        percent = repr(percent)
+    return int((Decimal(percent) * (PPM // 100)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def apply_rate(cents, ppm):
+    """
+    ``cents * ppm / PPM`` rounded half-up, for non-negative amounts.
+
+    Works on ints and on NumPy int64 arrays alike.
+    """
+    return (cents * ppm + PPM // 2) // PPM
+
+def ppm_percent(ppm: int) -> Decimal:
+    """A rate in parts per million as a percentage with four places."""
+    return Decimal(int(ppm)) / (PPM // 100)
@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+from ..core.exceptions import ValidationException
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """
+    Encode a keyset position as an opaque, URL-safe cursor.
+
+    Args:
+        created_at: Creation time of the last row returned
+        id: ID of the last row returned
+
+    Returns:
+        str: Cursor to pass back for the next page
+    """
+    raw = json.dumps([created_at.isoformat(), id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by ``encode_cursor``.
+
+    Args:
+        cursor: Cursor from a previous page
+
+    Returns:
+        tuple: ``(created_at, id)`` of the last row of the previous page
+
+    Raises:
+        ValidationException: The cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        if not isinstance(id, int) or isinstance(id, bool):
+            raise ValueError(id)
+        return datetime.fromisoformat(created_at), id
+    except (ValueError, TypeError):
+        raise ValidationException("Invalid pagination cursor")
+
+def keyset_page(query: Query, model: Any, *, cursor: Optional[str] = None) -> Query:
+    """
+    Order a query newest first on ``(created_at, id)`` and start it after ``cursor``.
+
+    Unlike ``OFFSET``, the cost of a page does not grow with its depth and
+    rows inserted while paging do not shift later pages. Apply ``limit``
+    to the result as usual.
+
+    Args:
+        query: Query over ``model``, with any filters applied
+        model: Mapped class with ``created_at`` and ``id`` columns
+        cursor: Cursor of the previous page; the first page if omitted
+
+    Returns:
+        Query: The ordered query
+    """
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, id))
+    return query.order_by(model.created_at.desc(), model.id.desc())
+
+def next_cursor(items: Sequence[Any], limit: int) -> Optional[str]:
+    """
+    Cursor of the page after ``items``, or None if it was the last page.
+
+    Args:
+        items: Rows of the current page, as returned by a ``keyset_page`` query
+        limit: Page size the rows were fetched with
+
+    Returns:
+        str: Cursor for the next page
+    """
+    if not items or len(items) < limit or items[-1].created_at is None:
+        return None
+    return encode_cursor(items[-1].created_at, items[-1].id)
@@ -0,0 +1,164 @@
+"""
+Concurrent image uploads through the image pipeline.
+
+Serves POST /upload from one in-process app and sends --uploads concurrent
+uploads of generated JPEG photos (--distinct different images, the rest
+re-uploads that are deduplicated by content). Runs twice:
+
+- inline (before): the upload is decoded, resized and encoded on the
+  event loop, so every other request waits behind it, and
+- pool (after): save_image, which resizes in the process pool.
+
+Reports uploads per second, upload latency and the event loop lag: how
+late a 10 ms heartbeat task ran while the uploads were in flight. The lag is
+what other requests on the same worker feel. With one CPU the pool cannot
+add throughput, but it still keeps the loop responsive.
+
+Run this script with:
+    python bench_image_uploads.py
+    python bench_image_uploads.py --uploads 1000 --distinct 200 --width 3000 --height 2000
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI, File, UploadFile
+from PIL import Image, ImageDraw
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.utils import images
+
+def make_photo(seed, width, height):
+    """A JPEG with gradients and shapes, so it compresses like a photo rather than a flat colour."""
+    rng = random.Random(seed)
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    overlay = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    image = Image.blend(image, overlay, 0.5)
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        r = rng.randrange(20, max(width, height) // 6)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=85)
+    return out.getvalue()
+
+def build_app():
+    api = FastAPI()
+
+    @api.post('/upload')
+    async def upload(file: UploadFile = File(...)):
+        stored = await images.save_image(file)
+        return {'url': stored.url}
+
+    # The same work done on the event loop
+    @api.post('/upload-inline')
+    async def upload_inline(file: UploadFile = File(...)):
+        root = images.image_root()
+        path, digest = await run_in_threadpool(images._spool, file.file, root, settings.MAX_UPLOAD_SIZE)
+        directory = os.path.join(root, digest[:2], digest)
+        meta = images._read_meta(directory)
+        if meta is None:
+            meta = images.process_image(
+                path, directory, tuple(settings.IMAGE_THUMBNAIL_SIZES), settings.IMAGE_MAX_DIMENSION,
+                settings.IMAGE_WEBP_QUALITY, settings.IMAGE_MAX_PIXELS
+            )
+        if os.path.exists(path):
+            os.remove(path)
+        return {'url': images._stored(digest, meta).url}
+
+    return api
+
+async def run(api, path, photos, uploads, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, lags = [], []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append((time.perf_counter() - started - 0.01) * 1000)
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=api), base_url='http://bench', timeout=None
+    ) as client:
+        async def one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(path, files={'file': (f'photo{i}.jpg', photos[i % len(photos)], 'image/jpeg')})
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path}: {response.status_code} {response.text[:200]}")
+
+        ticker = asyncio.create_task(heartbeat())
+        started = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(uploads)])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await ticker
+    latencies.sort()
+    lags.sort()
+    return {
+        'rate': uploads / elapsed,
+        'elapsed': elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'lag_p95': lags[int(len(lags) * 0.95) - 1] if lags else 0.0,
+        'lag_max': lags[-1] if lags else 0.0,
+    }
+
+async def warm_up():
+    await asyncio.gather(*[
+        asyncio.get_running_loop().run_in_executor(images._get_executor(), time.sleep, 0.1)
+        for _ in range(settings.IMAGE_WORKERS or os.cpu_count() or 1)
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--uploads', type=int, default=1000)
+    parser.add_argument('--distinct', type=int, default=100, help='Different images among the uploads')
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--width', type=int, default=1600)
+    parser.add_argument('--height', type=int, default=1200)
+    args = parser.parse_args()
+
+    photos = [make_photo(seed, args.width, args.height) for seed in range(args.distinct)]
+    print(f"{args.distinct} distinct {args.width}x{args.height} JPEGs, "
+          f"{statistics.mean(len(photo) for photo in photos) / 1024:.0f} KiB on average; "
+          f"{args.uploads} uploads, {args.concurrency} concurrent, {os.cpu_count()} CPUs")
+
+    api = build_app()
+    results = {}
+    for label, path in (('inline (before)', '/upload-inline'), ('process pool (after)', '/upload')):
+        settings.UPLOAD_DIR = tempfile.mkdtemp()
+        if path == '/upload':
+            # Start the workers before timing, as a running server would have
+            asyncio.run(warm_up())
+        results[label] = asyncio.run(run(api, path, photos, args.uploads, args.concurrency))
+        stored = sum(1 for _, _, files in os.walk(images.image_root()) if 'meta.json' in files)
+        shutil.rmtree(settings.UPLOAD_DIR)
+        result = results[label]
+        print(f"{label:21} {result['rate']:7.1f} uploads/s   p50 {result['p50']:8.1f} ms   p95 {result['p95']:8.1f} ms   "
+              f"loop lag p95 {result['lag_p95']:7.1f} ms   max {result['lag_max']:7.1f} ms   "
+              f"{stored} images stored")
+    images.shutdown_image_workers()
+
+    before, after = results['inline (before)'], results['process pool (after)']
+    print(f"event loop lag p95 {before['lag_p95']:.1f} ms -> {after['lag_p95']:.1f} ms")
+    if after['lag_max'] > before['lag_max']:
+        print("FAILED: uploads block the event loop more with the process pool than inline")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Latency of other requests during a login storm.
+
+Serves POST /login and GET /ping from one in-process app. While --logins
+concurrent logins verify bcrypt passwords, a prober calls /ping every 10 ms
+and records how long after it was due each call completed. Runs twice:
+
+- inline (before): the password is verified on the event loop, as
+  ``User.check_password`` did in the async login route, and
+- pool (after): ``await password_hasher.verify_and_update``, on the
+  hashing threads.
+
+Reports logins per second and /ping p50/p99 latency. The /ping latency is
+what every non-auth request on the same worker feels during the storm.
+
+Run this script with:
+    python bench_login_storm.py
+    python bench_login_storm.py --logins 500 --rounds 12 --workers 2
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from app.core.config import settings
+from app.core.passwords import password_hasher
+
+def build_app(hashed):
+    api = FastAPI()
+
+    @api.post('/login-inline')
+    async def login_inline():
+        if not password_hasher.verify_sync('correct horse', hashed):
+            raise HTTPException(status_code=401)
+        return {'ok': True}
+
+    @api.post('/login')
+    async def login():
+        valid, _ = await password_hasher.verify_and_update('correct horse', hashed)
+        if not valid:
+            raise HTTPException(status_code=401)
+        return {'ok': True}
+
+    @api.get('/ping')
+    async def ping():
+        return {'ok': True}
+
+    return api
+
+async def run(api, path, logins, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    pings = []
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=api), base_url='http://bench', timeout=None
+    ) as client:
+        async def ping(due):
+            await client.get('/ping')
+            pings.append((time.perf_counter() - due) * 1000)
+
+        async def prober():
+            # One ping per 10 ms slot, timed from when the slot was due, so pings that
+            # could not even be sent while the loop was blocked count as late
+            due, sent = time.perf_counter(), []
+            while True:
+                while due <= time.perf_counter():
+                    sent.append(asyncio.create_task(ping(due)))
+                    due += 0.01
+                if done.is_set():
+                    break
+                await asyncio.sleep(due - time.perf_counter())
+            await asyncio.gather(*sent)
+
+        async def one():
+            async with semaphore:
+                response = await client.post(path)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path}: {response.status_code} {response.text[:200]}")
+
+        probe = asyncio.create_task(prober())
+        await asyncio.sleep(0.05)  # Let the prober take a few idle samples first
+        started = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(logins)])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+    pings.sort()
+    return {
+        'rate': logins / elapsed,
+        'pings': len(pings),
+        'p50': statistics.median(pings),
+        'p99': pings[max(int(len(pings) * 0.99) - 1, 0)],
+        'max': pings[-1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50, help='Logins in flight at once')
+    parser.add_argument('--rounds', type=int, default=10, help='bcrypt cost')
+    parser.add_argument('--workers', type=int, default=settings.PASSWORD_HASH_WORKERS, help='Hashing threads')
+    args = parser.parse_args()
+
+    settings.PASSWORD_BCRYPT_ROUNDS = args.rounds
+    settings.PASSWORD_HASH_WORKERS = args.workers
+    # The storm must not be rejected; the queue limit is exercised in production, not here
+    settings.PASSWORD_HASH_QUEUE_LIMIT = args.concurrency
+    hashed = password_hasher.hash_sync('correct horse')
+    started = time.perf_counter()
+    password_hasher.verify_sync('correct horse', hashed)
+    print(f"{args.logins} logins, {args.concurrency} concurrent, bcrypt cost {args.rounds} "
+          f"({(time.perf_counter() - started) * 1000:.0f} ms per verify), "
+          f"{args.workers} hashing threads, {os.cpu_count()} CPUs")
+
+    api = build_app(hashed)
+    results = {}
+    for label, path in (('inline (before)', '/login-inline'), ('hashing pool (after)', '/login')):
+        results[label] = result = asyncio.run(run(api, path, args.logins, args.concurrency))
+        print(f"{label:21} {result['rate']:6.1f} logins/s   /ping p50 {result['p50']:8.1f} ms   "
+              f"p99 {result['p99']:8.1f} ms   max {result['max']:8.1f} ms   ({result['pings']} pings)")
+    password_hasher.shutdown()
+
+    before, after = results['inline (before)'], results['hashing pool (after)']
+    print(f"/ping p99 during the storm {before['p99']:.1f} ms -> {after['p99']:.1f} ms")
+    if after['p99'] > before['p99']:
+        print("FAILED: logins delay other requests more with the hashing pool than inline")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
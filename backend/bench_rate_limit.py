@@ -0,0 +1,116 @@
+"""
+Per-request cost and accuracy of the rate limiter.
+
+Sends --requests requests spread over --clients client IPs through:
+
+- the old middleware's limiter (before), which rebuilt its whole dict of
+  per-IP timestamp lists on every request, so its cost grows with the
+  number of clients,
+- RateLimiter with Redis unreachable (local token buckets), and
+- RateLimiter on Redis, if --redis-url is given: every --workers limiter
+  shares the buckets, as the API workers do.
+
+It then checks that a burst from one client is cut at exactly the limit,
+with the workers sharing it when Redis is used.
+
+Run this script with:
+    python bench_rate_limit.py
+    python bench_rate_limit.py --clients 20000 --requests 50000
+    python bench_rate_limit.py --redis-url redis://localhost:6379/15 --workers 4
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from redis.asyncio import Redis
+
+from app.core.logging import logger
+from app.core.rate_limit import RateLimit, RateLimiter
+
+class OldRateLimiter:
+    """The limiter RateLimitMiddleware used before, minus the HTTP plumbing."""
+
+    def __init__(self, limit, window):
+        self.limit, self.window, self.requests = limit, window, {}
+
+    def is_allowed(self, client_ip):
+        current_time = time.time()
+        self.requests = {
+            ip: times for ip, times in self.requests.items() if current_time - min(times) < self.window
+        }
+        if client_ip in self.requests:
+            if len(self.requests[client_ip]) >= self.limit:
+                return False
+            self.requests[client_ip].append(current_time)
+        else:
+            self.requests[client_ip] = [current_time]
+        return True
+
+async def timed(hit, ips):
+    latencies = []
+    for ip in ips:
+        started = time.perf_counter()
+        await hit(ip)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+    return {'p50': statistics.median(latencies), 'p99': latencies[int(len(latencies) * 0.99) - 1]}
+
+async def burst(limiters, limit, requests):
+    """Requests from one client, round-robin over the limiters; returns how many were allowed."""
+    key = f'ip:burst-{random.random()}'
+    results = await asyncio.gather(*[
+        limiters[i % len(limiters)].hit([(key, limit)]) for i in range(requests)
+    ])
+    return sum(result.allowed for result in results)
+
+async def main(args):
+    limit = RateLimit.parse(args.limit)
+    rng = random.Random(7)
+    ips = [f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}' for n in (rng.randrange(args.clients) for _ in range(args.requests))]
+    print(f"{args.requests} requests from {args.clients} IPs, limit {limit.requests}/{limit.period:g}s")
+
+    old = OldRateLimiter(limit.requests, limit.period)
+    # Nothing listens on port 1, so every Redis call fails and the limiter falls back
+    logger.disabled = True
+    local = RateLimiter(Redis(port=1, socket_connect_timeout=0.05))
+    modes = {
+        'old dict rebuild (before)': lambda ip: asyncio.sleep(0, old.is_allowed(ip)),
+        'local buckets (Redis down)': lambda ip: local.hit([(f'ip:{ip}', limit)]),
+    }
+    workers = []
+    if args.redis_url:
+        workers = [RateLimiter(Redis.from_url(args.redis_url), prefix=f'bench-ratelimit-{time.time()}:')
+                   for _ in range(args.workers)]
+        modes['Redis Lua script'] = lambda ip: workers[0].hit([(f'ip:{ip}', limit)])
+
+    failed = False
+    for label, hit in modes.items():
+        result = await timed(hit, ips)
+        print(f"{label:27} p50 {result['p50']:9.1f} us   p99 {result['p99']:9.1f} us")
+
+    burst_limit = RateLimit(args.burst // 2, 3600)
+    for label, limiters in (('local buckets', [local]), (f'Redis, {args.workers} workers', workers)):
+        if not limiters:
+            continue
+        allowed = await burst(limiters, burst_limit, args.burst)
+        print(f"burst of {args.burst} against {burst_limit.requests}/hour, {label}: {allowed} allowed")
+        failed |= allowed != burst_limit.requests
+    for worker in workers:
+        await worker.client.aclose()
+    if failed:
+        print("FAILED: a burst was not cut at the limit")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--limit', default='100/60')
+    parser.add_argument('--burst', type=int, default=400, help='Requests in the single-client burst')
+    parser.add_argument('--redis-url', help='Scratch Redis database')
+    parser.add_argument('--workers', type=int, default=4, help='Limiters sharing Redis in the burst check')
+    asyncio.run(main(parser.parse_args()))
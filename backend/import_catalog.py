@@ -0,0 +1,63 @@
+"""
+Bulk import products or branch inventory from a CSV or XLSX file.
+
+The file is streamed in chunks, validated and upserted with the same code path
+as the POST /api/v1/products/import and /api/v1/inventory/import endpoints.
+
+Run this script with:
+    python import_catalog.py products catalog.csv --business-id 1
+    python import_catalog.py inventory stock.xlsx --branch-id 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# Load environment variables
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import products or inventory")
+    parser.add_argument("kind", choices=["products", "inventory"])
+    parser.add_argument("path", help="CSV or XLSX file")
+    parser.add_argument("--business-id", type=int, help="Business for imported products")
+    parser.add_argument("--branch-id", type=int, help="Branch for every inventory row")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.kind == "products" and args.business_id is None:
+        parser.error("--business-id is required when importing products")
+
+    import app.models  # noqa: F401  (register all tables)
+    from app.extensions import SessionLocal
+    from app.services.import_service import ImportService, DEFAULT_CHUNK_SIZE
+
+    chunk_size = args.chunk_size or DEFAULT_CHUNK_SIZE
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        with open(args.path, "rb") as fileobj:
+            if args.kind == "products":
+                report = ImportService.import_products(
+                    db, fileobj, args.path, business_id=args.business_id, chunk_size=chunk_size
+                )
+            else:
+                report = ImportService.import_inventory(
+                    db, fileobj, args.path, branch_id=args.branch_id, chunk_size=chunk_size
+                )
+    finally:
+        db.close()
+
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(report, indent=2, default=str))
+    sys.exit(1 if report["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -75,6 +75,14 @@ def init_database():
 
             # Commit changes
             session.commit()
+
+            # Triggers recording catalog changes for GET /products/changes
+            from app.services.catalog_sync_service import CatalogSyncService
+            CatalogSyncService.install(session)
+
+            # Full-text index behind product search and autocomplete
+            from app.services.search_service import ProductSearchService
+            ProductSearchService.rebuild(session)
             logger.info("Database initialization completed successfully")
 
         except Exception as e:
@@ -23,7 +23,9 @@ from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_
 from prometheus_client.registry import CollectorRegistry
 from prometheus_fastapi_instrumentator import Instrumentator
 from app.core.logging import logger
-from app.core.security_middleware import SecurityMiddleware, RateLimitMiddleware
+from app.core.security_middleware import SecurityMiddleware
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.idempotency import IdempotencyMiddleware
 from app.core.exceptions import (
     BusinessException,
     NotFoundException,
@@ -34,6 +36,11 @@ from app.core.exceptions import (
 )
 from app.config import settings
 from app.db.session import engine
+from app.extensions import SessionLocal
+from app.core.scan_index import scan_index
+from app.core.passwords import password_hasher
+from app.core.session import session_store
+from app.utils.images import ImageFiles, image_root, shutdown_image_workers
 from app.db.base import Base  # Import the Base that includes all models
 from contextlib import asynccontextmanager
 
@@ -93,10 +100,20 @@ async def lifespan(app: FastAPI):
         logger.error(f"Error creating database tables: {str(e)}")
         raise
     
+    # Load the SKU/barcode index for till scans and follow product changes
+    scan_index.start(SessionLocal)
+    
+    # Write login session rows behind and follow session revocations
+    session_store.start(SessionLocal)
+    
     yield
     
     # Shutdown
     logger.info("Shutting down BIZ_MANAGE_PRO API")
+    scan_index.stop()
+    session_store.stop()
+    shutdown_image_workers()
+    password_hasher.shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -143,7 +160,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers for simplicity in development
-    expose_headers=["Content-Type", "Authorization", "X-Total-Count", "Content-Disposition"],
+    expose_headers=["Content-Type", "Authorization", "X-Total-Count", "Content-Disposition", "X-Next-Cursor"],
     max_age=600,  # Cache preflight requests for 10 minutes
 )
 
@@ -176,18 +193,22 @@ class MetricsMiddleware(BaseHTTPMiddleware):
 
 app.add_middleware(MetricsMiddleware)
 
+# Replay retried sale/transaction POSTs sent with an Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
+
 # Add security middleware
 app.add_middleware(SecurityMiddleware)
 
-# Add rate limit middleware
-app.add_middleware(RateLimitMiddleware, limit=100, window=60)
+# Rate limit per IP, user and route across all workers
+app.add_middleware(RateLimitMiddleware)
 
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail}
+        content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(RequestValidationError)
@@ -249,6 +270,7 @@ app.include_router(ml_analytics.router, prefix="/api/v1/ml-analytics", tags=["ML
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/uploads/images", ImageFiles(directory=image_root(), check_dir=False), name="images")
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 # Merge FastAPI apps
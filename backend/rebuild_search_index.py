@@ -0,0 +1,40 @@
+"""
+Create the product search index if it is missing and rebuild it.
+
+The index is kept current by the database on every product write; rebuild
+it after restoring a backup, after loading products with the sync triggers
+disabled, or to compact it after heavy churn.
+
+Run this script with:
+    python rebuild_search_index.py
+"""
+
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# Load environment variables
+load_dotenv()
+
+def main():
+    import app.models  # noqa: F401  (register all tables)
+    from app.extensions import SessionLocal
+    from app.services.search_service import ProductSearchService
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        indexed = ProductSearchService.rebuild(db)
+    finally:
+        db.close()
+
+    print(json.dumps({"indexed": indexed, "seconds": round(time.perf_counter() - started, 2)}, indent=2))
+
+if __name__ == "__main__":
+    main()